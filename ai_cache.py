@@ -0,0 +1,150 @@
+# ai_cache.py
+import hashlib
+import json
+import threading
+import time
+
+from sqlalchemy import func
+
+from models import db, AiExtractionCacheEntry
+from image_pipeline import hamming_distance
+
+
+class AiExtractionCache:
+    """
+    Persistent cache of AI card extraction results, keyed by content.
+
+    The key hashes the prompt version, the description and the bytes of
+    every normalized image, so re-uploading the same photos (or retrying
+    after a failed save) needs no model call. With `dhash_distance` > 0,
+    uploads whose perceptual hashes are within that many bits of a cached
+    entry are reported as near hits, but never answered from the cache:
+    binder pages share the same pocket layout, so a near match may be a
+    different page, and the model is still asked. The table is trimmed to
+    `max_bytes` of stored results, least recently used first.
+    """
+
+    def __init__(self, max_bytes=5 * 1024 * 1024, dhash_distance=0):
+        self.max_bytes = max_bytes
+        self.dhash_distance = dhash_distance
+        self._lock = threading.Lock()
+        self.counters = {'hits': 0, 'near_hits': 0, 'misses': 0}
+
+    def init_app(self, app):
+        self.max_bytes = app.config.get('AI_CACHE_MAX_BYTES', self.max_bytes)
+        self.dhash_distance = app.config.get('AI_CACHE_DHASH_DISTANCE', self.dhash_distance)
+
+    # --- Keys ---
+    @staticmethod
+    def context_key(description, images, prompt_version):
+        context = [prompt_version, (description or '').strip(), [image['detail'] for image in images]]
+        return hashlib.sha256(json.dumps(context).encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def content_key(context_key, images):
+        digest = hashlib.sha256(context_key.encode('ascii'))
+        for image in images:
+            digest.update(image['sha256'].encode('ascii'))
+        return digest.hexdigest()
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    # --- Lookups ---
+    def _find_near_duplicate(self, context_key, images):
+        dhashes = [image.get('dhash') for image in images]
+        if self.dhash_distance <= 0 or not dhashes or None in dhashes:
+            return None
+        candidates = AiExtractionCacheEntry.query.filter(
+            AiExtractionCacheEntry.context_key == context_key,
+            AiExtractionCacheEntry.image_dhashes.isnot(None),
+        )
+        for row in candidates:
+            cached = json.loads(row.image_dhashes)
+            if len(cached) == len(dhashes) and all(
+                hamming_distance(a, b) <= self.dhash_distance for a, b in zip(cached, dhashes)
+            ):
+                return row
+        return None
+
+    def get(self, description, images, prompt_version):
+        """
+        Return (cards, status) where status is 'hit', 'near_hit' or 'miss'.
+
+        Cards are only returned on an exact hit. A near hit is a hint that
+        a similar upload was seen before; it returns no cards, so the
+        caller still asks the model. Cache errors are reported as misses so
+        a broken cache never blocks an import.
+        """
+        try:
+            context_key = self.context_key(description, images, prompt_version)
+            row = db.session.get(AiExtractionCacheEntry, self.content_key(context_key, images))
+            if row is None:
+                near = self._find_near_duplicate(context_key, images)
+                self._count('near_hits' if near is not None else 'misses')
+                return None, 'near_hit' if near is not None else 'miss'
+
+            row.hits += 1
+            row.last_used_at = time.time()
+            cards = json.loads(row.cards_json)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error reading AI extraction cache: {e}")
+            self._count('misses')
+            return None, 'miss'
+
+        self._count('hits')
+        return cards, 'hit'
+
+    def set(self, description, images, prompt_version, cards):
+        try:
+            context_key = self.context_key(description, images, prompt_version)
+            dhashes = [image.get('dhash') for image in images]
+            cards_json = json.dumps(cards)
+            now = time.time()
+            db.session.merge(AiExtractionCacheEntry(
+                key=self.content_key(context_key, images),
+                context_key=context_key,
+                image_dhashes=json.dumps(dhashes) if images and None not in dhashes else None,
+                cards_json=cards_json,
+                size=len(cards_json),
+                hits=0,
+                created_at=now,
+                last_used_at=now,
+            ))
+            db.session.commit()
+            self._evict()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error caching AI extraction result: {e}")
+
+    def _evict(self):
+        total = db.session.query(func.coalesce(func.sum(AiExtractionCacheEntry.size), 0)).scalar()
+        if total <= self.max_bytes:
+            return
+        evicted = []
+        rows = (db.session.query(AiExtractionCacheEntry.key, AiExtractionCacheEntry.size)
+                .order_by(AiExtractionCacheEntry.last_used_at))
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            evicted.append(key)
+            total -= size
+        AiExtractionCacheEntry.query.filter(AiExtractionCacheEntry.key.in_(evicted)).delete(synchronize_session=False)
+        db.session.commit()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+        lookups = stats['hits'] + stats['near_hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else None
+        entries, stored_bytes = db.session.query(
+            func.count(AiExtractionCacheEntry.key), func.coalesce(func.sum(AiExtractionCacheEntry.size), 0)
+        ).one()
+        stats.update({'entries': entries, 'bytes': stored_bytes, 'max_bytes': self.max_bytes})
+        return stats
+
+
+ai_extraction_cache = AiExtractionCache()
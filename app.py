@@ -1,48 +1,37 @@
 import os
-import requests
 import json
-from flask import Flask, render_template, request, redirect, url_for, flash, g, jsonify
+import time
+import click
+from flask import Flask, render_template, request, redirect, url_for, flash, g, jsonify, Response, stream_with_context
 from datetime import date
 from dotenv import load_dotenv
 from sqlalchemy.exc import IntegrityError
-from datetime import datetime
-from werkzeug.utils import secure_filename
 from typing import List
-from chatbot_service import get_yuyutei_prices_by_card_number
+from browser_pool import configure_browser_pool
+from outbound_guard import configure_outbound_guards, outbound_stats
+from fx_service import (
+    fx_service, get_exchange_rate, convert_to_sgd_offline, reconvert_purchase_prices,
+    request_pending_conversion, start_pending_conversion_worker,
+)
+from yuyutei_client import configure_yuyutei_client
+from price_cache import price_cache, price_key_for_card
+from chatbot_service import yuyutei_flight
+from catalog import crawl_set
+from repricer import reprice_cards, run_price_refresh_loop, start_price_refresh_scheduler
+from image_pipeline import UnsupportedImageError, configure_image_pipeline, prepare_uploads
+from ai_cache import ai_extraction_cache
+from collection_stats import SORT_DIRECTIONS, SORT_KEYS, card_page, collection_totals
+from jobs import ingest_jobs
+from migrations import run_migrations, schema_version
+from collection_summary import get_summaries, rebuild_collection_summaries, register_summary_hooks
+from collection_api import api_bp
+from bulk_cards import BulkActionError, apply_bulk_action, card_selection, delete_collection as delete_collection_and_cards
 
 # REMOVED: import re
 # REMOVED: from playwright.sync_api import sync_playwright
 
 load_dotenv()
 
-# --- NEW HELPER FUNCTION ---
-def get_exchange_rate(from_currency, to_currency):
-    """
-    Fetches the latest exchange rate from the Frankfurter API.
-    Returns the rate as a float or None if an error occurs.
-    """
-    if from_currency == to_currency:
-        return 1.0
-
-    url = f"https://api.frankfurter.app/latest?from={from_currency}&to={to_currency}"
-    try:
-        response = requests.get(url, timeout=5)
-        response.raise_for_status()
-        data = response.json()
-        rate = data['rates'].get(to_currency)
-        if rate:
-            return rate
-        else:
-            print(f"Error: Rate for {to_currency} not found in response.")
-            return None
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching exchange rate: {e}")
-        return None
-    except (json.JSONDecodeError, KeyError) as e:
-        print(f"Error parsing API response: {e}")
-        return None
-# --- END NEW HELPER FUNCTION ---
-
 
 def create_app(test_config=None):
     app = Flask(__name__, instance_relative_config=True)
@@ -50,6 +39,65 @@ def create_app(test_config=None):
         SECRET_KEY=os.getenv('SECRET_KEY', 'dev_secret_key'),
         SQLALCHEMY_DATABASE_URI='sqlite:///' + os.path.join(app.root_path, 'instance', 'one_piece_tcg.sqlite'),
         SQLALCHEMY_TRACK_MODIFICATIONS=False,
+        # Warm Chromium browsers kept alive for Yuyu-tei live pricing
+        BROWSER_POOL_SIZE=int(os.getenv('BROWSER_POOL_SIZE', 2)),
+        BROWSER_POOL_MAX_PAGES=int(os.getenv('BROWSER_POOL_MAX_PAGES', 200)),
+        # 'auto' (HTTP first, browser fallback), 'http' or 'browser'
+        YUYUTEI_FETCH_MODE=os.getenv('YUYUTEI_FETCH_MODE', 'auto'),
+        # Per-host limits for outbound scraping and FX calls
+        OUTBOUND_RATE=float(os.getenv('OUTBOUND_RATE', 2.0)),
+        OUTBOUND_BURST=float(os.getenv('OUTBOUND_BURST', 5)),
+        OUTBOUND_MAX_CONCURRENCY=int(os.getenv('OUTBOUND_MAX_CONCURRENCY', 4)),
+        OUTBOUND_MAX_WAIT=float(os.getenv('OUTBOUND_MAX_WAIT', 5.0)),
+        BREAKER_FAILURE_THRESHOLD=int(os.getenv('BREAKER_FAILURE_THRESHOLD', 5)),
+        BREAKER_COOLDOWN=float(os.getenv('BREAKER_COOLDOWN', 30.0)),
+        # Cached Frankfurter rates are reused for this many seconds
+        FX_RATE_TTL=int(os.getenv('FX_RATE_TTL', 12 * 3600)),
+        # Cards saved before a rate is known are converted in the background
+        FX_PENDING_INTERVAL=int(os.getenv('FX_PENDING_INTERVAL', 30)),
+        # Started by the web server only; cards still without a rate are retried with backoff, then given up on
+        FX_PENDING_WORKER=os.getenv('FX_PENDING_WORKER', 'true').lower() in ('1', 'true', 'yes'),
+        FX_PENDING_MAX_ATTEMPTS=int(os.getenv('FX_PENDING_MAX_ATTEMPTS', 10)),
+        # Rows rendered per page of the collection table
+        COLLECTION_PAGE_SIZE=int(os.getenv('COLLECTION_PAGE_SIZE', 100)),
+        # Largest page of cards the JSON API returns (?limit=)
+        API_MAX_PAGE_SIZE=int(os.getenv('API_MAX_PAGE_SIZE', 500)),
+        # Live price cache: serve fresh entries directly, stale ones while refreshing
+        PRICE_CACHE_LRU_SIZE=int(os.getenv('PRICE_CACHE_LRU_SIZE', 512)),
+        PRICE_CACHE_FRESH_TTL=int(os.getenv('PRICE_CACHE_FRESH_TTL', 6 * 3600)),
+        PRICE_CACHE_STALE_TTL=int(os.getenv('PRICE_CACHE_STALE_TTL', 7 * 24 * 3600)),
+        # Concurrent lookups when pricing a whole collection
+        LIVE_PRICE_BATCH_WORKERS=int(os.getenv('LIVE_PRICE_BATCH_WORKERS', 4)),
+        # Set-level catalog crawls answer single-card lookups while fresh
+        CATALOG_TTL=int(os.getenv('CATALOG_TTL', 24 * 3600)),
+        CATALOG_MAX_PAGES=int(os.getenv('CATALOG_MAX_PAGES', 20)),
+        # A listing page that fails is retried this many times, then skipped
+        CATALOG_PAGE_RETRIES=int(os.getenv('CATALOG_PAGE_RETRIES', 1)),
+        # Background repricing of Card.current_value_sgd; interval 0 disables the in-app scheduler
+        PRICE_REFRESH_INTERVAL=int(os.getenv('PRICE_REFRESH_INTERVAL', 0)),
+        REPRICE_MAX_CARDS_PER_RUN=int(os.getenv('REPRICE_MAX_CARDS_PER_RUN', 100)),
+        REPRICE_MIN_INTERVAL=float(os.getenv('REPRICE_MIN_INTERVAL', 2.0)),
+        # Uploads for AI extraction are downscaled in memory to what the model will see
+        AI_IMAGE_DETAIL=os.getenv('AI_IMAGE_DETAIL', 'high'),
+        AI_IMAGE_MAX_SIDE=int(os.getenv('AI_IMAGE_MAX_SIDE', 2048)),
+        AI_IMAGE_SHORT_SIDE=int(os.getenv('AI_IMAGE_SHORT_SIDE', 768)),
+        AI_IMAGE_JPEG_QUALITY=int(os.getenv('AI_IMAGE_JPEG_QUALITY', 85)),
+        # Stored AI extraction results, trimmed least recently used first; a dHash distance above 0 reports near duplicates without reusing them
+        AI_CACHE_MAX_BYTES=int(os.getenv('AI_CACHE_MAX_BYTES', 5 * 1024 * 1024)),
+        AI_CACHE_DHASH_DISTANCE=int(os.getenv('AI_CACHE_DHASH_DISTANCE', 0)),
+        # "Add Card with AI" submissions processed at the same time
+        AI_JOB_CONCURRENCY=int(os.getenv('AI_JOB_CONCURRENCY', 2)),
+        # Seconds without progress before another process may take over a running job
+        AI_JOB_LEASE=int(os.getenv('AI_JOB_LEASE', 600)),
+        # Parse cards from the streamed model answer as they complete
+        AI_STREAMING=os.getenv('AI_STREAMING', 'true').lower() in ('1', 'true', 'yes'),
+        JOB_EVENTS_POLL_INTERVAL=float(os.getenv('JOB_EVENTS_POLL_INTERVAL', 0.3)),
+        # Bulk import: uploads with more photos than this are split into chunks sent to the model in parallel
+        AI_BULK_CHUNK_SIZE=int(os.getenv('AI_BULK_CHUNK_SIZE', 4)),
+        AI_BULK_MAX_WORKERS=int(os.getenv('AI_BULK_MAX_WORKERS', 3)),
+        # Live price and FX lookups for extracted cards: concurrency and per-card time budget
+        ENRICH_MAX_WORKERS=int(os.getenv('ENRICH_MAX_WORKERS', 4)),
+        ENRICH_CARD_TIMEOUT=float(os.getenv('ENRICH_CARD_TIMEOUT', 20.0)),
     )
 
     if test_config is None:
@@ -62,41 +110,72 @@ def create_app(test_config=None):
     except OSError:
         pass
 
+    configure_browser_pool(
+        size=app.config['BROWSER_POOL_SIZE'],
+        max_pages_per_browser=app.config['BROWSER_POOL_MAX_PAGES'],
+    )
+    configure_yuyutei_client(fetch_mode=app.config['YUYUTEI_FETCH_MODE'])
+    configure_image_pipeline(
+        detail=app.config['AI_IMAGE_DETAIL'],
+        max_side=app.config['AI_IMAGE_MAX_SIDE'],
+        short_side=app.config['AI_IMAGE_SHORT_SIDE'],
+        jpeg_quality=app.config['AI_IMAGE_JPEG_QUALITY'],
+    )
+    configure_outbound_guards(
+        rate=app.config['OUTBOUND_RATE'],
+        burst=app.config['OUTBOUND_BURST'],
+        max_concurrency=app.config['OUTBOUND_MAX_CONCURRENCY'],
+        max_wait=app.config['OUTBOUND_MAX_WAIT'],
+        failure_threshold=app.config['BREAKER_FAILURE_THRESHOLD'],
+        cooldown=app.config['BREAKER_COOLDOWN'],
+    )
+
     # MODIFIED: Use absolute import and remove Expense
-    from models import db, Card, WishlistItem, Collection
+    from models import db, Card, WishlistItem, Collection, IngestJob
     db.init_app(app)
+    # Card writes through the session keep the per-collection summaries up to date
+    register_summary_hooks()
+    price_cache.init_app(app)
+    fx_service.init_app(app)
+    ai_extraction_cache.init_app(app)
+    ingest_jobs.init_app(app)
+    # Read-only JSON API for dashboards and polling clients
+    app.register_blueprint(api_bp, url_prefix='/api')
 
     with app.app_context():
         print(f"Creating database at: {app.config['SQLALCHEMY_DATABASE_URI']}")
         db.create_all()
+        # Schema changes to existing tables (e.g. new indexes) that create_all can't make
+        run_migrations()
 
     @app.route('/')
     def index():
         return render_template('index.html')
 
     # MODIFIED: Collection route to handle optional collection_id
+    def collection_page_args():
+        """Sort, direction and cursor of the requested table page, validated."""
+        sort = request.args.get('sort', 'name')
+        direction = request.args.get('dir', 'asc')
+        return (sort if sort in SORT_KEYS else 'name',
+                direction if direction in SORT_DIRECTIONS else 'asc',
+                request.args.get('after') or None)
+
     @app.route('/collection')
     @app.route('/collection/<int:collection_id>')
     def collection(collection_id=None):
-        if collection_id:
-            collection_obj = Collection.query.get_or_404(collection_id)
-            cards = Card.query.filter_by(collection_id=collection_id).order_by(Card.name).all()
-        else:
-            # Default view for all cards not in a collection
-            cards = Card.query.filter(Card.collection_id.is_(None)).order_by(Card.name).all()
-            collection_obj = None
+        collection_obj = Collection.query.get_or_404(collection_id) if collection_id else None
 
-        # Calculate the total purchase price in SGD
-        total_purchase_price_sgd = sum(card.purchase_price_sgd * card.quantity for card in cards)
-        
-        # NEW: Calculate totals per currency for original prices
-        total_purchase_price_original = {}
-        for card in cards:
-            currency = card.original_currency or 'SGD'
-            total_purchase_price_original[currency] = total_purchase_price_original.get(currency, 0) + (card.purchase_price_original * card.quantity)
+        # Only the first page of cards is rendered; the rest is loaded as the user scrolls
+        sort, direction, after = collection_page_args()
+        page_size = app.config['COLLECTION_PAGE_SIZE']
+        try:
+            cards, next_cursor = card_page(collection_id, sort, direction, after, page_size)
+        except ValueError:
+            return redirect(url_for('collection', collection_id=collection_id, sort=sort, dir=direction))
 
-        card_names = sorted(list(set(card.name for card in cards)))
-        card_values = {name: sum(c.purchase_price_sgd for c in cards if c.name == name) for name in card_names}
+        # Totals and chart data are aggregated in SQL rather than over the loaded cards
+        totals = collection_totals(collection_id)
 
         # MODIFIED: Pass collections to the template for navigation
         all_collections = Collection.query.order_by(Collection.name).all()
@@ -105,25 +184,92 @@ def create_app(test_config=None):
             'collection.html',
             cards=cards,
             collection=collection_obj,
-            card_names=card_names,
-            card_values=card_values,
             all_collections=all_collections,
-            total_purchase_price_sgd=total_purchase_price_sgd,
-            total_purchase_price_original=total_purchase_price_original
+            sort=sort,
+            direction=direction,
+            next_cursor=next_cursor,
+            page_size=page_size,
+            **totals
         )
 
+    @app.route('/collection/rows')
+    @app.route('/collection/<int:collection_id>/rows')
+    def collection_rows(collection_id=None):
+        """The next page of table rows as an HTML fragment, for infinite scroll."""
+        if collection_id:
+            Collection.query.get_or_404(collection_id)
+        sort, direction, after = collection_page_args()
+        try:
+            cards, next_cursor = card_page(collection_id, sort, direction, after, app.config['COLLECTION_PAGE_SIZE'])
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        page = {'html': render_template('collection_rows.html', cards=cards), 'count': len(cards), 'next_cursor': next_cursor}
+        if next_cursor:
+            page['next_url'] = url_for('collection', collection_id=collection_id, sort=sort, dir=direction, after=next_cursor)
+            page['next_rows_url'] = url_for('collection_rows', collection_id=collection_id, sort=sort, dir=direction, after=next_cursor)
+        return jsonify(page), 200
+
     # --- NEW LIVE PRICING ROUTE ---
     @app.route('/get_live_price/<card_number>')
     def get_live_price(card_number):
         if not card_number:
             return jsonify({'error': 'No card number provided'}), 400
 
-        live_prices = get_yuyutei_prices_by_card_number(card_number)
+        live_prices, cache_status, age_seconds = price_cache.get(card_number)
         
         if live_prices:
-            return jsonify({'prices': live_prices}), 200
+            return jsonify({
+                'prices': live_prices,
+                'cache': cache_status,
+                'age_seconds': round(age_seconds, 1),
+            }), 200
         else:
-            return jsonify({'error': 'Prices not found or scraping failed'}), 404
+            return jsonify({'error': 'Prices not found or scraping failed', 'cache': cache_status}), 404
+
+    @app.route('/live_price_stats')
+    def live_price_stats():
+        return jsonify({'singleflight': yuyutei_flight.stats(), 'outbound': outbound_stats()}), 200
+
+    @app.route('/ai_extraction_stats')
+    def ai_extraction_stats():
+        return jsonify(ai_extraction_cache.stats()), 200
+
+    @app.route('/collection/live_prices', methods=['POST'])
+    @app.route('/collection/<int:collection_id>/live_prices', methods=['POST'])
+    def collection_live_prices(collection_id=None):
+        """Price every distinct card number in a collection, streamed back as NDJSON."""
+        if collection_id:
+            Collection.query.get_or_404(collection_id)
+            cards = Card.query.filter_by(collection_id=collection_id).all()
+        else:
+            cards = Card.query.filter(Card.collection_id.is_(None)).all()
+
+        # Map each lookup key to the table rows that should display its prices
+        card_ids_by_key = {}
+        for card in cards:
+            key = price_key_for_card(card)
+            if key:
+                card_ids_by_key.setdefault(key, []).append(card.id)
+
+        max_workers = app.config['LIVE_PRICE_BATCH_WORKERS']
+
+        def generate():
+            for key, prices, cache_status, age_seconds in price_cache.get_many(card_ids_by_key, max_workers):
+                line = {
+                    'card_number': key,
+                    'card_ids': card_ids_by_key[key],
+                    'cache': cache_status,
+                    'age_seconds': round(age_seconds, 1),
+                }
+                if prices:
+                    line['prices'] = prices
+                else:
+                    line['error'] = 'Prices not found or scraping failed'
+                yield json.dumps(line) + '\n'
+            yield json.dumps({'done': True, 'count': len(card_ids_by_key)}) + '\n'
+
+        return Response(generate(), mimetype='application/x-ndjson')
     # --- END NEW LIVE PRICING ROUTE ---
 
     # --- NEW COLLECTION ROUTES ---
@@ -131,7 +277,7 @@ def create_app(test_config=None):
     @app.route('/collections_list')
     def collections_list():
         collections = Collection.query.all()
-        return render_template('collections_list.html', collections=collections)
+        return render_template('collections_list.html', collections=collections, summaries=get_summaries())
 
     @app.route('/add_collection', methods=['GET', 'POST'])
     def add_collection():
@@ -172,12 +318,8 @@ def create_app(test_config=None):
     def delete_collection(collection_id):
         collection = Collection.query.get_or_404(collection_id)
         try:
-            # Permanently delete all cards associated with this collection
-            for card in collection.cards:
-                db.session.delete(card)
-                
-            db.session.delete(collection)
-            db.session.commit()
+            # Permanently delete all cards associated with this collection, in one statement
+            delete_collection_and_cards(collection)
             flash('Collection and all associated cards deleted successfully!', 'success')
         except Exception as e:
             db.session.rollback()
@@ -213,13 +355,12 @@ def create_app(test_config=None):
                 return redirect(url_for('add_card', today_date=date.today().isoformat()))
 
             if original_currency and original_currency != 'SGD':
-                rate = get_exchange_rate(original_currency, 'SGD')
-                if rate:
-                    purchase_price_sgd = purchase_price_original * rate
+                # Never wait on the FX API here: unknown rates are converted in the background
+                purchase_price_sgd = convert_to_sgd_offline(purchase_price_original, original_currency, purchase_date)
+                if purchase_price_sgd is not None:
                     flash(f"Converted {purchase_price_original} {original_currency} to {purchase_price_sgd:.2f} SGD.", "info")
                 else:
-                    purchase_price_sgd = 0.0
-                    flash("Failed to get exchange rate, purchase price in SGD set to 0.0", "warning")
+                    flash(f"The SGD price for {original_currency} {purchase_price_original} will be filled in shortly.", "info")
             else:
                 purchase_price_sgd = purchase_price_original
 
@@ -236,6 +377,8 @@ def create_app(test_config=None):
             try:
                 db.session.add(new_card)
                 db.session.commit()
+                if purchase_price_sgd is None:
+                    request_pending_conversion()
                 flash('Card added successfully!', 'success')
             except Exception as e:
                 db.session.rollback()
@@ -253,12 +396,20 @@ def create_app(test_config=None):
         return render_template('add_card.html', today_date=today_date, collections=collections, selected_collection_id=selected_collection_id)
     # --- END OF MODIFIED `add_card` ROUTE ---
 
-    # --- MODIFIED `add_card_with_ai` ROUTE TO HANDLE MULTIPLE FILES ---
+    # --- MODIFIED `add_card_with_ai` ROUTE: extraction runs as a background job ---
     @app.route('/add_card_with_ai', methods=['GET', 'POST'])
     def add_card_with_ai():
-        from chatbot_service import get_card_details_from_ai_multimodal, generate_ai_confirmation_message
-        
+        collections = Collection.query.order_by(Collection.name).all()
+
         if request.method == 'POST':
+            wants_json = request.accept_mimetypes.best == 'application/json'
+
+            def reject(message):
+                if wants_json:
+                    return jsonify({'error': message}), 400
+                flash(message, "error")
+                return redirect(url_for('add_card_with_ai'))
+
             user_description = request.form.get('card_description')
             
             # MODIFIED: Use getlist() to get a list of all uploaded files
@@ -269,100 +420,80 @@ def create_app(test_config=None):
 
             # MODIFIED: Check if any files were uploaded (and they have a name)
             if not user_description and not any(file.filename for file in uploaded_files):
-                flash("Please provide a card description or upload at least one image.", "error")
-                return redirect(url_for('add_card_with_ai'))
-
-            image_paths = []
-            
-            # NEW LOGIC: Loop through each file, save it, and collect the path
-            for card_image in uploaded_files:
-                if card_image and card_image.filename != '':
-                    try:
-                        upload_folder = os.path.join(app.instance_path, 'uploads')
-                        os.makedirs(upload_folder, exist_ok=True)
-                        
-                        # Use a secure filename to prevent malicious uploads
-                        filename = secure_filename(card_image.filename)
-                        image_path = os.path.join(upload_folder, filename)
-                        
-                        # Check if a file with the same name already exists to prevent overwriting
-                        if os.path.exists(image_path):
-                            # Append a unique identifier to the filename
-                            name, ext = os.path.splitext(filename)
-                            timestamp = datetime.now().strftime("%Y%m%d%H%M%S%f")
-                            filename = f"{name}_{timestamp}{ext}"
-                            image_path = os.path.join(upload_folder, filename)
-
-                        card_image.save(image_path)
-                        image_paths.append(image_path)
-                    except Exception as e:
-                        flash(f"Error saving image: {e}", "error")
-                        return redirect(url_for('add_card_with_ai'))
-
-            # MODIFIED: Pass the list of image paths to the multimodal function
-            card_data_list = get_card_details_from_ai_multimodal(user_description, image_paths)
-            
-            # Clean up the temporary image files
-            for path in image_paths:
-                if os.path.exists(path):
-                    os.remove(path)
-
-            if isinstance(card_data_list, dict) and 'error' in card_data_list:
-                flash(f"Error from AI: {card_data_list['error']}", "error")
-                return redirect(url_for('add_card_with_ai'))
-            
-            if not isinstance(card_data_list, list) or not card_data_list:
-                flash("The AI did not return a list of cards. Please try a different image or description.", "error")
-                return redirect(url_for('add_card_with_ai'))
+                return reject("Please provide a card description or upload at least one image.")
 
+            # Uploads are read, downscaled and encoded in memory; nothing is written to disk
             try:
-                for card_data in card_data_list:
-                    purchase_price_original = card_data.get('purchase_price_original', 0.0)
-                    original_currency = card_data.get('original_currency', 'SGD')
-
-                    if original_currency and original_currency != 'SGD':
-                        rate = get_exchange_rate(original_currency, 'SGD')
-                        if rate:
-                            purchase_price_sgd = purchase_price_original * rate
-                            flash(f"Converted {purchase_price_original} {original_currency} to {purchase_price_sgd:.2f} SGD.", "info")
-                        else:
-                            purchase_price_sgd = 0.0
-                            flash("Failed to get exchange rate, purchase price in SGD set to 0.0", "warning")
-                    else:
-                        purchase_price_sgd = purchase_price_original
-
-                    new_card = Card(
-                        name=card_data.get('name'), set_name=card_data.get('set_name'),
-                        card_number=card_data.get('card_number'), rarity=card_data.get('rarity'),
-                        color=card_data.get('color'), quantity=int(card_data.get('quantity', 1)),
-                        purchase_price_original=purchase_price_original,
-                        original_currency=original_currency,
-                        purchase_price_sgd=purchase_price_sgd,
-                        current_value_sgd=float(card_data.get('live_price_jpy', 0.0)), # Use live price as current value
-                        image_url=card_data.get('image_url'),
-                        purchase_date=date.fromisoformat(card_data.get('purchase_date', date.today().isoformat())),
-                        collection_id=collection_id
-                    )
-                    db.session.add(new_card)
-
-                db.session.commit()
-                
-                confirmation_message = generate_ai_confirmation_message(card_data_list)
-                flash(confirmation_message, 'success')
-                
-                if collection_id:
-                    return redirect(url_for('collection', collection_id=collection_id))
-                else:
-                    return redirect(url_for('collection'))
-
+                images = prepare_uploads(uploaded_files)
+            except UnsupportedImageError as e:
+                return reject(f"Error reading image: {e}")
             except Exception as e:
-                db.session.rollback()
-                flash(f"An error occurred while saving the card(s): {e}", "error")
-                return redirect(url_for('add_card_with_ai'))
-        
-        collections = Collection.query.order_by(Collection.name).all()
+                return reject(f"Error processing image: {e}")
+            if images:
+                print(f"Prepared {len(images)} image(s) for AI extraction: "
+                      f"{sum(image['original_bytes'] for image in images)} -> {sum(image['bytes'] for image in images)} bytes")
+
+            job = ingest_jobs.submit(user_description, images, collection_id)
+            status_url = url_for('job_status', job_id=job.id)
+            events_url = url_for('job_events', job_id=job.id)
+            if wants_json:
+                return jsonify({'job_id': job.id, 'status_url': status_url, 'events_url': events_url}), 202, {'Location': status_url}
+            # Without JavaScript the page itself polls the job
+            return render_template('add_card_with_ai.html', collections=collections, selected_collection_id=collection_id,
+                                   job_id=job.id, job_status_url=status_url, job_events_url=events_url), 202, {'Location': status_url}
+
         selected_collection_id = request.args.get('collection_id')
         return render_template('add_card_with_ai.html', collections=collections, selected_collection_id=selected_collection_id)
+
+    @app.route('/jobs/<job_id>')
+    def job_status(job_id):
+        job = db.session.get(IngestJob, job_id)
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
+        data = ingest_jobs.to_dict(job)
+        if job.status == 'done':
+            data['redirect_url'] = url_for('collection', collection_id=job.collection_id)
+        return jsonify(data), 200
+
+    @app.route('/jobs/<job_id>/events')
+    def job_events(job_id):
+        """Server-Sent Events: the job's state every time it changes, until it finishes."""
+        job = db.session.get(IngestJob, job_id)
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
+        redirect_url = url_for('collection', collection_id=job.collection_id)
+        poll_interval = app.config['JOB_EVENTS_POLL_INTERVAL']
+
+        def generate():
+            last_update, last_sent = None, time.monotonic()
+            while True:
+                # The job runs on another thread (or process); re-read its row each time
+                db.session.expire_all()
+                job = db.session.get(IngestJob, job_id)
+                if job is None:
+                    # Deleted while the stream was open (e.g. with its collection)
+                    data = {'id': job_id, 'status': 'failed', 'error': 'Job not found', 'stages': {}, 'cards': []}
+                    yield f"event: failed\ndata: {json.dumps(data)}\n\n"
+                    return
+                finished = job.status in ('done', 'failed')
+                if job.updated_at != last_update or finished:
+                    last_update = job.updated_at
+                    data = ingest_jobs.to_dict(job)
+                    if job.status == 'done':
+                        data['redirect_url'] = redirect_url
+                    yield f"event: {job.status if finished else 'progress'}\ndata: {json.dumps(data)}\n\n"
+                    last_sent = time.monotonic()
+                    if finished:
+                        return
+                elif time.monotonic() - last_sent > 15:
+                    # Comment line keeps proxies from closing an idle connection
+                    yield ": keep-alive\n\n"
+                    last_sent = time.monotonic()
+                db.session.rollback()
+                time.sleep(poll_interval)
+
+        return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
     # --- END OF MODIFIED `add_card_with_ai` ROUTE ---
 
     @app.route('/edit_card/<int:card_id>', methods=['GET', 'POST'])
@@ -386,28 +517,31 @@ def create_app(test_config=None):
             collection_id_str = request.form.get('collection_id')
             card.collection_id = int(collection_id_str) if collection_id_str else None
 
+            # Parse the purchase date first: conversion uses the rate on that date
+            purchase_date_str = request.form['purchase_date']
+            try:
+                card.purchase_date = date.fromisoformat(purchase_date_str)
+            except ValueError:
+                flash('Invalid date format for purchase date.', 'error')
+                return redirect(url_for('edit_card', card_id=card.id))
+
             if card.original_currency and card.original_currency != 'SGD':
-                rate = get_exchange_rate(card.original_currency, 'SGD')
-                if rate:
-                    card.purchase_price_sgd = card.purchase_price_original * rate
+                card.purchase_price_sgd = convert_to_sgd_offline(card.purchase_price_original, card.original_currency, card.purchase_date)
+                if card.purchase_price_sgd is not None:
                     flash(f"Converted {card.purchase_price_original} {card.original_currency} to {card.purchase_price_sgd:.2f} SGD.", "info")
                 else:
-                    card.purchase_price_sgd = 0.0
-                    flash("Failed to get exchange rate, purchase price in SGD set to 0.0", "warning")
+                    flash(f"The SGD price for {card.original_currency} {card.purchase_price_original} will be filled in shortly.", "info")
             else:
                 card.purchase_price_sgd = card.purchase_price_original
 
             card.current_value_sgd = float(request.form.get('current_value_sgd') or 0.0)
             card.image_url = request.form.get('image_url')
-            
-            purchase_date_str = request.form['purchase_date']
-            try:
-                card.purchase_date = date.fromisoformat(purchase_date_str)
-            except ValueError:
-                flash('Invalid date format for purchase date.', 'error')
-                return redirect(url_for('edit_card', card_id=card.id))
+            # A new currency or date gets a fresh round of background conversion attempts
+            card.conversion_attempts = 0
 
             db.session.commit()
+            if card.purchase_price_sgd is None:
+                request_pending_conversion()
             flash('Card updated successfully!', 'success')
             return redirect(url_for('collection', collection_id=card.collection_id))
         
@@ -425,6 +559,45 @@ def create_app(test_config=None):
         flash('Card deleted successfully!', 'success')
         return redirect(url_for('collection', collection_id=card.collection_id))
 
+    @app.route('/cards/bulk', methods=['POST'])
+    def bulk_cards():
+        """
+        Delete, move, revalue or re-convert many cards with one statement.
+
+        Takes the collection table's multi-select form, or JSON:
+        {"action": ..., "card_ids": [...], "filter": {"collection_id": 3, ...},
+         "target_collection_id": ..., "current_value_sgd": ...}.
+        """
+        data = request.get_json(silent=True) if request.is_json else None
+        if data is not None:
+            card_ids, filters = data.get('card_ids'), data.get('filter')
+        else:
+            data = request.form
+            card_ids = request.form.getlist('card_ids')
+            filters = None
+            if request.form.get('select_all'):
+                # "All cards in this view" selects by collection rather than by the rows loaded so far;
+                # rows ticked as well would narrow it to those rows
+                card_ids, filters = None, {'collection_id': request.form.get('collection_id')}
+        action = data.get('action')
+        try:
+            count = apply_bulk_action(
+                action,
+                card_selection(card_ids, filters),
+                target_collection_id=data.get('target_collection_id'),
+                current_value_sgd=data.get('current_value_sgd'),
+            )
+        except BulkActionError as e:
+            if request.is_json:
+                return jsonify({'error': str(e)}), 400
+            flash(str(e), 'danger')
+        else:
+            if request.is_json:
+                return jsonify({'action': action, 'cards': count}), 200
+            done = {'delete': 'Deleted', 'move': 'Moved', 'set_value': 'Revalued', 'reconvert': 'Re-converted'}[action]
+            flash(f"{done} {count} card{'s' if count != 1 else ''}.", 'success')
+        return redirect(url_for('collection', collection_id=request.form.get('collection_id', type=int) or None))
+
     @app.route('/wishlist')
     def wishlist():
         wishlist_items = WishlistItem.query.order_by(WishlistItem.priority.desc(), WishlistItem.card_name).all()
@@ -471,6 +644,61 @@ def create_app(test_config=None):
         flash('Wishlist item deleted successfully!', 'success')
         return redirect(url_for('wishlist'))
 
+    @app.cli.command('crawl-sets')
+    @click.argument('set_codes', nargs=-1, required=True)
+    def crawl_sets_command(set_codes):
+        """Crawl whole Yuyu-tei set listings (e.g. OP01 OP05) into the price catalog."""
+        for set_code in set_codes:
+            try:
+                crawl_set(set_code)
+            except Exception as e:
+                db.session.rollback()
+                print(f"Error crawling set {set_code}: {e}")
+
+    @app.cli.command('reprice')
+    @click.option('--max-cards', type=int, default=None, help='Distinct card numbers to look up this run.')
+    def reprice_command(max_cards):
+        """Reprice the most out-of-date card numbers once and record price history."""
+        rate = get_exchange_rate('JPY', 'SGD')
+        if not rate:
+            print("Failed to get JPY to SGD exchange rate, nothing repriced.")
+            return
+        reprice_cards(rate, max_cards=max_cards)
+
+    @app.cli.command('reprice-worker')
+    @click.option('--interval', type=int, default=3600, help='Seconds between repricing runs.')
+    def reprice_worker_command(interval):
+        """Run repricing forever as a separate worker process."""
+        run_price_refresh_loop(app, get_exchange_rate, interval)
+
+    @app.cli.command('fx-backfill')
+    @click.argument('currency')
+    @click.argument('start', type=click.DateTime(formats=['%Y-%m-%d']))
+    @click.argument('end', type=click.DateTime(formats=['%Y-%m-%d']))
+    def fx_backfill_command(currency, start, end):
+        """Store daily CURRENCY->SGD rates from START to END (YYYY-MM-DD) in one call."""
+        days = fx_service.backfill(currency, start.date(), end.date())
+        print(f"Stored {days} daily {currency.upper()} rates.")
+
+    @app.cli.command('fx-reconvert')
+    @click.option('--zeroed-only', is_flag=True, help='Only repair cards whose SGD price is 0.')
+    @click.option('--pending-only', is_flag=True, help='Only convert cards still awaiting conversion.')
+    def fx_reconvert_command(zeroed_only, pending_only):
+        """Recompute purchase_price_sgd from the rate on each card's purchase date."""
+        reconvert_purchase_prices(zeroed_only=zeroed_only, pending_only=pending_only)
+
+    @app.cli.command('migrate')
+    def migrate_command():
+        """Apply pending schema migrations and show the schema version."""
+        applied = run_migrations()
+        print(f"Schema version {schema_version()} ({len(applied)} migration(s) applied now).")
+
+    @app.cli.command('rebuild-summaries')
+    def rebuild_summaries_command():
+        """Recompute every collection summary from the card table."""
+        rows = rebuild_collection_summaries()
+        print(f"Rebuilt {rows} collection summaries.")
+
     @app.context_processor
     def inject_today_date():
         return {'today_date': date.today().isoformat()}
@@ -478,5 +706,11 @@ def create_app(test_config=None):
     @app.before_request
     def before_request():
         g.messages = []
+        # Only web processes pick up jobs interrupted by a restart and run the workers, never CLI commands
+        ingest_jobs.resume_pending()
+        if app.config['PRICE_REFRESH_INTERVAL'] > 0:
+            start_price_refresh_scheduler(app, get_exchange_rate, app.config['PRICE_REFRESH_INTERVAL'])
+        if app.config['FX_PENDING_WORKER']:
+            start_pending_conversion_worker(app, app.config['FX_PENDING_INTERVAL'])
     
     return app
\ No newline at end of file
@@ -0,0 +1 @@
+# Local fake upstreams and benchmarks for the ingestion and pricing pipeline
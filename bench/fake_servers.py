@@ -0,0 +1,276 @@
+# bench/fake_servers.py
+"""
+Local stand-ins for the services the ingestion and pricing pipeline calls.
+
+- OpenAI: an OpenAI-compatible /v1/chat/completions endpoint answering with
+  canned card JSON (fixtures/openai_cards.json), streamed or not.
+- Yuyu-tei: search pages rendered from fixtures/yuyutei_search.html.
+- Frankfurter: /latest and date-range rates from fixtures/frankfurter_rates.json.
+
+Every server has its own latency, jitter and error rate. Point the app at
+them with OPENAI_BASE_URL, YUYUTEI_BASE_URL and FRANKFURTER_BASE_URL:
+
+    python -m bench.fake_servers --openai-latency 1.5 --yuyutei-error-rate 0.05
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from string import Template
+from urllib.parse import parse_qs, urlparse
+
+FIXTURES_DIR = Path(__file__).resolve().parent / 'fixtures'
+
+
+class FaultProfile:
+    """Latency of `latency` ± `jitter` seconds, and `error_rate` of requests answered with a 5xx."""
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0):
+        self.latency = float(latency)
+        self.jitter = float(jitter)
+        self.error_rate = float(error_rate)
+
+    def delay(self):
+        time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+
+    def should_fail(self):
+        return random.random() < self.error_rate
+
+
+class _FakeHandler(BaseHTTPRequestHandler):
+    server_version = 'FakeUpstream/1.0'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type='application/json'):
+        data = body.encode('utf-8') if isinstance(body, str) else body
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_json(self, payload, status=200):
+        self._send(status, json.dumps(payload, ensure_ascii=False))
+
+    def _handle(self, handler):
+        self.server.count('requests')
+        self.server.profile.delay()
+        if self.server.profile.should_fail():
+            self.server.count('errors')
+            return self._send_json({'error': {'message': 'Injected failure', 'type': 'server_error'}}, status=503)
+        try:
+            handler(urlparse(self.path))
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def do_GET(self):
+        self._handle(self.handle_get)
+
+    def do_POST(self):
+        self._handle(self.handle_post)
+
+    def handle_get(self, url):
+        self._send_json({'error': 'Not found'}, status=404)
+
+    def handle_post(self, url):
+        self._send_json({'error': 'Not found'}, status=404)
+
+
+class OpenAIHandler(_FakeHandler):
+    """
+    Chat completions with canned cards: `cards_per_image` per uploaded image
+    (or per request without images). Streamed answers are sent in small
+    chunks, `token_delay` seconds apart, like a model writing its reply.
+    """
+
+    def _cards_for(self, messages):
+        images = sum(
+            1 for message in messages if isinstance(message.get('content'), list)
+            for part in message['content'] if part.get('type') == 'image_url'
+        )
+        canned = self.server.fixtures['cards']
+        count = min(len(canned), self.server.options['cards_per_image'] * max(1, images))
+        return canned[:count]
+
+    def handle_post(self, url):
+        if not url.path.rstrip('/').endswith('/chat/completions'):
+            return super().handle_post(url)
+        request = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+        content = json.dumps(self._cards_for(request.get('messages', [])), ensure_ascii=False)
+        completion = {
+            'id': f"chatcmpl-fake{random.getrandbits(32):08x}",
+            'created': int(time.time()),
+            'model': request.get('model', 'fake-model'),
+        }
+        if not request.get('stream'):
+            return self._send_json({
+                **completion,
+                'object': 'chat.completion',
+                'choices': [{'index': 0, 'finish_reason': 'stop',
+                             'message': {'role': 'assistant', 'content': content}}],
+                'usage': {'prompt_tokens': 0, 'completion_tokens': len(content) // 4, 'total_tokens': len(content) // 4},
+            })
+
+        # Server-sent events, ended by closing the connection
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        chunk_size = self.server.options['chunk_chars']
+        pieces = [content[i:i + chunk_size] for i in range(0, len(content), chunk_size)]
+        for i, piece in enumerate(pieces + [None]):
+            delta = {'content': piece} if piece is not None else {}
+            chunk = {**completion, 'object': 'chat.completion.chunk',
+                     'choices': [{'index': 0, 'delta': delta, 'finish_reason': None if piece is not None else 'stop'}]}
+            self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+            if piece is not None and i < len(pieces) - 1:
+                time.sleep(self.server.options['token_delay'])
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.close_connection = True
+
+
+class YuyuteiHandler(_FakeHandler):
+    """Search pages for any card number, with a normal and a parallel listing."""
+
+    def handle_get(self, url):
+        if url.path.rstrip('/') != '/sell/opc/s/search':
+            return super().handle_get(url)
+        card_number = (parse_qs(url.query).get('search_word') or [''])[0].upper()
+        # Stable, card-specific prices so repeated runs compare like with like
+        seed = sum(ord(char) for char in card_number)
+        html = self.server.fixtures['search'].safe_substitute(
+            card_number=card_number,
+            set_code=card_number.split('-')[0].lower(),
+            name=f"カード {card_number}",
+            price=f"{100 + seed * 7 % 4900:,}",
+            parallel_price=f"{2000 + seed * 13 % 28000:,}",
+        )
+        self._send(200, html, 'text/html; charset=utf-8')
+
+
+class FrankfurterHandler(_FakeHandler):
+    """/latest?from=X and /<start>..<end>?from=X&to=Y, with rates on working days only."""
+
+    def handle_get(self, url):
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        base = query.get('from', 'EUR').upper()
+        rates = self.server.fixtures['rates'].get(base)
+        if rates is None:
+            return self._send_json({'message': 'not found'}, status=404)
+        if query.get('to'):
+            rates = {quote: rate for quote, rate in rates.items() if quote in query['to'].upper().split(',')}
+
+        path = url.path.strip('/')
+        if path == 'latest':
+            return self._send_json({'amount': 1.0, 'base': base, 'date': date.today().isoformat(), 'rates': rates})
+        if '..' not in path:
+            return super().handle_get(url)
+        start, end = (date.fromisoformat(part) for part in path.split('..'))
+        daily, day = {}, start
+        while day <= min(end, date.today()):
+            if day.weekday() < 5:
+                daily[day.isoformat()] = rates
+            day += timedelta(days=1)
+        self._send_json({'amount': 1.0, 'base': base, 'start_date': start.isoformat(),
+                         'end_date': end.isoformat(), 'rates': daily})
+
+
+class FakeServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, handler, profile, fixtures, **options):
+        super().__init__(address, handler)
+        self.profile = profile
+        self.fixtures = fixtures
+        self.options = options
+        self.counters = {'requests': 0, 'errors': 0}
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, name=f'fake-{self.url}', daemon=True)
+        thread.start()
+        return self
+
+
+def load_fixtures():
+    return {
+        'cards': json.loads((FIXTURES_DIR / 'openai_cards.json').read_text(encoding='utf-8')),
+        'search': Template((FIXTURES_DIR / 'yuyutei_search.html').read_text(encoding='utf-8')),
+        'rates': json.loads((FIXTURES_DIR / 'frankfurter_rates.json').read_text(encoding='utf-8')),
+    }
+
+
+def start_fake_servers(host='127.0.0.1', ports=None, profiles=None, cards_per_image=3, token_delay=0.02, chunk_chars=24):
+    """
+    Start the three servers on background threads; returns {name: FakeServer}.
+
+    `ports` and `profiles` are dicts keyed by 'openai', 'yuyutei' and
+    'frankfurter'; port 0 (the default) picks a free port.
+    """
+    ports, profiles = ports or {}, profiles or {}
+    fixtures = load_fixtures()
+    handlers = {'openai': OpenAIHandler, 'yuyutei': YuyuteiHandler, 'frankfurter': FrankfurterHandler}
+    return {
+        name: FakeServer((host, ports.get(name, 0)), handler, profiles.get(name) or FaultProfile(), fixtures,
+                         cards_per_image=cards_per_image, token_delay=token_delay, chunk_chars=chunk_chars).start()
+        for name, handler in handlers.items()
+    }
+
+
+def add_profile_arguments(parser):
+    for name, latency in (('openai', 1.0), ('yuyutei', 0.3), ('frankfurter', 0.1)):
+        parser.add_argument(f'--{name}-latency', type=float, default=latency, help=f'Seconds before {name} answers.')
+        parser.add_argument(f'--{name}-jitter', type=float, default=latency / 4, help='Random +/- seconds on top.')
+        parser.add_argument(f'--{name}-error-rate', type=float, default=0.0, help='Share of requests answered with a 503.')
+    parser.add_argument('--cards-per-image', type=int, default=3, help='Cards the fake model finds per photo.')
+    parser.add_argument('--token-delay', type=float, default=0.02, help='Seconds between streamed answer chunks.')
+
+
+def profiles_from_args(args):
+    return {
+        name: FaultProfile(getattr(args, f'{name}_latency'), getattr(args, f'{name}_jitter'), getattr(args, f'{name}_error_rate'))
+        for name in ('openai', 'yuyutei', 'frankfurter')
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--openai-port', type=int, default=8701)
+    parser.add_argument('--yuyutei-port', type=int, default=8702)
+    parser.add_argument('--frankfurter-port', type=int, default=8703)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    servers = start_fake_servers(
+        args.host,
+        ports={'openai': args.openai_port, 'yuyutei': args.yuyutei_port, 'frankfurter': args.frankfurter_port},
+        profiles=profiles_from_args(args),
+        cards_per_image=args.cards_per_image,
+        token_delay=args.token_delay,
+    )
+    print("Fake upstream servers running. Point the app at them with:")
+    print(f"  export OPENAI_BASE_URL={servers['openai'].url}/v1 OPENAI_API_KEY=fake")
+    print(f"  export YUYUTEI_BASE_URL={servers['yuyutei'].url} YUYUTEI_FETCH_MODE=http")
+    print(f"  export FRANKFURTER_BASE_URL={servers['frankfurter'].url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
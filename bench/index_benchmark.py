@@ -0,0 +1,166 @@
+# bench/index_benchmark.py
+"""
+Query plans and timings of the hot Card/wishlist queries, before and after migrations.
+
+Builds a synthetic SQLite database (100k cards by default) in a temporary
+directory, removes the indexes added by migrations.py to mimic an older
+database, times each query and prints its EXPLAIN QUERY PLAN, then applies
+the migrations and measures again.
+
+    python -m bench.index_benchmark --cards 100000 --repeat 20
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import event, insert, text
+
+SET_CODES = [f"OP{i:02d}" for i in range(1, 11)] + [f"ST{i:02d}" for i in range(1, 16)] + ['EB01', 'P']
+RARITIES = ['C', 'UC', 'R', 'SR', 'SEC', 'L', 'SP', 'P']
+CURRENCIES = ['SGD', 'JPY', 'JPY', 'USD']
+PRIORITIES = ['High', 'Medium', 'Low']
+DROPPED_INDEXES = ('ix_card_collection_id_name', 'ix_card_card_number_rarity', 'ix_wishlist_item_priority_card_name')
+
+
+def populate(card_count, collection_count, wishlist_count, seed=7):
+    from collection_summary import rebuild_collection_summaries
+    from models import db, Card, Collection, WishlistItem
+
+    rng = random.Random(seed)
+    names = [f"Character {i}" for i in range(2500)]
+    db.session.execute(insert(Collection), [{'name': f"Collection {i}", 'description': ''} for i in range(1, collection_count + 1)])
+    batch = []
+    for i in range(card_count):
+        set_code = rng.choice(SET_CODES)
+        batch.append({
+            'name': rng.choice(names),
+            'set_name': set_code,
+            'card_number': f"{set_code}-{rng.randint(1, 120):03d}",
+            'rarity': rng.choice(RARITIES),
+            'color': rng.choice(['Red', 'Green', 'Blue', 'Purple', 'Black', 'Yellow']),
+            'quantity': rng.randint(1, 4),
+            'purchase_price_original': round(rng.uniform(0.5, 300), 2),
+            'original_currency': rng.choice(CURRENCIES),
+            'purchase_price_sgd': round(rng.uniform(0.5, 300), 2) if rng.random() > 0.01 else None,
+            'current_value_sgd': 0.0,
+            'purchase_date': date(2023, 1, 1) + timedelta(days=rng.randrange(700)),
+            # Most cards stay uncollected, like the "All Cards" view
+            'collection_id': rng.randint(1, collection_count) if rng.random() < 0.4 else None,
+        })
+        if len(batch) == 10000:
+            db.session.execute(insert(Card), batch)
+            batch = []
+    if batch:
+        db.session.execute(insert(Card), batch)
+    db.session.execute(insert(WishlistItem), [
+        {'card_name': rng.choice(names), 'set_name': rng.choice(SET_CODES), 'target_price_sgd': 10.0, 'priority': rng.choice(PRIORITIES)}
+        for _ in range(wishlist_count)
+    ])
+    db.session.commit()
+    # The bulk inserts bypass the session hooks
+    rebuild_collection_summaries()
+
+
+def hot_queries():
+    """(label, callable) pairs exercising the app's real query code."""
+    from collection_stats import card_page, collection_totals
+    from models import Card, WishlistItem
+
+    return [
+        ('All Cards page, by name', lambda: card_page(None, 'name', 'asc', limit=100)),
+        ('collection page, by name', lambda: card_page(3, 'name', 'asc', limit=100)),
+        ('collection totals', lambda: collection_totals(3)),
+        ('All Cards totals', lambda: collection_totals(None)),
+        ('cards by card_number', lambda: Card.query.filter_by(card_number='OP05-119').all()),
+        ('cards by card_number + rarity', lambda: Card.query.filter_by(card_number='OP05-119', rarity='SR').all()),
+        ('wishlist page', lambda: WishlistItem.query.order_by(WishlistItem.priority.desc(), WishlistItem.card_name).all()),
+    ]
+
+
+def measure(queries, repeat):
+    from models import db
+
+    engine = db.engine
+    results = {}
+    for label, run in queries:
+        captured = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            captured.append((statement, parameters))
+
+        event.listen(engine, 'before_cursor_execute', capture)
+        try:
+            run()
+        finally:
+            event.remove(engine, 'before_cursor_execute', capture)
+        db.session.rollback()
+
+        timings = []
+        for _ in range(repeat):
+            db.session.expunge_all()
+            started = time.perf_counter()
+            run()
+            timings.append((time.perf_counter() - started) * 1000)
+            db.session.rollback()
+
+        plans = []
+        with engine.connect() as connection:
+            for statement, parameters in captured:
+                rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+                plans.append([row[-1] for row in rows])
+        results[label] = {'median_ms': statistics.median(timings), 'plans': plans}
+    return results
+
+
+def print_results(before, after):
+    for label in before:
+        b, a = before[label], after[label]
+        speedup = b['median_ms'] / a['median_ms'] if a['median_ms'] else float('inf')
+        print(f"\n== {label}: {b['median_ms']:.2f} ms -> {a['median_ms']:.2f} ms ({speedup:.1f}x)")
+        for title, result in (('before', b), ('after', a)):
+            for plan in result['plans']:
+                print(f"   {title:6}  " + ' | '.join(plan))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--cards', type=int, default=100000)
+    parser.add_argument('--collections', type=int, default=50)
+    parser.add_argument('--wishlist', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=20, help='Timed runs per query; the median is reported.')
+    args = parser.parse_args()
+
+    os.environ.setdefault('OPENAI_API_KEY', 'fake')
+    from app import create_app
+    from migrations import run_migrations
+    from models import db
+
+    path = os.path.join(tempfile.mkdtemp(prefix='optcg-index-bench-'), 'bench.sqlite')
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{path}", 'PRICE_REFRESH_INTERVAL': 0})
+    with app.app_context():
+        # Start from an "old" database: no migration indexes, no recorded migrations
+        for index in DROPPED_INDEXES:
+            db.session.execute(text(f"DROP INDEX IF EXISTS {index}"))
+        db.session.execute(text("DELETE FROM schema_migration"))
+        db.session.commit()
+
+        started = time.perf_counter()
+        populate(args.cards, args.collections, args.wishlist)
+        print(f"Inserted {args.cards} cards into {path} in {time.perf_counter() - started:.1f}s")
+
+        queries = hot_queries()
+        before = measure(queries, args.repeat)
+        started = time.perf_counter()
+        applied = run_migrations()
+        print(f"Applied {applied} in {time.perf_counter() - started:.2f}s")
+        after = measure(queries, args.repeat)
+
+    print_results(before, after)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+# bench/run_benchmark.py
+"""
+Benchmark the ingestion and pricing pipeline against local fake upstreams.
+
+Starts bench/fake_servers.py in-process (or uses running ones with
+--external), points the app at them and reports p50/p95 latency and
+throughput for each stage:
+
+- extract: one AI extraction call, and the time until its first card
+- live_price: an uncached Yuyu-tei search scrape and parse
+- fx_latest / fx_backfill: Frankfurter latest rates and a 30-day range
+- ingest_job: an "Add Card with AI" job from submission until its cards are saved
+
+    python -m bench.run_benchmark --iterations 50 --concurrency 4 --openai-latency 0.5
+"""
+import argparse
+import io
+import json
+import math
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from bench.fake_servers import add_profile_arguments, profiles_from_args, start_fake_servers
+
+STAGES = ('extract', 'live_price', 'fx_latest', 'fx_backfill', 'ingest_job')
+
+# A valid 1x1 PNG, so uploads go through the real image pipeline
+TINY_PNG = bytes.fromhex(
+    '89504e470d0a1a0a0000000d4948445200000001000000010802000000907753de'
+    '0000000c4944415408d763f8cfc0000003010100c9fe92ef0000000049454e44ae426082'
+)
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def summarize(name, latencies, errors, wall_time):
+    summary = {'stage': name, 'ok': len(latencies), 'errors': errors,
+               'throughput_per_s': round(len(latencies) / wall_time, 2) if wall_time else None}
+    if latencies:
+        summary.update({'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+                        'p95_ms': round(percentile(latencies, 95) * 1000, 1),
+                        'max_ms': round(max(latencies) * 1000, 1)})
+    return summary
+
+
+def run_stage(app, name, call, iterations, concurrency):
+    """
+    Run `call(i)` `iterations` times on `concurrency` threads.
+
+    `call` returns a falsy value for a failed operation, or a dict of extra
+    timings in seconds (e.g. {'first_card': 0.4}) reported as sub-stages.
+    """
+    def timed(i):
+        with app.app_context():
+            started = time.perf_counter()
+            try:
+                result = call(i)
+            except Exception as e:
+                print(f"{name} #{i} failed: {e}")
+                result = None
+            return time.perf_counter() - started, result
+
+    latencies, extra, errors = [], {}, 0
+    began = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for elapsed, result in executor.map(timed, range(iterations)):
+            if not result:
+                errors += 1
+                continue
+            latencies.append(elapsed)
+            if isinstance(result, dict):
+                for key, value in result.items():
+                    extra.setdefault(key, []).append(value)
+    wall_time = time.perf_counter() - began
+
+    summaries = [summarize(name, latencies, errors, wall_time)]
+    summaries += [summarize(f"{name}.{key}", values, 0, wall_time) for key, values in extra.items()]
+    return summaries
+
+
+def build_stages(app, run_id):
+    # Imported after the environment points the app's clients at the fake servers
+    from chatbot_service import get_yuyutei_prices_by_card_number, iter_extracted_cards
+    from fx_service import ExchangeRateService
+    from image_pipeline import prepare_image
+
+    image = prepare_image(TINY_PNG)
+    # A fresh service with no TTL fetches on every call instead of serving its cache
+    fx = ExchangeRateService(ttl=0)
+
+    def extract(i):
+        # A unique description per call keeps the AI extraction cache out of the measurement
+        started, first_card, cards = time.perf_counter(), None, 0
+        for _card, _is_new in iter_extracted_cards(f"bench {run_id} extract {i}", [image],
+                                                   stream=app.config['AI_STREAMING']):
+            first_card = first_card or time.perf_counter() - started
+            cards += 1
+        return {'first_card': first_card} if cards else None
+
+    def live_price(i):
+        # Distinct card numbers, so concurrent calls are not coalesced into one scrape
+        return bool(get_yuyutei_prices_by_card_number(f"OP{i % 12 + 1:02d}-{(i * 7) % 120 + 1:03d}"))
+
+    def fx_latest(i):
+        return fx.get_rates(random.choice(('JPY', 'USD', 'EUR'))) is not None
+
+    def fx_backfill(i):
+        start = date.today() - timedelta(days=30 + random.randrange(365))
+        return fx.backfill('JPY', start, start + timedelta(days=30)) > 0
+
+    def ingest_job(i):
+        client = app.test_client()
+        response = client.post('/add_card_with_ai', headers={'Accept': 'application/json'}, data={
+            'card_description': f"bench {run_id} job {i}",
+            'card_image': [(io.BytesIO(TINY_PNG), 'card.png')],
+        })
+        if response.status_code != 202:
+            return None
+        status_url = response.get_json()['status_url']
+        while True:
+            job = client.get(status_url).get_json()
+            if job['status'] in ('done', 'failed'):
+                return job['status'] == 'done'
+            time.sleep(0.02)
+
+    return {'extract': extract, 'live_price': live_price, 'fx_latest': fx_latest,
+            'fx_backfill': fx_backfill, 'ingest_job': ingest_job}
+
+
+def print_table(summaries):
+    columns = ('stage', 'ok', 'errors', 'p50_ms', 'p95_ms', 'max_ms', 'throughput_per_s')
+    rows = [[str(summary.get(column, '-')) for column in columns] for summary in summaries]
+    widths = [max(len(column), *(len(row[i]) for row in rows)) for i, column in enumerate(columns)]
+    print('  '.join(column.ljust(width) for column, width in zip(columns, widths)))
+    for row in rows:
+        print('  '.join(value.ljust(width) for value, width in zip(row, widths)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--iterations', type=int, default=20, help='Operations per stage.')
+    parser.add_argument('--concurrency', type=int, default=4, help='Operations in flight at once.')
+    parser.add_argument('--stages', default=','.join(STAGES), help='Comma-separated subset of: ' + ', '.join(STAGES))
+    parser.add_argument('--external', action='store_true',
+                        help='Use the servers in OPENAI_BASE_URL/YUYUTEI_BASE_URL/FRANKFURTER_BASE_URL instead of starting fakes.')
+    parser.add_argument('--keep-limits', action='store_true',
+                        help='Keep the outbound rate limits instead of raising them out of the way.')
+    parser.add_argument('--json', dest='json_path', help='Also write the results to this file.')
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    if not args.external:
+        servers = start_fake_servers(profiles=profiles_from_args(args), cards_per_image=args.cards_per_image,
+                                     token_delay=args.token_delay)
+        os.environ.update({
+            'OPENAI_BASE_URL': f"{servers['openai'].url}/v1",
+            'OPENAI_API_KEY': os.environ.get('OPENAI_API_KEY') or 'fake',
+            'YUYUTEI_BASE_URL': servers['yuyutei'].url,
+            'FRANKFURTER_BASE_URL': servers['frankfurter'].url,
+        })
+
+    from app import create_app
+
+    test_config = {
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='optcg-bench-'), 'bench.sqlite'),
+        'YUYUTEI_FETCH_MODE': 'http',
+        'PRICE_REFRESH_INTERVAL': 0,
+    }
+    if not args.keep_limits:
+        test_config.update({'OUTBOUND_RATE': 1000.0, 'OUTBOUND_BURST': 1000, 'OUTBOUND_MAX_CONCURRENCY': 64})
+    app = create_app(test_config)
+
+    stages = build_stages(app, run_id=f"{time.time():.0f}")
+    summaries = []
+    for name in args.stages.split(','):
+        name = name.strip()
+        if name not in stages:
+            parser.error(f"Unknown stage '{name}'")
+        print(f"Running {name} x{args.iterations} (concurrency {args.concurrency})...")
+        summaries += run_stage(app, name, stages[name], args.iterations, args.concurrency)
+
+    print()
+    print_table(summaries)
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as results_file:
+            json.dump({'args': vars(args), 'results': summaries}, results_file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
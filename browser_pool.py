@@ -0,0 +1,180 @@
+# browser_pool.py
+import atexit
+import os
+import queue
+import threading
+from concurrent.futures import Future
+
+
+class BrowserPoolClosed(RuntimeError):
+    """Raised when work is submitted to a pool that has been shut down."""
+
+
+class _BrowserWorker(threading.Thread):
+    """
+    Owns one Playwright instance, one Chromium browser and one browser context.
+
+    Playwright's sync API is bound to the thread that started it, so every
+    browser lives on its own worker thread and callers hand it work through
+    the shared pool queue instead of touching the browser directly.
+    """
+
+    def __init__(self, pool, index):
+        super().__init__(name=f"browser-pool-{index}", daemon=True)
+        self.pool = pool
+        self._playwright = None
+        self._browser = None
+        self._context = None
+        self.pages_served = 0
+
+    # --- Browser lifecycle ---
+    def _start_browser(self):
+        if self._playwright is None:
+            from playwright.sync_api import sync_playwright
+            self._playwright = sync_playwright().start()
+        self._browser = self._playwright.chromium.launch()
+        self._context = self._browser.new_context()
+        self.pages_served = 0
+
+    def _close_browser(self):
+        for closeable in (self._context, self._browser):
+            if closeable is None:
+                continue
+            try:
+                closeable.close()
+            except Exception as e:
+                print(f"Error closing pooled browser: {e}")
+        self._context = None
+        self._browser = None
+
+    def _is_healthy(self):
+        return self._browser is not None and self._browser.is_connected()
+
+    def _ensure_browser(self):
+        if not self._is_healthy():
+            self._close_browser()
+            self._start_browser()
+        elif self.pool.max_pages_per_browser and self.pages_served >= self.pool.max_pages_per_browser:
+            # Recycle long-lived browsers so leaked memory is handed back to the OS.
+            self._close_browser()
+            self._start_browser()
+
+    # --- Work loop ---
+    def run(self):
+        while True:
+            item = self.pool._tasks.get()
+            if item is None:
+                break
+            fn, future = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            page = None
+            try:
+                self._ensure_browser()
+                page = self._context.new_page()
+                self.pages_served += 1
+                future.set_result(fn(page))
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                if page is not None:
+                    try:
+                        page.close()
+                    except Exception:
+                        # A crashed page usually means a crashed browser; drop it.
+                        self._close_browser()
+
+        self._close_browser()
+        if self._playwright is not None:
+            try:
+                self._playwright.stop()
+            except Exception as e:
+                print(f"Error stopping Playwright: {e}")
+
+
+class BrowserPool:
+    """
+    A fixed-size pool of warm Chromium browsers.
+
+    Work is submitted as a callable that receives a fresh Playwright page;
+    the page is opened in a long-lived browser context and closed again
+    when the callable returns. Browsers are started lazily, replaced when
+    they disconnect, and recycled after `max_pages_per_browser` pages.
+    """
+
+    def __init__(self, size=2, max_pages_per_browser=200):
+        self.size = max(1, int(size))
+        self.max_pages_per_browser = int(max_pages_per_browser)
+        self._tasks = queue.Queue()
+        self._workers = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _start_workers(self):
+        with self._lock:
+            if self._closed:
+                raise BrowserPoolClosed("Browser pool has been shut down.")
+            if not self._workers:
+                for index in range(self.size):
+                    worker = _BrowserWorker(self, index)
+                    worker.start()
+                    self._workers.append(worker)
+
+    def submit(self, fn):
+        """Schedule `fn(page)` on a pooled browser and return a Future."""
+        self._start_workers()
+        future = Future()
+        self._tasks.put((fn, future))
+        return future
+
+    def run(self, fn, timeout=None):
+        """Run `fn(page)` on a pooled browser and wait for its result."""
+        return self.submit(fn).result(timeout=timeout)
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            workers = list(self._workers)
+        for _ in workers:
+            self._tasks.put(None)
+        if wait:
+            for worker in workers:
+                worker.join(timeout=10)
+
+
+# --- Module-level pool shared by the Flask routes and the AI ingestion path ---
+_pool = None
+_pool_lock = threading.Lock()
+_pool_settings = {
+    'size': int(os.getenv('BROWSER_POOL_SIZE', 2)),
+    'max_pages_per_browser': int(os.getenv('BROWSER_POOL_MAX_PAGES', 200)),
+}
+
+
+def configure_browser_pool(size=None, max_pages_per_browser=None):
+    """Override the pool settings. Takes effect for the next pool created."""
+    if size is not None:
+        _pool_settings['size'] = int(size)
+    if max_pages_per_browser is not None:
+        _pool_settings['max_pages_per_browser'] = int(max_pages_per_browser)
+
+
+def get_browser_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BrowserPool(**_pool_settings)
+        return _pool
+
+
+def shutdown_browser_pool():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown()
+
+
+atexit.register(shutdown_browser_pool)
@@ -0,0 +1,129 @@
+# bulk_cards.py
+from sqlalchemy import and_, delete, update
+
+from collection_summary import UNCOLLECTED, affected_summary_keys, rebuild_collection_summaries, summary_key
+from fx_service import reconvert_purchase_prices
+from models import db, Card, Collection
+
+BULK_ACTIONS = ('delete', 'move', 'set_value', 'reconvert')
+
+# Card columns a bulk selection can filter on (exact matches)
+FILTER_FIELDS = ('collection_id', 'name', 'set_name', 'card_number', 'rarity', 'original_currency')
+
+
+class BulkActionError(ValueError):
+    pass
+
+
+def card_selection(card_ids=None, filters=None):
+    """
+    SQL condition for the cards a bulk action applies to.
+
+    `card_ids` picks cards by id; `filters` maps FILTER_FIELDS to exact
+    values, with collection_id 0 meaning the cards not in any collection.
+    Both may be given; at least one is required, so an empty selection can
+    never turn into "every card".
+    """
+    conditions = []
+    if card_ids:
+        try:
+            conditions.append(Card.id.in_({int(card_id) for card_id in card_ids}))
+        except (TypeError, ValueError):
+            raise BulkActionError("Card ids must be numbers.")
+    if filters is not None and not isinstance(filters, dict):
+        raise BulkActionError("The filter must map card fields to values.")
+    for field, value in (filters or {}).items():
+        if field not in FILTER_FIELDS:
+            raise BulkActionError(f"Cannot filter cards on '{field}'.")
+        if field == 'collection_id':
+            value = _collection_id(value)
+            conditions.append(Card.collection_id == value if value else Card.collection_id.is_(None))
+        else:
+            conditions.append(getattr(Card, field) == value)
+    if not conditions:
+        raise BulkActionError("Select some cards first.")
+    return and_(*conditions)
+
+
+def _collection_id(value):
+    try:
+        return int(value or UNCOLLECTED)
+    except (TypeError, ValueError):
+        raise BulkActionError(f"Invalid collection id: {value}")
+
+
+def delete_cards(where):
+    """Delete the selected cards with one DELETE; returns how many were deleted."""
+    keys = affected_summary_keys(where)
+    deleted = db.session.execute(
+        delete(Card).where(where).execution_options(synchronize_session=False)
+    ).rowcount
+    rebuild_collection_summaries(keys)
+    return deleted
+
+
+def move_cards(where, collection_id):
+    """Move the selected cards to a collection (0 takes them out of any) with one UPDATE."""
+    collection_id = _collection_id(collection_id)
+    if collection_id and db.session.get(Collection, collection_id) is None:
+        raise BulkActionError(f"Collection {collection_id} does not exist.")
+    keys = affected_summary_keys(where) | {summary_key(collection_id)}
+    moved = db.session.execute(
+        update(Card).where(where).values(collection_id=collection_id or None)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    rebuild_collection_summaries(keys)
+    return moved
+
+
+def set_current_value(where, value_sgd):
+    """Set the per-copy current value (SGD) of the selected cards with one UPDATE."""
+    try:
+        value_sgd = float(value_sgd)
+    except (TypeError, ValueError):
+        raise BulkActionError("Enter the current value in SGD.")
+    if value_sgd < 0:
+        raise BulkActionError("The current value cannot be negative.")
+    keys = affected_summary_keys(where)
+    updated = db.session.execute(
+        update(Card).where(where).values(current_value_sgd=value_sgd)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    rebuild_collection_summaries(keys)
+    return updated
+
+
+def apply_bulk_action(action, where, target_collection_id=None, current_value_sgd=None):
+    """
+    Run one bulk action on the cards matched by `where` and commit it.
+
+    Each action is a single set-based statement; the summaries of the
+    collections involved are recomputed in the same transaction, because
+    bulk statements bypass the session hooks. Returns the number of cards
+    affected.
+    """
+    if action not in BULK_ACTIONS:
+        raise BulkActionError(f"Unknown action '{action}'. Choose from: {', '.join(BULK_ACTIONS)}")
+    if action == 'reconvert':
+        # Also backfills the daily rates the selected cards need
+        return reconvert_purchase_prices(where=where)
+    try:
+        if action == 'delete':
+            return delete_cards(where)
+        if action == 'move':
+            return move_cards(where, target_collection_id)
+        return set_current_value(where, current_value_sgd)
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def delete_collection(collection):
+    """Delete a collection and all its cards: one DELETE for the cards, then the collection row."""
+    deleted = db.session.execute(
+        delete(Card).where(Card.collection_id == collection.id).execution_options(synchronize_session=False)
+    ).rowcount
+    # The session hooks drop the collection's summary row
+    db.session.delete(collection)
+    db.session.commit()
+    return deleted
@@ -0,0 +1,134 @@
+# catalog.py
+import time
+
+from flask import current_app
+
+from models import db, CatalogPrice
+from chatbot_service import get_yuyutei_prices_by_card_number, normalize_card_number
+from outbound_guard import OutboundCallRejected
+from yuyutei_client import YUYUTEI_BASE_URL, fetch_and_parse
+from yuyutei_parser import parse_yuyutei_listing_html
+
+
+def set_code_for(card_number):
+    """'OP01-025' -> 'OP01'."""
+    return normalize_card_number(card_number).split('-')[0]
+
+
+def _fetch_listing_page(url, retries):
+    """Listings on one page, retried `retries` times; raises the last error."""
+    for attempt in range(retries + 1):
+        try:
+            return fetch_and_parse(url, parse_yuyutei_listing_html)
+        except OutboundCallRejected:
+            # The circuit is open or we're over the rate limit: retrying now won't help
+            raise
+        except Exception as e:
+            if attempt == retries:
+                raise
+            print(f"Error fetching {url} (attempt {attempt + 1}), retrying: {e}")
+            time.sleep(1 + attempt)
+
+
+def crawl_set(set_code):
+    """
+    Walk a set's Yuyu-tei listing pages and replace its rows in the catalog.
+
+    Pages are requested until one adds no new listings or CATALOG_MAX_PAGES
+    is reached. A page that still fails after CATALOG_PAGE_RETRIES retries
+    is skipped and reported; the pages that succeeded are kept, and cards
+    that only the failed pages would have listed keep their previous rows
+    (they expire through CATALOG_TTL like any other). If the outbound guard
+    rejects a call, the rest of the set is left for the next crawl.
+    Returns the number of price rows stored.
+    """
+    set_code = set_code.strip().upper()
+    base_url = f"{YUYUTEI_BASE_URL}/sell/opc/s/{set_code.lower()}"
+    max_pages = current_app.config.get('CATALOG_MAX_PAGES', 20)
+    retries = current_app.config.get('CATALOG_PAGE_RETRIES', 1)
+
+    listings = {}
+    failed_pages = []
+    for page_number in range(1, max_pages + 1):
+        url = base_url if page_number == 1 else f"{base_url}?page={page_number}"
+        try:
+            page_listings = _fetch_listing_page(url, retries)
+        except OutboundCallRejected as e:
+            print(f"Stopped crawling set {set_code} at page {page_number}: {e}")
+            failed_pages.append(page_number)
+            break
+        except Exception as e:
+            print(f"Skipping page {page_number} of set {set_code}: {e}")
+            failed_pages.append(page_number)
+            continue
+        new_listings = 0
+        for listing in page_listings:
+            key = (listing['card_number'], listing['rarity'], listing['name'])
+            if key not in listings:
+                listings[key] = listing
+                new_listings += 1
+        if not new_listings:
+            break
+
+    if not listings:
+        print(f"No listings found for set {set_code} on Yuyu-tei.")
+        return 0
+
+    crawled_at = time.time()
+    stale_rows = CatalogPrice.query.filter_by(set_code=set_code)
+    if failed_pages:
+        # Only replace the card numbers this crawl actually saw
+        crawled_numbers = {listing['card_number'] for listing in listings.values()}
+        stale_rows = stale_rows.filter(CatalogPrice.card_number.in_(crawled_numbers))
+    stale_rows.delete(synchronize_session=False)
+    db.session.add_all([
+        CatalogPrice(
+            set_code=set_code,
+            card_number=listing['card_number'],
+            rarity=listing['rarity'],
+            name=listing['name'],
+            price_yen=listing['price_yen'],
+            crawled_at=crawled_at,
+        )
+        for listing in listings.values()
+    ])
+    db.session.commit()
+    if failed_pages:
+        print(f"Stored {len(listings)} prices for set {set_code}; "
+              f"page(s) {', '.join(map(str, failed_pages))} failed and kept their previous prices.")
+    else:
+        print(f"Stored {len(listings)} prices for set {set_code}.")
+    return len(listings)
+
+
+def get_catalog_prices(card_number, max_age=None):
+    """Prices for a card number from the catalog, or None if missing or stale."""
+    card_number = normalize_card_number(card_number)
+    max_age = max_age if max_age is not None else current_app.config.get('CATALOG_TTL', 24 * 3600)
+    rows = (CatalogPrice.query
+            .filter(CatalogPrice.card_number == card_number,
+                    CatalogPrice.crawled_at >= time.time() - max_age)
+            .order_by(CatalogPrice.id)
+            .all())
+    if not rows:
+        return None
+    return [
+        {'name': row.name, 'card_number': row.card_number, 'rarity': row.rarity, 'price_yen': row.price_yen}
+        for row in rows
+    ]
+
+
+def lookup_prices(card_number):
+    """
+    Answer from a fresh set crawl when possible, otherwise scrape the card's search page.
+
+    This is the lookup every price consumer goes through (the live price
+    cache and the repricer); get_yuyutei_prices_by_card_number is only its
+    uncached fallback.
+    """
+    try:
+        prices = get_catalog_prices(card_number)
+    except Exception as e:
+        print(f"Error reading catalog prices for {card_number}: {e}")
+        prices = None
+    return prices or get_yuyutei_prices_by_card_number(card_number)
@@ -3,87 +3,65 @@ import os
 from openai import OpenAI, OpenAIError
 from dotenv import load_dotenv
 import json
+import hashlib
+import queue
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date
-import base64
 from typing import Dict, Any, List
-import re
 # --- NEW IMPORTS FOR LIVE PRICING ---
-from playwright.sync_api import sync_playwright
+from yuyutei_client import YUYUTEI_BASE_URL, fetch_and_parse
+from yuyutei_parser import parse_yuyutei_search_html
+from singleflight import SingleFlight
 # --- END NEW IMPORTS ---
+from ai_cache import ai_extraction_cache
+from json_stream import JsonObjectStream, parse_json_objects
 
 load_dotenv()
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# OPENAI_BASE_URL points the client at another OpenAI-compatible server, e.g. bench/fake_servers.py
+client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), base_url=os.getenv("OPENAI_BASE_URL") or None)
+
+# Concurrent lookups for the same card number share one Yuyu-tei scrape
+yuyutei_flight = SingleFlight()
+
+def normalize_card_number(card_number_raw):
+    """Return the canonical 'OP01-025' form of a card number, or '' if empty."""
+    card_number = (card_number_raw or '').strip().upper().replace(' ', '')
+    if card_number and '-' not in card_number:
+        card_number = f"{card_number[:4]}-{card_number[4:]}"
+    return card_number
 
 # --- UPDATED HELPER FUNCTION FOR LIVE PRICING ---
 def get_yuyutei_prices_by_card_number(card_number_raw):
     """
     Fetch all available prices for a card number from Yuyu-tei's search page.
     
+    The page is fetched over plain HTTP when possible and only rendered in a
+    pooled browser when needed (see yuyutei_client.fetch_and_parse). Callers
+    asking for the same card number at the same time share one scrape.
+    This always scrapes: look prices up through catalog.lookup_prices (or
+    the price cache), which only falls back to this when the catalog has
+    nothing fresh.
+
     Args:
         card_number_raw (str): e.g. 'OP01-025' or 'OP01-121'
     Returns:
         List[Dict] or None: A list of dictionaries with card details and prices.
     """
+    card_number_formatted = normalize_card_number(card_number_raw)
+    return yuyutei_flight.do(card_number_formatted, _scrape_yuyutei_prices, card_number_formatted)
+
+def _scrape_yuyutei_prices(card_number_formatted):
     try:
-        if '-' not in card_number_raw:
-            card_number_formatted = f"{card_number_raw[:4]}-{card_number_raw[4:]}"
-        else:
-            card_number_formatted = card_number_raw
-            
-        url = f"https://yuyu-tei.jp/sell/opc/s/search?search_word={card_number_formatted}"
-        
-        with sync_playwright() as p:
-            browser = p.chromium.launch()
-            page = browser.new_page()
-            page.goto(url, wait_until='networkidle')
-
-            CARD_ITEM_SELECTOR = ".card-product"
-            
-            # Find all card products on the page that match the card number
-            matching_cards = page.locator(f"{CARD_ITEM_SELECTOR}").all()
-            
-            if not matching_cards:
-                print(f"Card '{card_number_formatted}' not found on Yuyu-tei search page.")
-                browser.close()
-                return None
-
-            results = []
-            for card_element in matching_cards:
-                # Use Playwright selectors to find the correct elements
-                # The name and card number are in a span with a specific class
-                name_and_number_element = card_element.locator("span.d-block.border")
-                # The price is in a strong tag
-                price_element = card_element.locator("strong")
-                # The rarity is in a span with the class "tag"
-                rarity_element = card_element.locator("span.tag")
-                
-                # Check if the extracted elements contain the correct card number to prevent false positives
-                if card_number_formatted not in name_and_number_element.text_content():
-                    continue
-
-                name_text = name_and_number_element.text_content().strip() if name_and_number_element.count() > 0 else "Unknown Name"
-                price_text = price_element.text_content().strip() if price_element.count() > 0 else "0"
-                rarity_text = rarity_element.text_content().strip() if rarity_element.count() > 0 else "Normal"
-
-                # Extract the price (digits only)
-                price_match = re.search(r'(\d{1,3}(?:,\d{3})*)', price_text)
-                price = int(price_match.group(1).replace(',', '')) if price_match else None
-                
-                results.append({
-                    'name': name_text,
-                    'card_number': card_number_formatted,
-                    'rarity': rarity_text,
-                    'price_yen': price
-                })
-            
-            browser.close()
-            
-            if not results:
-                print(f"No prices found for {card_number_formatted} after filtering.")
-                return None
-            
-            return results
+        url = f"{YUYUTEI_BASE_URL}/sell/opc/s/search?search_word={card_number_formatted}"
+
+        results = fetch_and_parse(url, lambda html: parse_yuyutei_search_html(html, card_number_formatted))
+
+        if not results:
+            print(f"No prices found for {card_number_formatted} on Yuyu-tei search page.")
+            return None
+
+        return results
 
     except Exception as e:
         print(f"Error fetching Yuyu-tei prices for '{card_number_formatted}': {e}")
@@ -154,127 +132,255 @@ def get_card_details_from_ai(user_description: str) -> Dict[str, Any]:
         return {"error": f"An unexpected error occurred: {e}"}
 
 # --- MODIFIED: Multimodal function now handles multiple cards and adds live pricing ---
-def get_card_details_from_ai_multimodal(user_description: str = None, image_paths: List[str] = None) -> List[Dict[str, Any]]:
-    # MODIFIED: Check for empty description AND empty image list
-    if not user_description and not image_paths:
-        return {"error": "No description or image provided."}
+MULTIMODAL_MODEL = "gpt-4o"
 
-    system_prompt = (
-        "You are an expert at extracting One Piece Card Game (OPTCG) details from images and text. "
-        "Your goal is to provide a **JSON list of objects**, one for each card. "
-        "If an image is provided, prioritize information from the image. "
-        "Each object must contain the following fields: 'name', 'set_name', "
-        "'card_number', 'rarity', 'color', 'quantity', "
-        "'purchase_price_original', 'original_currency', "
-        "'purchase_date' (YYYY-MM-DD), and 'image_url'. "
-        "For 'original_currency', identify the currency symbol (e.g., '¥', '$', 'SGD') and use its 3-letter code (e.g., 'JPY', 'USD', 'SGD'). If no currency is specified, assume it's 'SGD'. "
-        "If a field is not available, use sensible defaults (e.g., quantity: 1, price: 0.0, date: today's date, empty string for others). "
-        "For 'rarity', identify common rarities like SR, R, UC, C, or special versions like Parallel, "
-        "Manga Art, or Alt-Art (AA). "
-        "If the user mentions or if the card text/image includes \"P/L\", \"PL\", or \"Parallel Leader\", set the rarity to \"Parallel/Leader\" regardless of other rarity descriptions. "
-        "Ensure the output is valid JSON only, without any other text or explanation."
-    )
+MULTIMODAL_SYSTEM_PROMPT = (
+    "You are an expert at extracting One Piece Card Game (OPTCG) details from images and text. "
+    "Your goal is to provide a **JSON list of objects**, one for each card. "
+    "If an image is provided, prioritize information from the image. "
+    "Each object must contain the following fields: 'name', 'set_name', "
+    "'card_number', 'rarity', 'color', 'quantity', "
+    "'purchase_price_original', 'original_currency', "
+    "'purchase_date' (YYYY-MM-DD), and 'image_url'. "
+    "For 'original_currency', identify the currency symbol (e.g., '¥', '$', 'SGD') and use its 3-letter code (e.g., 'JPY', 'USD', 'SGD'). If no currency is specified, assume it's 'SGD'. "
+    "If a field is not available, use sensible defaults (e.g., quantity: 1, price: 0.0, date: today's date, empty string for others). "
+    "For 'rarity', identify common rarities like SR, R, UC, C, or special versions like Parallel, "
+    "Manga Art, or Alt-Art (AA). "
+    "If the user mentions or if the card text/image includes \"P/L\", \"PL\", or \"Parallel Leader\", set the rarity to \"Parallel/Leader\" regardless of other rarity descriptions. "
+    "Ensure the output is valid JSON only, without any other text or explanation."
+)
+
+# Cached extractions are only reused for the same model and prompt
+PROMPT_VERSION = hashlib.sha256(f"{MULTIMODAL_MODEL}\n{MULTIMODAL_SYSTEM_PROMPT}".encode('utf-8')).hexdigest()[:16]
+
+
+class AiExtractionError(Exception):
+    """The model call failed or its answer contained no usable cards."""
 
+
+def _build_multimodal_messages(user_description: str = None, images: List[Dict[str, Any]] = None):
     messages = [
-        {"role": "system", "content": system_prompt}
+        {"role": "system", "content": MULTIMODAL_SYSTEM_PROMPT}
     ]
 
     content_list = []
     if user_description:
         content_list.append({"type": "text", "text": user_description})
 
-    # NEW LOGIC: Loop through each image path and add it to the content list
-    if image_paths:
-        for image_path in image_paths:
-            try:
-                with open(image_path, "rb") as image_file:
-                    base64_image = base64.b64encode(image_file.read()).decode('utf-8')
-                content_list.append({
-                    "type": "image_url",
-                    "image_url": {
-                        "url": f"data:image/jpeg;base64,{base64_image}"
-                    }
-                })
-            except Exception as e:
-                return {"error": f"Error processing image file: {e}"}
+    # Images arrive already downscaled and encoded as data URLs
+    for image in images or []:
+        content_list.append({
+            "type": "image_url",
+            "image_url": {
+                "url": image['data_url'],
+                "detail": image['detail'],
+            }
+        })
 
     messages.append({"role": "user", "content": content_list})
+    return messages
 
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=messages,
-            max_tokens=4000
-        )
-        
-        ai_response_content = response.choices[0].message.content
-        
-        if ai_response_content is None:
-            return {"error": "AI response content was empty. The AI may not have been able to process the request."}
-        
-        json_match = re.search(r'(\[.*?\]|\{.*?\})', ai_response_content, re.DOTALL)
+
+def _extract_cards_with_ai(user_description: str = None, images: List[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """Wait for the complete model answer and return the card objects in it."""
+    response = client.chat.completions.create(
+        model=MULTIMODAL_MODEL,
+        messages=_build_multimodal_messages(user_description, images),
+        max_tokens=4000
+    )
+    
+    ai_response_content = response.choices[0].message.content
+    
+    if ai_response_content is None:
+        raise AiExtractionError("AI response content was empty. The AI may not have been able to process the request.")
+    return parse_json_objects(ai_response_content)
+
+
+def _stream_cards_with_ai(user_description: str = None, images: List[Dict[str, Any]] = None):
+    """Yield card objects from the streamed model answer as soon as each one is complete."""
+    response = client.chat.completions.create(
+        model=MULTIMODAL_MODEL,
+        messages=_build_multimodal_messages(user_description, images),
+        max_tokens=4000,
+        stream=True
+    )
+    parser = JsonObjectStream()
+    for chunk in response:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if delta:
+            yield from parser.feed(delta)
+
+
+class ExtractedCardMerger:
+    """Merges cards with the same (name, set_name, card_number), adding up their quantities."""
+
+    def __init__(self):
+        self._cards = {}
+        self._raw = {}
+
+    def add(self, card: Dict[str, Any]):
+        """Returns (card, is_new); for a duplicate, the earlier card with its quantity increased."""
+        # Use a unique key for each card based on its key properties
+        card_key = (card.get('name', ''), card.get('set_name', ''), card.get('card_number', ''))
         
-        if json_match:
-            json_string = json_match.group(1)
-            raw_card_data = json.loads(json_string)
+        if card_key in self._cards:
+            # If the card already exists, just add to the quantity
+            self._cards[card_key]['quantity'] += card.get('quantity', 1)
+            self._raw[card_key]['quantity'] += card.get('quantity', 1)
+            return self._cards[card_key], False
+        # Keep an untouched copy for the cache: callers normalize and price the card in place
+        self._raw[card_key] = dict(card)
+        self._cards[card_key] = card
+        return card, True
+
+    def raw_cards(self) -> List[Dict[str, Any]]:
+        return list(self._raw.values())
+
+
+def _iter_model_cards(user_description: str = None, images: List[Dict[str, Any]] = None, stream: bool = True):
+    """Raw card objects for one model call, replayed from the cache when possible."""
+    cached, cache_status = ai_extraction_cache.get(user_description, images, PROMPT_VERSION)
+    print(f"AI extraction cache {cache_status} for {len(images)} image(s).")
+
+    merger = ExtractedCardMerger()
+    try:
+        if cached is not None:
+            source = cached
+        elif stream:
+            source = _stream_cards_with_ai(user_description, images)
+        else:
+            source = _extract_cards_with_ai(user_description, images)
+        for card in source:
+            if isinstance(card, dict):
+                merger.add(dict(card))
+                yield card
+    except OpenAIError as e:
+        raise AiExtractionError(f"OpenAI API Error: {e.args[0]}")
+    except json.JSONDecodeError as e:
+        raise AiExtractionError(f"AI response was not in a valid JSON format: {e}")
 
-            if not isinstance(raw_card_data, list):
-                card_list = [raw_card_data]
-            else:
-                card_list = raw_card_data
-            
-            # NEW LOGIC: This new dictionary will store unique cards
-            final_card_map = {}
-            for card in card_list:
-                # Use a unique key for each card based on its key properties
-                card_key = (card.get('name', ''), card.get('set_name', ''), card.get('card_number', ''))
-                
-                if card_key in final_card_map:
-                    # If the card already exists, just add to the quantity
-                    final_card_map[card_key]['quantity'] += card.get('quantity', 1)
-                else:
-                    # If it's a new card, add it to the map
-                    final_card_map[card_key] = card
-                    
-            final_card_list = list(final_card_map.values())
-
-            # Now, process the list for live prices and other formatting
-            for card in final_card_list:
-                set_name = card.get('set_name', '')
-                card_number = card.get('card_number', '')
-                
-                 # --- ADD THIS NEW LINE RIGHT HERE ---
-                card['purchase_date'] = date.today().isoformat()
-                # ------------------------------------
-                
-                if set_name and card_number:
-                    full_card_number = f"{set_name}-{card_number.replace(f'{set_name}-', '')}"
-                    card['card_number'] = full_card_number
-                else:
-                    full_card_number = card_number
-                
-                if full_card_number:
-                    prices = get_yuyutei_prices_by_card_number(full_card_number)
-                    if prices:
-                        card['live_price_jpy'] = prices[0]['price_yen']
-                        print(f"Found live price for {full_card_number}: {card['live_price_jpy']} JPY")
-                    else:
-                        card['live_price_jpy'] = 0
-                        print(f"No live price found for {full_card_number}")
-                else:
-                    card['live_price_jpy'] = 0
-                        
-            return final_card_list
+    cards = merger.raw_cards()
+    if not cards:
+        raise AiExtractionError("AI response did not contain a valid JSON list or object.")
+    if cached is None:
+        # Cache the model's answer before live pricing, which changes over time
+        ai_extraction_cache.set(user_description, images, PROMPT_VERSION, cards)
 
-        else:
-            return {"error": "AI response did not contain a valid JSON list or object."}
 
-    except OpenAIError as e:
-        return {"error": f"OpenAI API Error: {e.args[0]}"}
+def iter_extracted_cards(user_description: str = None, images: List[Dict[str, Any]] = None, stream: bool = True):
+    """
+    Yield (card, is_new) for each card the model finds, as soon as it is found.
+
+    Cached answers are replayed without a model call. With `stream`, cards
+    are parsed incrementally from the streamed response so callers can start
+    pricing them before the model has finished. Duplicates are merged into
+    the card yielded first. Raises AiExtractionError on failure.
+    """
+    merger = ExtractedCardMerger()
+    for card in _iter_model_cards(user_description, images or [], stream):
+        yield merger.add(card)
+
+
+def iter_extracted_cards_in_chunks(user_description: str = None, images: List[Dict[str, Any]] = None,
+                                   chunk_size: int = 4, max_workers: int = 3, stream: bool = True, on_chunk=None):
+    """
+    Bulk import: extract cards from `chunk_size` images per model call, several calls at a time.
+
+    Chunks run on up to `max_workers` threads and cards from all of them are
+    merged with the same (name, set_name, card_number) key, yielding
+    (card, is_new) on the caller's thread as they arrive. A failed chunk is
+    reported through on_chunk(index, error) without losing the others;
+    AiExtractionError is raised only if every chunk fails.
+    """
+    # Imported here: the chunk workers need the app for database access
+    from flask import current_app
+
+    images = images or []
+    chunks = [images[i:i + chunk_size] for i in range(0, len(images), chunk_size)]
+    app = current_app._get_current_object()
+    results = queue.Queue()
+
+    def run_chunk(index, chunk):
+        # Every chunk gets the description (prices, currency) but only reports its own photos
+        first = index * chunk_size + 1
+        description = (f"{user_description or ''}\n(Photos {first}-{first + len(chunk) - 1} of {len(images)}; "
+                       f"only list cards visible in these photos.)").strip()
+        try:
+            with app.app_context():
+                for card in _iter_model_cards(description, chunk, stream):
+                    results.put(('card', index, card))
+            results.put(('done', index, None))
+        except Exception as e:
+            results.put(('failed', index, e))
+
+    merger = ExtractedCardMerger()
+    failures = []
+    executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix='ai-chunk')
+    try:
+        for index, chunk in enumerate(chunks):
+            executor.submit(run_chunk, index, chunk)
+        remaining = len(chunks)
+        while remaining:
+            kind, index, value = results.get()
+            if kind == 'card':
+                yield merger.add(value)
+                continue
+            remaining -= 1
+            if kind == 'failed':
+                print(f"AI extraction failed for image chunk {index + 1} of {len(chunks)}: {value}")
+                failures.append(value)
+            if on_chunk:
+                on_chunk(index, str(value) if value else None)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    if len(failures) == len(chunks):
+        raise AiExtractionError(str(failures[0]))
+
+
+def normalize_extracted_card(card: Dict[str, Any]) -> str:
+    """Stamp today's purchase date and a full 'SET-NNN' card number; returns the card number."""
+    set_name = card.get('set_name', '')
+    card_number = card.get('card_number', '')
     
-    except json.JSONDecodeError as e:
-        return {"error": f"AI response was not in a valid JSON format: {e}"}
+     # --- ADD THIS NEW LINE RIGHT HERE ---
+    card['purchase_date'] = date.today().isoformat()
+    # ------------------------------------
     
+    if set_name and card_number:
+        full_card_number = f"{set_name}-{card_number.replace(f'{set_name}-', '')}"
+        card['card_number'] = full_card_number
+    else:
+        full_card_number = card_number
+    return full_card_number
+
+
+def get_card_details_from_ai_multimodal(user_description: str = None, images: List[Dict[str, Any]] = None, stream: bool = True) -> List[Dict[str, Any]]:
+    """`images` are content parts built in memory by image_pipeline.prepare_image."""
+    # Imported here: enrichment uses the price cache, which imports this module
+    from enrichment import CardEnricher
+
+    # MODIFIED: Check for empty description AND empty image list
+    if not user_description and not images:
+        return {"error": "No description or image provided."}
+
+    try:
+        # Each card is handed to price enrichment as soon as the model emits it
+        enricher = CardEnricher()
+        final_card_list = []
+        for card, is_new in iter_extracted_cards(user_description, images, stream=stream):
+            if is_new:
+                final_card_list.append(card)
+                enricher.add(card)
+            enricher.poll()
+        enricher.finish()
+        return final_card_list
+
+    except AiExtractionError as e:
+        return {"error": str(e)}
+
     except Exception as e:
         return {"error": f"An unexpected error occurred: {e}"}
 
@@ -304,15 +410,19 @@ def generate_ai_confirmation_message(card_data_list: List[Dict[str, Any]]) -> st
     return " ".join(confirmation_messages)
 
 if __name__ == "__main__":
-    # Example usage for the single card function
-    description = "I got a Zoro from OP01, a Super Rare for $25."
-    details = get_card_details_from_ai(description)
-    print(f"Details from text: {details}")
-
-    # Example usage for the multi-card function
-    multi_description = "I bought 2 Ace SP cards for 30 SGD each and a Zoro SP card for 20 SGD."
-    multi_details = get_card_details_from_ai_multimodal(multi_description)
-    print(f"\nDetails from multi-card description: {multi_details}")
-    if not 'error' in multi_details:
-        confirmation = generate_ai_confirmation_message(multi_details)
-        print(f"Confirmation message: {confirmation}")
\ No newline at end of file
+    # The extraction pipeline reads its settings (cache, enrichment) from the Flask app
+    from app import create_app
+
+    with create_app().app_context():
+        # Example usage for the single card function
+        description = "I got a Zoro from OP01, a Super Rare for $25."
+        details = get_card_details_from_ai(description)
+        print(f"Details from text: {details}")
+
+        # Example usage for the multi-card function
+        multi_description = "I bought 2 Ace SP cards for 30 SGD each and a Zoro SP card for 20 SGD."
+        multi_details = get_card_details_from_ai_multimodal(multi_description)
+        print(f"\nDetails from multi-card description: {multi_details}")
+        if not 'error' in multi_details:
+            confirmation = generate_ai_confirmation_message(multi_details)
+            print(f"Confirmation message: {confirmation}")
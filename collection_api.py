@@ -0,0 +1,178 @@
+# collection_api.py
+import hashlib
+
+from flask import Blueprint, Response, current_app, jsonify, request, url_for
+from sqlalchemy import func
+
+from collection_stats import SORT_DIRECTIONS, SORT_KEYS, card_page
+from collection_summary import UNCOLLECTED, get_summaries, summary_to_dict
+from models import db, Collection, CollectionSummary
+
+api_bp = Blueprint('api', __name__)
+
+# Fields a client may ask for with ?fields=a,b,c
+CARD_FIELDS = ('id', 'name', 'set_name', 'card_number', 'rarity', 'color', 'quantity',
+               'purchase_price_original', 'original_currency', 'purchase_price_sgd',
+               'current_value_sgd', 'image_url', 'purchase_date', 'collection_id')
+COLLECTION_FIELDS = ('id', 'name', 'description', 'summary')
+
+
+class BadRequest(ValueError):
+    pass
+
+
+@api_bp.errorhandler(BadRequest)
+def bad_request(e):
+    return jsonify({'error': str(e)}), 400
+
+
+def requested_fields(allowed):
+    """The fields named in ?fields=, in `allowed` order; all of them if the parameter is absent."""
+    raw = request.args.get('fields')
+    if not raw:
+        return allowed
+    fields = {field.strip() for field in raw.split(',') if field.strip()}
+    unknown = fields.difference(allowed)
+    if unknown:
+        raise BadRequest(f"Unknown fields: {', '.join(sorted(unknown))}. Choose from: {', '.join(allowed)}")
+    return tuple(field for field in allowed if field in fields)
+
+
+def conditional_json(etag, build):
+    """
+    JSON response with a weak ETag; 304 if the client already has this version.
+
+    `build` is only called when the client's copy is out of date, so an
+    unchanged collection is served from the summary row alone.
+    """
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = jsonify(build())
+    response.set_etag(etag, weak=True)
+    # Clients may keep the body but must revalidate it on every use
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def collection_etag(collection_id):
+    """Version of one collection (0 = the uncollected cards), from its summary row."""
+    row = db.session.get(CollectionSummary, collection_id)
+    if row is None:
+        return f"c{collection_id}-v0"
+    # updated_at tells apart collections that reuse the id of a deleted one
+    return f"c{collection_id}-v{row.version}-{int(row.updated_at * 1000)}"
+
+
+def collections_etag():
+    collection_count = db.session.query(func.count(Collection.id)).scalar()
+    row_count, version_sum, last_update = db.session.query(
+        func.count(CollectionSummary.collection_id),
+        func.coalesce(func.sum(CollectionSummary.version), 0),
+        func.coalesce(func.max(CollectionSummary.updated_at), 0),
+    ).one()
+    state = f"{collection_count}:{row_count}:{version_sum}:{last_update!r}"
+    return 'collections-' + hashlib.sha1(state.encode('utf-8')).hexdigest()[:16]
+
+
+def get_collection_or_404(collection_id):
+    """The Collection, or None for 0 (the cards not in any collection)."""
+    if collection_id == UNCOLLECTED:
+        return None
+    return Collection.query.get_or_404(collection_id)
+
+
+def collection_to_dict(collection, summary, fields):
+    data = {
+        'id': collection.id if collection else UNCOLLECTED,
+        'name': collection.name if collection else 'All Cards',
+        'description': collection.description if collection else 'Cards not in any collection',
+        'summary': summary,
+    }
+    return {field: data[field] for field in fields}
+
+
+def card_to_dict(card, fields):
+    data = {field: getattr(card, field) for field in fields}
+    if data.get('purchase_date'):
+        data['purchase_date'] = data['purchase_date'].isoformat()
+    return data
+
+
+def page_limit():
+    try:
+        limit = int(request.args.get('limit', current_app.config['COLLECTION_PAGE_SIZE']))
+    except ValueError:
+        raise BadRequest("limit must be a number")
+    maximum = current_app.config['API_MAX_PAGE_SIZE']
+    if not 1 <= limit <= maximum:
+        raise BadRequest(f"limit must be between 1 and {maximum}")
+    return limit
+
+
+@api_bp.route('/collections')
+def list_collections():
+    """Every collection with its summary; collection 0 holds the cards not in any collection."""
+    fields = requested_fields(COLLECTION_FIELDS)
+
+    def build():
+        summaries = get_summaries()
+        collections = [None] + Collection.query.order_by(Collection.name).all()
+        return {'collections': [
+            collection_to_dict(collection, summaries.get(collection.id if collection else UNCOLLECTED, summary_to_dict(None)), fields)
+            for collection in collections
+        ]}
+
+    return conditional_json(collections_etag(), build)
+
+
+@api_bp.route('/collections/<int:collection_id>')
+def get_collection(collection_id):
+    collection = get_collection_or_404(collection_id)
+    fields = requested_fields(COLLECTION_FIELDS)
+    return conditional_json(
+        collection_etag(collection_id),
+        lambda: collection_to_dict(collection, summary_to_dict(db.session.get(CollectionSummary, collection_id)), fields),
+    )
+
+
+@api_bp.route('/collections/<int:collection_id>/summary')
+def get_collection_summary(collection_id):
+    get_collection_or_404(collection_id)
+    return conditional_json(
+        collection_etag(collection_id),
+        lambda: summary_to_dict(db.session.get(CollectionSummary, collection_id)),
+    )
+
+
+@api_bp.route('/collections/<int:collection_id>/cards')
+def list_collection_cards(collection_id):
+    """
+    One keyset-paginated page of a collection's cards.
+
+    Takes the collection table's parameters (sort, dir, after) plus limit
+    and fields; follow next_url until it is null.
+    """
+    get_collection_or_404(collection_id)
+    fields = requested_fields(CARD_FIELDS)
+    sort = request.args.get('sort', 'name')
+    direction = request.args.get('dir', 'asc')
+    if sort not in SORT_KEYS:
+        raise BadRequest(f"sort must be one of: {', '.join(SORT_KEYS)}")
+    if direction not in SORT_DIRECTIONS:
+        raise BadRequest(f"dir must be one of: {', '.join(SORT_DIRECTIONS)}")
+    after = request.args.get('after') or None
+    limit = page_limit()
+
+    def build():
+        try:
+            cards, next_cursor = card_page(collection_id or None, sort, direction, after, limit, columns=fields)
+        except ValueError as e:
+            raise BadRequest(str(e))
+        next_url = None
+        if next_cursor:
+            next_url = url_for('api.list_collection_cards', collection_id=collection_id, sort=sort, dir=direction,
+                               after=next_cursor, limit=limit, fields=request.args.get('fields'))
+        return {'cards': [card_to_dict(card, fields) for card in cards], 'next_cursor': next_cursor, 'next_url': next_url}
+
+    return conditional_json(collection_etag(collection_id), build)
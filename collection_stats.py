@@ -0,0 +1,102 @@
+# collection_stats.py
+import base64
+import json
+from datetime import date
+
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.orm import load_only
+
+from models import db, Card
+from collection_summary import get_summary
+
+# Sortable columns of the collection table; 'price_sgd' is the row's SGD total
+SORT_KEYS = {
+    'name': Card.name,
+    'price_sgd': func.coalesce(Card.purchase_price_sgd, 0) * Card.quantity,
+    'date': func.coalesce(Card.purchase_date, date.min),
+}
+SORT_DIRECTIONS = ('asc', 'desc')
+
+
+def _in_collection(collection_id):
+    """Cards in `collection_id`, or the cards not in any collection."""
+    return Card.collection_id == collection_id if collection_id else Card.collection_id.is_(None)
+
+
+def collection_totals(collection_id=None):
+    """
+    Totals and chart data for the collection page.
+
+    Totals are read from the collection's CollectionSummary row; only the
+    per-name chart values need a grouped query. Cards still awaiting
+    conversion count as 0 SGD. Returns the keyword arguments the collection
+    template expects.
+    """
+    by_name = db.session.execute(
+        select(Card.name, func.sum(func.coalesce(Card.purchase_price_sgd, 0)))
+        .where(_in_collection(collection_id))
+        .group_by(Card.name)
+        .order_by(Card.name)
+    ).all()
+    summary = get_summary(collection_id)
+
+    return {
+        'card_names': [name for name, _ in by_name],
+        # The chart shows the SGD purchase price of one copy of each card, summed per name
+        'card_values': {name: value for name, value in by_name},
+        'total_purchase_price_sgd': summary['cost_basis_sgd'],
+        'total_purchase_price_original': dict(sorted(summary['original_totals'].items())),
+        'pending_conversion_count': summary['pending_conversion_count'],
+        'card_count': summary['card_count'],
+    }
+
+
+# --- Keyset pagination of the collection table ---
+def encode_cursor(sort_value, card_id):
+    """Opaque cursor for the row after which the next page starts."""
+    if isinstance(sort_value, date):
+        sort_value = sort_value.isoformat()
+    return base64.urlsafe_b64encode(json.dumps([sort_value, card_id]).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, sort):
+    """(sort_value, card_id) from a cursor; raises ValueError if it is malformed."""
+    try:
+        sort_value, card_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if sort == 'date':
+            sort_value = date.fromisoformat(sort_value)
+        return sort_value, int(card_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def card_page(collection_id=None, sort='name', direction='asc', after=None, limit=100, columns=None):
+    """
+    One page of the collection table, sorted on the server.
+
+    Pages are keyset-paginated on (sort key, id): `after` is the cursor of
+    the last row already shown, so each page costs the same however deep
+    the user scrolls. `columns` limits the Card columns loaded (the id is
+    always loaded). Returns (cards, next_cursor); next_cursor is None on
+    the last page.
+    """
+    key = SORT_KEYS[sort]
+    descending = direction == 'desc'
+    query = db.session.query(Card, key).filter(_in_collection(collection_id))
+    if columns:
+        query = query.options(load_only(*[getattr(Card, column) for column in columns]))
+    if after:
+        sort_value, card_id = decode_cursor(after, sort)
+        if descending:
+            query = query.filter(or_(key < sort_value, and_(key == sort_value, Card.id < card_id)))
+        else:
+            query = query.filter(or_(key > sort_value, and_(key == sort_value, Card.id > card_id)))
+    order_by = (key.desc(), Card.id.desc()) if descending else (key, Card.id)
+    rows = query.order_by(*order_by).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last_card, last_value = rows[-1]
+        next_cursor = encode_cursor(last_value, last_card.id)
+    return [card for card, _ in rows], next_cursor
@@ -0,0 +1,255 @@
+# collection_summary.py
+import json
+import time
+
+from sqlalchemy import case, event, func, inspect, or_, select, update
+from sqlalchemy.orm import Session
+
+from models import db, Card, Collection, CollectionSummary
+
+UNCOLLECTED = 0  # CollectionSummary key of the cards that are not in any collection
+
+# Card columns that feed the summary; writes to any other column leave it untouched
+TRACKED_COLUMNS = ('collection_id', 'quantity', 'purchase_price_sgd', 'purchase_price_original',
+                   'original_currency', 'current_value_sgd')
+
+summary_table = CollectionSummary.__table__
+
+
+def summary_key(collection_id):
+    return collection_id or UNCOLLECTED
+
+
+def _contribution(values):
+    """What one card adds to its collection's summary, from its column values."""
+    quantity = values['quantity'] or 0
+    return {
+        'card_count': 1,
+        'total_quantity': quantity,
+        'cost_basis_sgd': (values['purchase_price_sgd'] or 0) * quantity,
+        'pending_conversion_count': 1 if values['purchase_price_sgd'] is None else 0,
+        'current_value_sgd': (values['current_value_sgd'] or 0) * quantity,
+        # Blank currencies count as SGD, like on the collection page
+        'original': {values['original_currency'] or 'SGD': (values['purchase_price_original'] or 0) * quantity},
+    }
+
+
+def _values(card, old=False):
+    """The card's tracked column values, as they are now or (with `old`) as they were loaded."""
+    state = inspect(card)
+    values = {}
+    for column in TRACKED_COLUMNS:
+        history = state.attrs[column].history
+        values[column] = history.deleted[0] if old and history.deleted else getattr(card, column)
+    return values
+
+
+def _touch(deltas, collection_id):
+    """Mark a collection as changed, so its version is bumped even if its totals are not."""
+    _add_delta(deltas, collection_id, {}, 0)
+
+
+def _add_delta(deltas, collection_id, contribution, sign):
+    delta = deltas.setdefault(summary_key(collection_id), {
+        'card_count': 0, 'total_quantity': 0, 'cost_basis_sgd': 0.0,
+        'pending_conversion_count': 0, 'current_value_sgd': 0.0, 'original': {},
+    })
+    for field, value in contribution.items():
+        if field == 'original':
+            for currency, total in value.items():
+                delta['original'][currency] = delta['original'].get(currency, 0.0) + sign * total
+        else:
+            delta[field] += sign * value
+
+
+def _apply_deltas(connection, deltas):
+    now = time.time()
+    for key, delta in deltas.items():
+        counters = {field: getattr(summary_table.c, field) + delta[field]
+                    for field in ('card_count', 'total_quantity', 'cost_basis_sgd', 'pending_conversion_count', 'current_value_sgd')}
+        # Updating the counters first takes SQLite's write lock, so the JSON read-modify-write below can't race
+        updated = connection.execute(
+            update(summary_table).where(summary_table.c.collection_id == key)
+            .values(updated_at=now, version=summary_table.c.version + 1, **counters)
+        ).rowcount
+        if updated:
+            original = json.loads(connection.execute(
+                select(summary_table.c.original_totals_json).where(summary_table.c.collection_id == key)
+            ).scalar() or '{}')
+        else:
+            original = {}
+        for currency, total in delta['original'].items():
+            original[currency] = original.get(currency, 0.0) + total
+        # Drop currencies the collection no longer holds
+        original = {currency: total for currency, total in original.items() if abs(total) > 1e-9}
+
+        if updated:
+            connection.execute(
+                update(summary_table).where(summary_table.c.collection_id == key)
+                .values(original_totals_json=json.dumps(original))
+            )
+        else:
+            connection.execute(summary_table.insert().values(
+                collection_id=key,
+                updated_at=now,
+                version=1,
+                original_totals_json=json.dumps(original),
+                **{field: delta[field] for field in counters},
+            ))
+
+
+def _before_flush(session, flush_context, instances):
+    # Old values are read before the flush, while deleted rows can still be loaded
+    deltas, changed = {}, []
+    for obj in session.dirty:
+        if obj in session.deleted or not session.is_modified(obj, include_collections=False):
+            continue
+        if isinstance(obj, Collection):
+            _touch(deltas, obj.id)
+            continue
+        if not isinstance(obj, Card):
+            continue
+        state = inspect(obj)
+        if any(state.attrs[column].history.has_changes() for column in TRACKED_COLUMNS):
+            # An update, including a move between collections, is the old contribution out and the new one in
+            old = _values(obj, old=True)
+            _add_delta(deltas, old['collection_id'], _contribution(old), -1)
+            changed.append(obj)
+        else:
+            # e.g. a new name or image: the totals stand, but the collection's data has changed
+            _touch(deltas, obj.collection_id)
+    for obj in session.deleted:
+        if isinstance(obj, Card):
+            old = _values(obj, old=True)
+            _add_delta(deltas, old['collection_id'], _contribution(old), -1)
+        elif isinstance(obj, Collection):
+            # Cards left in a deleted collection are un-collected by the flush
+            for card in obj.cards:
+                if card not in session.deleted and card not in changed:
+                    old = _values(card, old=True)
+                    _add_delta(deltas, old['collection_id'], _contribution(old), -1)
+                    changed.append(card)
+    session.info['collection_summary'] = (deltas, changed)
+
+
+def _after_flush(session, flush_context):
+    # New values are read after the flush, once column defaults have been applied
+    deltas, changed = session.info.pop('collection_summary', ({}, []))
+    for obj in [obj for obj in session.new if isinstance(obj, Card)] + changed:
+        _add_delta(deltas, obj.collection_id, _contribution(_values(obj)), +1)
+    for obj in session.new:
+        if isinstance(obj, Collection):
+            # Start new collections at a fresh version and timestamp, even if an old id is reused
+            _touch(deltas, obj.id)
+
+    connection = session.connection()
+    if deltas:
+        _apply_deltas(connection, deltas)
+    deleted_collections = [obj.id for obj in session.deleted if isinstance(obj, Collection)]
+    if deleted_collections:
+        connection.execute(summary_table.delete().where(summary_table.c.collection_id.in_(deleted_collections)))
+
+
+def register_summary_hooks():
+    """Keep CollectionSummary in step with ORM card inserts, updates, moves and deletes."""
+    if not event.contains(Session, 'after_flush', _after_flush):
+        event.listen(Session, 'before_flush', _before_flush)
+        event.listen(Session, 'after_flush', _after_flush)
+
+
+def affected_summary_keys(where):
+    """Summary keys of the collections holding the cards matched by `where`, read before a bulk statement."""
+    key = func.coalesce(Card.collection_id, UNCOLLECTED)
+    return set(db.session.execute(select(key).where(where).distinct()).scalars())
+
+
+def rebuild_collection_summaries(collection_ids=None):
+    """
+    Recompute summaries from the card table; returns the number of rows written.
+
+    Needed after bulk UPDATE/DELETE statements, which bypass the session
+    hooks (repricing, currency re-conversion, bulk card operations), and by
+    'flask rebuild-summaries'. With `collection_ids` (0 for the uncollected
+    cards) only those summaries are recomputed. Every version rewritten is
+    bumped, and collections without cards keep a zeroed row. The old rows
+    are deleted before the cards are read, so SQLite's write lock keeps
+    other writers out until the new rows are in.
+    """
+    key = func.coalesce(Card.collection_id, UNCOLLECTED)
+    purchase_price_sgd = func.coalesce(Card.purchase_price_sgd, 0)
+    summary_scope, card_scope = [], []
+    if collection_ids is not None:
+        keys = {summary_key(collection_id) for collection_id in collection_ids}
+        if not keys:
+            return 0
+        summary_scope = [summary_table.c.collection_id.in_(keys)]
+        # Filter on the column itself so the collection_id index can be used
+        in_keys = [Card.collection_id.in_([k for k in keys if k != UNCOLLECTED])]
+        if UNCOLLECTED in keys:
+            in_keys.append(Card.collection_id.is_(None))
+        card_scope = [or_(*in_keys)]
+    versions = dict(db.session.execute(
+        select(summary_table.c.collection_id, summary_table.c.version).where(*summary_scope)
+    ).all())
+    db.session.execute(summary_table.delete().where(*summary_scope))
+
+    rows = db.session.execute(
+        select(
+            key,
+            func.count(Card.id),
+            func.coalesce(func.sum(Card.quantity), 0),
+            func.coalesce(func.sum(purchase_price_sgd * Card.quantity), 0.0),
+            func.sum(case((Card.purchase_price_sgd.is_(None), 1), else_=0)),
+            func.coalesce(func.sum(func.coalesce(Card.current_value_sgd, 0) * Card.quantity), 0.0),
+        ).where(*card_scope).group_by(key)
+    ).all()
+    currency = func.coalesce(func.nullif(Card.original_currency, ''), 'SGD')
+    original = {}
+    for collection_id, code, total in db.session.execute(
+        select(key, currency, func.sum(Card.purchase_price_original * Card.quantity))
+        .where(*card_scope).group_by(key, currency)
+    ):
+        if total:
+            original.setdefault(collection_id, {})[code] = total
+
+    now = time.time()
+    summaries = {collection_id: {'collection_id': collection_id, 'card_count': 0, 'total_quantity': 0,
+                                 'cost_basis_sgd': 0.0, 'pending_conversion_count': 0, 'current_value_sgd': 0.0}
+                 for collection_id in versions}
+    for collection_id, card_count, total_quantity, cost_basis_sgd, pending, current_value_sgd in rows:
+        summaries[collection_id] = {'collection_id': collection_id, 'card_count': card_count,
+                                    'total_quantity': total_quantity, 'cost_basis_sgd': cost_basis_sgd,
+                                    'pending_conversion_count': pending, 'current_value_sgd': current_value_sgd}
+    for collection_id, summary in summaries.items():
+        summary.update(original_totals_json=json.dumps(original.get(collection_id, {})), updated_at=now,
+                       version=versions.get(collection_id, 0) + 1)
+    if summaries:
+        db.session.execute(summary_table.insert(), list(summaries.values()))
+    db.session.commit()
+    return len(summaries)
+
+
+def get_summary(collection_id=None):
+    """Totals for one collection (or the uncollected cards) as a dict; zeros if it has no cards."""
+    row = db.session.get(CollectionSummary, summary_key(collection_id))
+    return summary_to_dict(row)
+
+
+def get_summaries():
+    """{collection_id: summary dict} for every collection that has cards."""
+    return {row.collection_id: summary_to_dict(row) for row in CollectionSummary.query.all()}
+
+
+def summary_to_dict(row):
+    if row is None:
+        return {'card_count': 0, 'total_quantity': 0, 'cost_basis_sgd': 0.0, 'pending_conversion_count': 0,
+                'original_totals': {}, 'current_value_sgd': 0.0, 'version': 0}
+    return {
+        'card_count': row.card_count,
+        'total_quantity': row.total_quantity,
+        'cost_basis_sgd': row.cost_basis_sgd,
+        'pending_conversion_count': row.pending_conversion_count,
+        'original_totals': json.loads(row.original_totals_json),
+        'current_value_sgd': row.current_value_sgd,
+        'version': row.version,
+    }
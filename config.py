@@ -4,3 +4,42 @@ class Config:
     SECRET_KEY = os.getenv('SECRET_KEY', 'dev_secret_key')
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', 'sqlite:///instance/one_piece_tcg.sqlite')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    BROWSER_POOL_SIZE = int(os.getenv('BROWSER_POOL_SIZE', 2))
+    BROWSER_POOL_MAX_PAGES = int(os.getenv('BROWSER_POOL_MAX_PAGES', 200))
+    YUYUTEI_FETCH_MODE = os.getenv('YUYUTEI_FETCH_MODE', 'auto')
+    OUTBOUND_RATE = float(os.getenv('OUTBOUND_RATE', 2.0))
+    OUTBOUND_BURST = float(os.getenv('OUTBOUND_BURST', 5))
+    OUTBOUND_MAX_CONCURRENCY = int(os.getenv('OUTBOUND_MAX_CONCURRENCY', 4))
+    OUTBOUND_MAX_WAIT = float(os.getenv('OUTBOUND_MAX_WAIT', 5.0))
+    BREAKER_FAILURE_THRESHOLD = int(os.getenv('BREAKER_FAILURE_THRESHOLD', 5))
+    BREAKER_COOLDOWN = float(os.getenv('BREAKER_COOLDOWN', 30.0))
+    FX_RATE_TTL = int(os.getenv('FX_RATE_TTL', 12 * 3600))
+    FX_PENDING_INTERVAL = int(os.getenv('FX_PENDING_INTERVAL', 30))
+    FX_PENDING_WORKER = os.getenv('FX_PENDING_WORKER', 'true').lower() in ('1', 'true', 'yes')
+    FX_PENDING_MAX_ATTEMPTS = int(os.getenv('FX_PENDING_MAX_ATTEMPTS', 10))
+    COLLECTION_PAGE_SIZE = int(os.getenv('COLLECTION_PAGE_SIZE', 100))
+    API_MAX_PAGE_SIZE = int(os.getenv('API_MAX_PAGE_SIZE', 500))
+    PRICE_CACHE_LRU_SIZE = int(os.getenv('PRICE_CACHE_LRU_SIZE', 512))
+    PRICE_CACHE_FRESH_TTL = int(os.getenv('PRICE_CACHE_FRESH_TTL', 6 * 3600))
+    PRICE_CACHE_STALE_TTL = int(os.getenv('PRICE_CACHE_STALE_TTL', 7 * 24 * 3600))
+    LIVE_PRICE_BATCH_WORKERS = int(os.getenv('LIVE_PRICE_BATCH_WORKERS', 4))
+    CATALOG_TTL = int(os.getenv('CATALOG_TTL', 24 * 3600))
+    CATALOG_MAX_PAGES = int(os.getenv('CATALOG_MAX_PAGES', 20))
+    CATALOG_PAGE_RETRIES = int(os.getenv('CATALOG_PAGE_RETRIES', 1))
+    PRICE_REFRESH_INTERVAL = int(os.getenv('PRICE_REFRESH_INTERVAL', 0))
+    REPRICE_MAX_CARDS_PER_RUN = int(os.getenv('REPRICE_MAX_CARDS_PER_RUN', 100))
+    REPRICE_MIN_INTERVAL = float(os.getenv('REPRICE_MIN_INTERVAL', 2.0))
+    AI_IMAGE_DETAIL = os.getenv('AI_IMAGE_DETAIL', 'high')
+    AI_IMAGE_MAX_SIDE = int(os.getenv('AI_IMAGE_MAX_SIDE', 2048))
+    AI_IMAGE_SHORT_SIDE = int(os.getenv('AI_IMAGE_SHORT_SIDE', 768))
+    AI_IMAGE_JPEG_QUALITY = int(os.getenv('AI_IMAGE_JPEG_QUALITY', 85))
+    AI_CACHE_MAX_BYTES = int(os.getenv('AI_CACHE_MAX_BYTES', 5 * 1024 * 1024))
+    AI_CACHE_DHASH_DISTANCE = int(os.getenv('AI_CACHE_DHASH_DISTANCE', 0))
+    AI_JOB_CONCURRENCY = int(os.getenv('AI_JOB_CONCURRENCY', 2))
+    AI_JOB_LEASE = int(os.getenv('AI_JOB_LEASE', 600))
+    AI_STREAMING = os.getenv('AI_STREAMING', 'true').lower() in ('1', 'true', 'yes')
+    JOB_EVENTS_POLL_INTERVAL = float(os.getenv('JOB_EVENTS_POLL_INTERVAL', 0.3))
+    AI_BULK_CHUNK_SIZE = int(os.getenv('AI_BULK_CHUNK_SIZE', 4))
+    AI_BULK_MAX_WORKERS = int(os.getenv('AI_BULK_MAX_WORKERS', 3))
+    ENRICH_MAX_WORKERS = int(os.getenv('ENRICH_MAX_WORKERS', 4))
+    ENRICH_CARD_TIMEOUT = float(os.getenv('ENRICH_CARD_TIMEOUT', 20.0))
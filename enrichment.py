@@ -0,0 +1,153 @@
+# enrichment.py
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import date
+
+from flask import current_app
+
+from chatbot_service import normalize_extracted_card
+from fx_service import fx_service
+from price_cache import price_cache
+
+
+class CardEnricher:
+    """
+    Attach live prices to extracted cards, concurrently and within a time budget.
+
+    Cards are added one at a time, e.g. as the model streams them: each is
+    normalized and its price lookup, plus any exchange rate the save step
+    will need, starts right away on a pool of `max_workers` threads. A
+    lookup still running `timeout` seconds after it started is abandoned and
+    the card keeps a 0 price, so one slow scrape never holds up the batch.
+
+    `on_card(index, timing)` is called on the caller's thread (from poll()
+    and finish()) as each card completes, e.g. to record job progress.
+    Timings carry a status ('priced', 'no_price', 'failed' or 'timeout'),
+    elapsed_ms and any error.
+    """
+
+    def __init__(self, max_workers=None, timeout=None, on_card=None):
+        config = current_app.config
+        self.max_workers = max_workers or config.get('ENRICH_MAX_WORKERS', 4)
+        self.timeout = timeout or config.get('ENRICH_CARD_TIMEOUT', 20.0)
+        self.on_card = on_card
+        self.app = current_app._get_current_object()
+        self.cards = []
+        self.timings = {'cards': [], 'fx': []}
+        self._card_numbers = []
+        self._fx_requested = set()
+        self._tasks = {}
+        self._started_at = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, self.max_workers), thread_name_prefix='enrich')
+        self._began = time.monotonic()
+
+    # --- Scheduling ---
+    def _submit(self, task_key, fn, *args):
+        def timed():
+            with self._lock:
+                self._started_at[task_key] = time.monotonic()
+            with self.app.app_context():
+                return fn(*args)
+
+        self._tasks[self._executor.submit(timed)] = task_key
+
+    def _request_rate(self, currency, on_date):
+        if (currency, on_date) not in self._fx_requested:
+            self._fx_requested.add((currency, on_date))
+            self._submit(('fx', (currency, on_date)), fx_service.get_exchange_rate_on, currency, on_date)
+
+    @staticmethod
+    def _lookup_price(card_number):
+        prices, cache_status, _ = price_cache.get(card_number)
+        return prices, cache_status
+
+    def add(self, card):
+        """Normalize `card` and start its lookups; returns its index."""
+        index = len(self.cards)
+        card_number = normalize_extracted_card(card)
+        card['live_price_jpy'] = 0
+        self.cards.append(card)
+        self._card_numbers.append(card_number)
+        self.timings['cards'].append(None)
+
+        currency = (card.get('original_currency') or 'SGD').upper()
+        if currency != 'SGD':
+            self._request_rate(currency, date.fromisoformat(card['purchase_date']))
+        if card_number:
+            # Live prices are in yen; current values are stored in SGD
+            self._request_rate('JPY', date.today())
+            self._submit(('card', index), self._lookup_price, card_number)
+        else:
+            self._record(('card', index), 'no_price')
+        return index
+
+    # --- Collecting results ---
+    def _record(self, task_key, status, error=None, cache=None):
+        kind, ref = task_key
+        with self._lock:
+            started_at = self._started_at.get(task_key)
+        timing = {'status': status, 'elapsed_ms': round((time.monotonic() - started_at) * 1000) if started_at else 0}
+        if error:
+            timing['error'] = error
+        if kind == 'fx':
+            timing.update({'currency': ref[0], 'date': ref[1].isoformat()})
+            self.timings['fx'].append(timing)
+            return
+        timing['card_number'] = self._card_numbers[ref]
+        if cache:
+            timing['cache'] = cache
+        self.timings['cards'][ref] = timing
+        if self.on_card:
+            self.on_card(ref, timing)
+
+    def poll(self, block=0):
+        """Record finished and timed-out lookups, waiting up to `block` seconds for one."""
+        done, _ = wait(self._tasks, timeout=block, return_when=FIRST_COMPLETED) if self._tasks else (set(), None)
+        for future in done:
+            task_key = self._tasks.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                self._record(task_key, 'failed', error=str(e))
+                continue
+            if task_key[0] == 'fx':
+                self._record(task_key, 'done' if result else 'failed')
+                continue
+            prices, cache_status = result
+            if prices:
+                self.cards[task_key[1]]['live_price_jpy'] = prices[0]['price_yen']
+            self._record(task_key, 'priced' if prices else 'no_price', cache=cache_status)
+
+        # Abandon lookups that have been running for longer than the per-card budget
+        now = time.monotonic()
+        with self._lock:
+            expired = [future for future, task_key in self._tasks.items()
+                       if task_key in self._started_at and now - self._started_at[task_key] > self.timeout]
+        for future in expired:
+            self._record(self._tasks.pop(future), 'timeout', error=f"No result after {self.timeout:.0f} seconds")
+
+    def cancel(self):
+        """Drop the lookups that haven't started; running ones finish on their own."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def finish(self):
+        """Wait for the remaining lookups and return all timings."""
+        try:
+            while self._tasks:
+                self.poll(block=0.25)
+        finally:
+            self.cancel()
+        self.timings['elapsed_ms'] = round((time.monotonic() - self._began) * 1000)
+        timed_out = sum(1 for timing in self.timings['cards'] if timing and timing['status'] == 'timeout')
+        print(f"Enriched {len(self.cards)} cards in {self.timings['elapsed_ms']} ms ({timed_out} timed out).")
+        return self.timings
+
+
+def enrich_cards(cards, max_workers=None, timeout=None, on_card=None):
+    """Enrich an already complete list of cards in place; returns the timings."""
+    enricher = CardEnricher(max_workers, timeout, on_card)
+    for card in cards:
+        enricher.add(card)
+    return enricher.finish()
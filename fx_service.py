@@ -0,0 +1,353 @@
+# fx_service.py
+import os
+import threading
+import time
+from datetime import date, timedelta
+
+import requests
+from requests.adapters import HTTPAdapter
+from sqlalchemy import and_, case, func, or_, select, update
+
+from collection_summary import affected_summary_keys, rebuild_collection_summaries
+from models import db, Card, DailyRate, ExchangeRate
+from outbound_guard import OutboundCallRejected, guard_for
+
+FRANKFURTER_BASE_URL = os.getenv('FRANKFURTER_BASE_URL', 'https://api.frankfurter.app')
+
+
+class ExchangeRateService:
+    """
+    Latest exchange rates from Frankfurter, cached in memory and in SQLite.
+
+    All rates for a base currency are fetched with a single call and kept
+    for `ttl` seconds, so converting many cards in the same currency costs
+    at most one network round-trip. When a refresh fails, the last known
+    rates are used rather than silently converting to 0.
+    """
+
+    def __init__(self, ttl=12 * 3600, timeout=5):
+        self.ttl = ttl
+        self.timeout = timeout
+        self._rates = {}
+        self._lock = threading.Lock()
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=8)
+        self._session.mount('https://', adapter)
+        self._session.mount('http://', adapter)
+
+    def init_app(self, app):
+        self.ttl = app.config.get('FX_RATE_TTL', self.ttl)
+
+    # --- Storage layers ---
+    def _load_from_db(self, base):
+        rows = ExchangeRate.query.filter_by(base=base).all()
+        if not rows:
+            return None
+        return {row.quote: row.rate for row in rows}, min(row.fetched_at for row in rows)
+
+    def _store(self, base, rates, fetched_at):
+        with self._lock:
+            self._rates[base] = (rates, fetched_at)
+        try:
+            ExchangeRate.query.filter_by(base=base).delete(synchronize_session=False)
+            db.session.add_all([
+                ExchangeRate(base=base, quote=quote, rate=rate, fetched_at=fetched_at)
+                for quote, rate in rates.items()
+            ])
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error caching exchange rates for {base}: {e}")
+
+    def _fetch(self, base):
+        url = f"{FRANKFURTER_BASE_URL}/latest?from={base}"
+        with guard_for(url).call():
+            response = self._session.get(url, timeout=self.timeout)
+            response.raise_for_status()
+        return response.json()['rates']
+
+    # --- Lookups ---
+    def get_rates(self, base, offline=False):
+        """
+        All known rates from `base`, as {quote: rate}, or None if unavailable.
+
+        With `offline`, only fresh cached rates are returned and the network
+        is never touched.
+        """
+        base = base.upper()
+        with self._lock:
+            cached = self._rates.get(base)
+        if cached is None:
+            cached = self._load_from_db(base)
+            if cached is not None:
+                with self._lock:
+                    self._rates[base] = cached
+
+        if cached is not None and time.time() - cached[1] <= self.ttl:
+            return cached[0]
+        if offline:
+            return None
+
+        try:
+            rates = self._fetch(base)
+        except (requests.exceptions.RequestException, OutboundCallRejected, ValueError, KeyError) as e:
+            print(f"Error fetching exchange rates for {base}: {e}")
+            if cached is not None:
+                print(f"Using cached {base} rates from {int(time.time() - cached[1])} seconds ago.")
+                return cached[0]
+            return None
+
+        self._store(base, rates, time.time())
+        return rates
+
+    def get_exchange_rate(self, from_currency, to_currency='SGD', offline=False):
+        """Rate to convert one unit of `from_currency` into `to_currency`, or None."""
+        if not from_currency or from_currency == to_currency:
+            return 1.0
+        rates = self.get_rates(from_currency, offline=offline)
+        rate = rates.get(to_currency.upper()) if rates else None
+        if not rate:
+            if offline:
+                return None
+            print(f"Error: Rate for {from_currency} to {to_currency} not available.")
+            return None
+        return rate
+
+    # --- Historical daily rates ---
+    def backfill(self, base, start, end, quote='SGD'):
+        """
+        Store daily `base`->`quote` rates for a whole date range with one call.
+
+        Frankfurter only publishes rates on working days, so the range may
+        come back with gaps; lookups use the closest earlier day.
+        Returns the number of days stored.
+        """
+        base, quote = base.upper(), quote.upper()
+        end = min(end, date.today())
+        if start > end:
+            return 0
+        url = f"{FRANKFURTER_BASE_URL}/{start.isoformat()}..{end.isoformat()}?from={base}&to={quote}"
+        try:
+            with guard_for(url).call():
+                response = self._session.get(url, timeout=self.timeout)
+                response.raise_for_status()
+            daily = response.json()['rates']
+        except (requests.exceptions.RequestException, OutboundCallRejected, ValueError, KeyError) as e:
+            print(f"Error backfilling {base} rates from {start} to {end}: {e}")
+            return 0
+
+        DailyRate.query.filter(
+            DailyRate.base == base, DailyRate.quote == quote,
+            DailyRate.date >= start, DailyRate.date <= end,
+        ).delete(synchronize_session=False)
+        db.session.add_all([
+            DailyRate(date=date.fromisoformat(day), base=base, quote=quote, rate=rates[quote])
+            for day, rates in daily.items()
+            if quote in rates
+        ])
+        db.session.commit()
+        return len(daily)
+
+    def _daily_rate(self, base, quote, on_date):
+        row = (DailyRate.query
+               .filter(DailyRate.base == base, DailyRate.quote == quote,
+                       DailyRate.date <= on_date, DailyRate.date >= on_date - timedelta(days=7))
+               .order_by(DailyRate.date.desc())
+               .first())
+        return row.rate if row else None
+
+    def get_exchange_rate_on(self, from_currency, on_date, to_currency='SGD', offline=False):
+        """
+        Rate on `on_date` (e.g. a card's purchase date), or None.
+
+        Missing days are backfilled on demand; today and future dates, or
+        dates with no published rate, use the latest rate. With `offline`,
+        only rates already stored locally are used.
+        """
+        if not from_currency or from_currency == to_currency:
+            return 1.0
+        if on_date is None or on_date >= date.today():
+            return self.get_exchange_rate(from_currency, to_currency, offline=offline)
+
+        base, quote = from_currency.upper(), to_currency.upper()
+        rate = self._daily_rate(base, quote, on_date)
+        if rate is None and not offline:
+            self.backfill(base, on_date - timedelta(days=7), on_date, quote)
+            rate = self._daily_rate(base, quote, on_date)
+        return rate or self.get_exchange_rate(from_currency, to_currency, offline=offline)
+
+    def prefetch(self, currencies):
+        """Warm the cache for every base currency in a batch, one call per currency."""
+        for currency in {c.upper() for c in currencies if c}:
+            if currency != 'SGD':
+                self.get_rates(currency)
+
+
+fx_service = ExchangeRateService()
+
+
+def get_exchange_rate(from_currency, to_currency='SGD', offline=False):
+    return fx_service.get_exchange_rate(from_currency, to_currency, offline=offline)
+
+
+def get_exchange_rate_on(from_currency, on_date, to_currency='SGD', offline=False):
+    return fx_service.get_exchange_rate_on(from_currency, on_date, to_currency, offline=offline)
+
+
+def convert_to_sgd_offline(amount, currency, on_date):
+    """
+    Convert a purchase price to SGD using only rates already stored locally.
+
+    Returns None when no rate is available yet; callers save the card with
+    a pending conversion (NULL SGD price) and call
+    request_pending_conversion() once it is committed.
+    """
+    rate = get_exchange_rate_on(currency, on_date, offline=True)
+    return amount * rate if rate else None
+
+
+def reconvert_purchase_prices(zeroed_only=False, pending_only=False, where=None):
+    """
+    Recompute Card.purchase_price_sgd from the rate on each card's purchase date.
+
+    Daily rates are backfilled with one call per currency covering every
+    purchase date, then the cards are converted by one set-based UPDATE.
+    With `zeroed_only`, only cards whose SGD price is 0 (typically failed
+    conversions) are touched; with `pending_only`, only cards saved with a
+    pending conversion (NULL SGD price); with both, either kind. `where`
+    narrows it to any other selection of cards (see bulk_cards.py). Like
+    get_exchange_rate_on(), cards without a purchase date get the latest
+    rate, and a date only uses a rate from up to a week before it.
+    Returns the number of cards updated.
+    """
+    same_currency = or_(Card.original_currency.is_(None), Card.original_currency == 'SGD')
+    foreign = and_(Card.original_currency.isnot(None), Card.original_currency != 'SGD')
+    kinds = []
+    if zeroed_only:
+        kinds.append(and_(Card.purchase_price_sgd == 0, Card.purchase_price_original != 0))
+    if pending_only:
+        kinds.append(Card.purchase_price_sgd.is_(None))
+    scope = [or_(*kinds)] if kinds else []
+    if where is not None:
+        scope.append(where)
+    purchase_date = func.coalesce(Card.purchase_date, date.today())
+
+    ranges = db.session.execute(
+        select(Card.original_currency, func.min(purchase_date), func.max(purchase_date))
+        .where(foreign, *scope)
+        .group_by(Card.original_currency)
+    ).all()
+    for currency, first_date, last_date in ranges:
+        if first_date is None:
+            continue
+        # Reach back a week so purchases on weekends find the previous working day
+        fx_service.backfill(currency, first_date - timedelta(days=7), last_date)
+
+    rate_on_purchase_date = (
+        select(DailyRate.rate)
+        .where(DailyRate.base == Card.original_currency, DailyRate.quote == 'SGD',
+               DailyRate.date <= purchase_date,
+               # The same week of lookback as _daily_rate()
+               DailyRate.date >= func.date(purchase_date, '-7 days'))
+        .order_by(DailyRate.date.desc())
+        .limit(1)
+        .correlate(Card)
+        .scalar_subquery()
+    )
+    # SGD purchases need no rate at all; foreign ones are skipped until a rate is stored
+    convertible = and_(or_(same_currency, rate_on_purchase_date.isnot(None)), *scope)
+    summary_keys = affected_summary_keys(convertible)
+    converted = db.session.execute(
+        update(Card)
+        .where(convertible)
+        .values(purchase_price_sgd=case(
+            (same_currency, Card.purchase_price_original),
+            else_=Card.purchase_price_original * rate_on_purchase_date,
+        ))
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    if converted:
+        # The bulk UPDATE bypasses the session hooks that keep cost bases in the summaries
+        rebuild_collection_summaries(summary_keys)
+
+    print(f"Re-converted {converted} cards.")
+    return converted
+
+
+# --- Background conversion of cards saved with a pending SGD price ---
+_pending_conversion = threading.Event()
+_worker_lock = threading.Lock()
+
+
+def request_pending_conversion():
+    """Wake the pending conversion worker instead of waiting for its next tick."""
+    _pending_conversion.set()
+
+
+def pending_cards_due(interval, max_attempts, now=None):
+    """
+    Ids of the pending cards worth another conversion attempt.
+
+    After each attempt that finds no rate, a card waits twice as long as
+    before (interval, 2x, 4x, ...); after `max_attempts` it is left for
+    'flask fx-reconvert --pending-only' or an edit.
+    """
+    now = now if now is not None else time.time()
+    rows = (db.session.query(Card.id, Card.conversion_attempts, Card.conversion_attempted_at)
+            .filter(Card.purchase_price_sgd.is_(None), Card.conversion_attempts < max_attempts))
+    return [card_id for card_id, attempts, attempted_at in rows
+            if not attempts or now >= (attempted_at or 0) + interval * 2 ** (attempts - 1)]
+
+
+def convert_pending_cards(interval, max_attempts):
+    """One pass of the pending conversion worker; returns the number of cards converted."""
+    due = pending_cards_due(interval, max_attempts)
+    if not due:
+        return 0
+    converted = reconvert_purchase_prices(pending_only=True, where=Card.id.in_(due))
+
+    still_pending = and_(Card.id.in_(due), Card.purchase_price_sgd.is_(None))
+    failed = db.session.execute(
+        update(Card).where(still_pending)
+        .values(conversion_attempts=Card.conversion_attempts + 1, conversion_attempted_at=time.time())
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    gave_up = db.session.query(func.count(Card.id)).filter(still_pending, Card.conversion_attempts >= max_attempts).scalar()
+    db.session.commit()
+    if failed:
+        print(f"{failed} pending card(s) still have no exchange rate; will retry later.")
+    if gave_up:
+        print(f"Gave up converting {gave_up} card(s) after {max_attempts} attempts; "
+              f"fix their currency or run 'flask fx-reconvert --pending-only'.")
+    return converted
+
+
+def run_pending_conversion_worker(app, interval):
+    """Convert pending cards in batches, every `interval` seconds or when woken."""
+    max_attempts = app.config.get('FX_PENDING_MAX_ATTEMPTS', 10)
+    while True:
+        _pending_conversion.wait(interval)
+        _pending_conversion.clear()
+        with app.app_context():
+            try:
+                convert_pending_cards(interval, max_attempts)
+            except Exception as e:
+                db.session.rollback()
+                print(f"Error converting pending card prices: {e}")
+
+
+def start_pending_conversion_worker(app, interval):
+    """Start the worker once per app; called from the first web request, never from CLI commands."""
+    with _worker_lock:
+        if 'fx_pending_worker' in app.extensions:
+            return app.extensions['fx_pending_worker']
+        thread = threading.Thread(
+            target=run_pending_conversion_worker,
+            args=(app, interval),
+            name='fx-pending-conversion',
+            daemon=True,
+        )
+        app.extensions['fx_pending_worker'] = thread
+    thread.start()
+    return thread
@@ -0,0 +1,157 @@
+# image_pipeline.py
+import base64
+import hashlib
+import io
+import os
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional: without it images are sent as uploaded
+    Image = None
+
+# Formats the OpenAI vision endpoint accepts
+SUPPORTED_MIME_TYPES = ('image/jpeg', 'image/png', 'image/webp', 'image/gif')
+
+_settings = {
+    # 'high' keeps enough resolution to read card numbers on a binder page, 'low' is a 512px preview
+    'detail': os.getenv('AI_IMAGE_DETAIL', 'high'),
+    'max_side': int(os.getenv('AI_IMAGE_MAX_SIDE', 2048)),
+    'short_side': int(os.getenv('AI_IMAGE_SHORT_SIDE', 768)),
+    'jpeg_quality': int(os.getenv('AI_IMAGE_JPEG_QUALITY', 85)),
+}
+
+
+class UnsupportedImageError(ValueError):
+    pass
+
+
+def configure_image_pipeline(detail=None, max_side=None, short_side=None, jpeg_quality=None):
+    if detail is not None:
+        if detail not in ('low', 'high', 'auto'):
+            raise ValueError(f"AI_IMAGE_DETAIL must be 'low', 'high' or 'auto', got '{detail}'")
+        _settings['detail'] = detail
+    if max_side is not None:
+        _settings['max_side'] = int(max_side)
+    if short_side is not None:
+        _settings['short_side'] = int(short_side)
+    if jpeg_quality is not None:
+        _settings['jpeg_quality'] = int(jpeg_quality)
+
+
+def sniff_mime_type(data):
+    """Detect the real image type from its magic bytes, whatever the filename says."""
+    if data.startswith(b'\xff\xd8\xff'):
+        return 'image/jpeg'
+    if data.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'image/png'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'image/webp'
+    if data[:6] in (b'GIF87a', b'GIF89a'):
+        return 'image/gif'
+    if data[4:8] == b'ftyp' and data[8:12] in (b'heic', b'heix', b'mif1', b'msf1'):
+        return 'image/heic'
+    return None
+
+
+def target_size(width, height, detail, max_side, short_side):
+    """
+    Largest size the model will actually look at.
+
+    OpenAI fits 'high' detail images into a max_side square and then scales
+    the shortest side down to short_side, and 'low' detail images to 512px,
+    so any extra resolution is uploaded only to be thrown away.
+    """
+    if detail == 'low':
+        scale = min(1.0, 512 / max(width, height))
+    else:
+        scale = min(1.0, max_side / max(width, height))
+        if min(width, height) * scale > short_side:
+            scale = short_side / min(width, height)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def dhash(image, hash_size=8):
+    """
+    64-bit difference hash as 16 hex digits.
+
+    Re-shoots of the same binder page differ in their bytes but produce
+    hashes only a few bits apart.
+    """
+    small = image.convert('L').resize((hash_size + 1, hash_size), Image.LANCZOS)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            value = (value << 1) | (left > right)
+    return f"{value:0{hash_size * hash_size // 4}x}"
+
+
+def hamming_distance(hash_a, hash_b):
+    return bin(int(hash_a, 16) ^ int(hash_b, 16)).count('1')
+
+
+def _recompress(data, detail):
+    with Image.open(io.BytesIO(data)) as image:
+        # Phone photos are often stored sideways with an EXIF rotation flag
+        image = ImageOps.exif_transpose(image)
+        perceptual_hash = dhash(image)
+        size = target_size(image.width, image.height, detail, _settings['max_side'], _settings['short_side'])
+        if size != image.size:
+            image = image.resize(size, Image.LANCZOS)
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        buffer = io.BytesIO()
+        image.save(buffer, format='JPEG', quality=_settings['jpeg_quality'], optimize=True)
+        return buffer.getvalue(), size, perceptual_hash
+
+
+def prepare_image(data, detail=None):
+    """
+    Turn raw upload bytes into an OpenAI image content part, entirely in memory.
+
+    With Pillow installed the image is downscaled to what the model will see
+    and re-encoded as JPEG; without it, supported formats are sent as-is
+    with their real MIME type.
+
+    Returns:
+        Dict: 'data_url', 'detail', 'mime_type', 'original_bytes', 'bytes',
+        'size', plus 'sha256' of the bytes sent and a perceptual 'dhash'
+        (None without Pillow) for caching extraction results.
+    """
+    detail = detail or _settings['detail']
+    mime_type = sniff_mime_type(data)
+    if mime_type is None:
+        raise UnsupportedImageError("Unrecognised image format; please upload a JPEG, PNG, WEBP or GIF.")
+
+    encoded, size, perceptual_hash = data, None, None
+    if Image is not None:
+        try:
+            recompressed, size, perceptual_hash = _recompress(data, detail)
+        except Exception as e:
+            if mime_type not in SUPPORTED_MIME_TYPES:
+                raise UnsupportedImageError(f"Could not read {mime_type} image: {e}")
+            print(f"Sending image unmodified, could not recompress it: {e}")
+        else:
+            # Small, already-compressed images can come out larger; keep whichever is smaller
+            if mime_type not in SUPPORTED_MIME_TYPES or len(recompressed) < len(data):
+                encoded, mime_type = recompressed, 'image/jpeg'
+    elif mime_type not in SUPPORTED_MIME_TYPES:
+        raise UnsupportedImageError(f"{mime_type} images need Pillow installed to be converted.")
+
+    return {
+        'data_url': f"data:{mime_type};base64,{base64.b64encode(encoded).decode('ascii')}",
+        'detail': detail,
+        'mime_type': mime_type,
+        'original_bytes': len(data),
+        'bytes': len(encoded),
+        'size': size,
+        'sha256': hashlib.sha256(encoded).hexdigest(),
+        'dhash': perceptual_hash,
+    }
+
+
+def prepare_uploads(files, detail=None):
+    """Prepare every non-empty werkzeug FileStorage upload without touching disk."""
+    return [prepare_image(file.read(), detail) for file in files if file and file.filename]
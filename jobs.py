@@ -0,0 +1,297 @@
+# jobs.py
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from sqlalchemy import and_, or_, update
+
+from models import db, Card, IngestJob
+from chatbot_service import (
+    AiExtractionError, generate_ai_confirmation_message, iter_extracted_cards, iter_extracted_cards_in_chunks,
+)
+from enrichment import CardEnricher
+from fx_service import convert_to_sgd_offline, get_exchange_rate, request_pending_conversion
+
+STAGES = ('extract', 'enrich', 'save')
+
+
+def _new_progress():
+    return {
+        'stages': {stage: {'status': 'pending'} for stage in STAGES},
+        'cards': [],
+        'messages': [],
+    }
+
+
+def current_value_sgd(live_price_jpy, jpy_to_sgd):
+    """SGD value of a live yen price; None when there is no price or no rate to convert it with."""
+    if not live_price_jpy:
+        return 0.0
+    if not jpy_to_sgd:
+        return None
+    return round(float(live_price_jpy) * jpy_to_sgd, 2)
+
+
+def build_cards(card_data_list, collection_id):
+    """
+    Turn extracted card dicts into unsaved Card rows.
+
+    Only locally stored exchange rates are used; cards without one are saved
+    with a pending SGD price for the background conversion worker.
+    Returns (cards, messages, pending_conversion) where messages are
+    (message, category) pairs for the user.
+    """
+    # Live prices come back in yen; current_value_sgd is stored in SGD.
+    # Only cached rates are used; without one the value is stored as unknown (NULL),
+    # not 0, until the repricer or an edit fills it in.
+    jpy_to_sgd = get_exchange_rate('JPY', 'SGD', offline=True) if any(card_data.get('live_price_jpy') for card_data in card_data_list) else None
+    cards, messages, pending_conversion = [], [], False
+
+    for card_data in card_data_list:
+        purchase_price_original = card_data.get('purchase_price_original', 0.0)
+        original_currency = card_data.get('original_currency', 'SGD')
+        purchase_date = date.fromisoformat(card_data.get('purchase_date', date.today().isoformat()))
+
+        if original_currency and original_currency != 'SGD':
+            purchase_price_sgd = convert_to_sgd_offline(purchase_price_original, original_currency, purchase_date)
+            if purchase_price_sgd is not None:
+                messages.append((f"Converted {purchase_price_original} {original_currency} to {purchase_price_sgd:.2f} SGD.", "info"))
+            else:
+                pending_conversion = True
+                messages.append((f"The SGD price for {original_currency} {purchase_price_original} will be filled in shortly.", "info"))
+        else:
+            purchase_price_sgd = purchase_price_original
+
+        cards.append(Card(
+            name=card_data.get('name'), set_name=card_data.get('set_name'),
+            card_number=card_data.get('card_number'), rarity=card_data.get('rarity'),
+            color=card_data.get('color'), quantity=int(card_data.get('quantity', 1)),
+            purchase_price_original=purchase_price_original,
+            original_currency=original_currency,
+            purchase_price_sgd=purchase_price_sgd,
+            current_value_sgd=current_value_sgd(card_data.get('live_price_jpy'), jpy_to_sgd),  # Use live price as current value
+            image_url=card_data.get('image_url'),
+            purchase_date=purchase_date,
+            collection_id=collection_id
+        ))
+
+    return cards, messages, pending_conversion
+
+
+class IngestJobQueue:
+    """
+    Runs "Add Card with AI" submissions as background jobs.
+
+    Jobs are stored in the `ingest_job` table and executed by a pool of
+    `max_workers` threads: extraction, per-card price enrichment, then one
+    transaction that inserts the cards and marks the job done. Jobs left
+    queued or running by a restart are picked up again by the next web
+    process; extraction results are cached, so re-running one is cheap.
+    A job is claimed atomically before it runs, and a running job is only
+    taken over once it has made no progress for `lease` seconds, so several
+    web processes can share the table without running a job twice.
+    """
+
+    def __init__(self, max_workers=2, lease=600):
+        self.max_workers = max_workers
+        self.lease = lease
+        self.app = None
+        self._executor = None
+        self._resumed = False
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        self.max_workers = app.config.get('AI_JOB_CONCURRENCY', self.max_workers)
+        self.lease = app.config.get('AI_JOB_LEASE', self.lease)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, self.max_workers), thread_name_prefix='ingest-job')
+
+    def submit(self, description, images, collection_id=None):
+        now = time.time()
+        job = IngestJob(
+            id=uuid.uuid4().hex,
+            status='queued',
+            description=description,
+            images_json=json.dumps(images),
+            collection_id=collection_id,
+            progress_json=json.dumps(_new_progress()),
+            created_at=now,
+            updated_at=now,
+        )
+        db.session.add(job)
+        db.session.commit()
+        self._executor.submit(self._run, job.id)
+        return job
+
+    def resume_pending(self):
+        """Re-enqueue unfinished jobs once per process (called from the first request)."""
+        with self._lock:
+            if self._resumed:
+                return
+            self._resumed = True
+        jobs = (db.session.query(IngestJob.id, IngestJob.status, IngestJob.updated_at)
+                .filter(IngestJob.status.in_(('queued', 'running')))
+                .order_by(IngestJob.created_at)
+                .all())
+        for job_id, status, updated_at in jobs:
+            wait = updated_at + self.lease - time.time() if status == 'running' else 0
+            if wait > 0:
+                # Possibly still running in another process; retry once its lease runs out
+                timer = threading.Timer(wait + 1, self._executor.submit, (self._run, job_id))
+                timer.daemon = True
+                timer.start()
+            else:
+                self._executor.submit(self._run, job_id)
+        if jobs:
+            print(f"Resumed {len(jobs)} unfinished AI ingest job(s).")
+
+    # --- Job execution ---
+    def _run(self, job_id):
+        with self.app.app_context():
+            try:
+                self._process(job_id)
+            except Exception as e:
+                db.session.rollback()
+                print(f"AI ingest job {job_id} failed: {e}")
+                job = db.session.get(IngestJob, job_id)
+                if job is not None:
+                    progress = json.loads(job.progress_json)
+                    self._fail(job, progress, f"An error occurred while saving the card(s): {e}")
+
+    def _save_progress(self, job, progress):
+        job.progress_json = json.dumps(progress)
+        job.updated_at = time.time()
+        db.session.commit()
+
+    def _start_stage(self, job, progress, stage, **extra):
+        progress['stages'][stage] = {'status': 'running', 'started_at': time.time(), **extra}
+        self._save_progress(job, progress)
+
+    def _finish_stage(self, progress, stage):
+        progress['stages'][stage]['status'] = 'done'
+        progress['stages'][stage]['finished_at'] = time.time()
+
+    def _fail(self, job, progress, error):
+        for stage in progress['stages'].values():
+            if stage['status'] == 'running':
+                stage['status'] = 'failed'
+        job.status = 'failed'
+        job.error = error
+        job.images_json = None
+        self._save_progress(job, progress)
+
+    def _claim(self, job_id):
+        now = time.time()
+        claimed = db.session.execute(
+            update(IngestJob)
+            .where(IngestJob.id == job_id, or_(
+                IngestJob.status == 'queued',
+                and_(IngestJob.status == 'running', IngestJob.updated_at < now - self.lease),
+            ))
+            .values(status='running', updated_at=now)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+        return claimed == 1
+
+    def _process(self, job_id):
+        if not self._claim(job_id):
+            return
+        job = db.session.get(IngestJob, job_id)
+        # A resumed job starts over; nothing was saved unless it reached 'done'
+        progress = _new_progress()
+
+        self._start_stage(job, progress, 'extract')
+        self._start_stage(job, progress, 'enrich', done=0, total=0)
+        card_data_list = []
+
+        def on_card(index, timing):
+            progress['cards'][index].update(timing, live_price_jpy=card_data_list[index]['live_price_jpy'])
+            progress['stages']['enrich']['done'] += 1
+            self._save_progress(job, progress)
+
+        def on_chunk(index, error):
+            chunks = progress['stages']['extract']
+            chunks['chunks_done'] += 1
+            if error:
+                chunks['chunks_failed'].append({'chunk': index + 1, 'error': error})
+                progress['messages'].append((f"Photos in batch {index + 1} could not be read: {error}", 'warning'))
+            self._save_progress(job, progress)
+
+        config = self.app.config
+        images = json.loads(job.images_json or '[]')
+        chunk_size = config.get('AI_BULK_CHUNK_SIZE', 4)
+        if chunk_size and len(images) > chunk_size:
+            # Bulk import: photos are split into chunks that are sent to the model in parallel
+            chunk_count = -(-len(images) // chunk_size)
+            progress['stages']['extract'].update(chunks=chunk_count, chunks_done=0, chunks_failed=[])
+            extracted = iter_extracted_cards_in_chunks(
+                job.description, images, chunk_size=chunk_size, max_workers=config.get('AI_BULK_MAX_WORKERS', 3),
+                stream=config.get('AI_STREAMING', True), on_chunk=on_chunk,
+            )
+        else:
+            extracted = iter_extracted_cards(job.description, images, stream=config.get('AI_STREAMING', True))
+
+        # Cards are priced as the model streams them, so extraction and enrichment overlap
+        enricher = CardEnricher(on_card=on_card)
+        extracted_all = False
+        try:
+            for card, is_new in extracted:
+                if is_new:
+                    card_data_list.append(card)
+                    progress['cards'].append({'name': card.get('name'), 'card_number': card.get('card_number'),
+                                              'rarity': card.get('rarity'), 'quantity': card.get('quantity', 1),
+                                              'status': 'pending'})
+                    progress['stages']['enrich']['total'] += 1
+                    enricher.add(card)
+                else:
+                    index = next(i for i, existing in enumerate(card_data_list) if existing is card)
+                    progress['cards'][index]['quantity'] = card.get('quantity', 1)
+                self._save_progress(job, progress)
+                enricher.poll()
+            extracted_all = True
+        except AiExtractionError as e:
+            enricher.finish()
+            return self._fail(job, progress, f"Error from AI: {e}")
+        finally:
+            if not extracted_all:
+                # Any other error fails the job in _run(); stop its price and FX lookups too
+                enricher.cancel()
+        self._finish_stage(progress, 'extract')
+
+        timings = enricher.finish()
+        progress['stages']['enrich']['fx'] = timings['fx']
+        self._finish_stage(progress, 'enrich')
+
+        self._start_stage(job, progress, 'save')
+        cards, messages, pending_conversion = build_cards(card_data_list, job.collection_id)
+        db.session.add_all(cards)
+        db.session.flush()
+        self._finish_stage(progress, 'save')
+        progress['messages'] += messages + [(generate_ai_confirmation_message(card_data_list), 'success')]
+        job.card_ids_json = json.dumps([card.id for card in cards])
+        job.status = 'done'
+        job.images_json = None
+        # The cards and the 'done' status are committed together, so a resumed job never inserts twice
+        self._save_progress(job, progress)
+        if pending_conversion:
+            request_pending_conversion()
+
+    @staticmethod
+    def to_dict(job):
+        return {
+            'id': job.id,
+            'status': job.status,
+            'collection_id': job.collection_id,
+            'card_ids': json.loads(job.card_ids_json) if job.card_ids_json else [],
+            'error': job.error,
+            'created_at': job.created_at,
+            'updated_at': job.updated_at,
+            **json.loads(job.progress_json),
+        }
+
+
+ingest_jobs = IngestJobQueue()
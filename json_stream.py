@@ -0,0 +1,83 @@
+# json_stream.py
+import json
+
+
+class JsonObjectStream:
+    """
+    Incrementally pull complete JSON objects out of streamed model output.
+
+    The model answers with either a list of objects or a single object,
+    sometimes wrapped in prose or a ```json fence. Text is fed in chunks as
+    it arrives and every object is returned as soon as its closing brace is
+    seen: the elements of a top-level list, or the top-level object itself.
+    Nested objects and braces inside strings are tracked properly, unlike a
+    non-greedy regex.
+    """
+
+    def __init__(self):
+        self._buffer = []
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._object_depth = None  # depth at which an emitted object starts
+        self._start = None
+        self._text = ''
+        self.finished = False
+
+    def feed(self, chunk):
+        """Consume `chunk` and return the list of objects it completed."""
+        objects = []
+        if self.finished or not chunk:
+            return objects
+        offset = len(self._text)
+        self._text += chunk
+
+        for i in range(offset, len(self._text)):
+            char = self._text[i]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if self._object_depth is None:
+                # Skip any prose until the JSON value starts
+                if char == '[':
+                    self._object_depth = 1
+                    self._depth = 1
+                elif char == '{':
+                    self._object_depth = 0
+                    self._depth = 1
+                    self._start = i
+                continue
+
+            if char == '"':
+                self._in_string = True
+            elif char in '[{':
+                if char == '{' and self._depth == self._object_depth:
+                    self._start = i
+                self._depth += 1
+            elif char in ']}':
+                self._depth -= 1
+                if char == '}' and self._depth == self._object_depth and self._start is not None:
+                    objects.append(json.loads(self._text[self._start:i + 1]))
+                    self._start = None
+                if self._depth == 0:
+                    self.finished = True
+                    break
+
+        # Drop text that can no longer be part of an unfinished object
+        keep_from = self._start if self._start is not None else len(self._text)
+        if keep_from > 0:
+            self._text = self._text[keep_from:]
+            if self._start is not None:
+                self._start = 0
+        return objects
+
+
+def parse_json_objects(text):
+    """All objects in a complete response, e.g. the elements of its JSON list."""
+    return JsonObjectStream().feed(text)
@@ -0,0 +1,94 @@
+# migrations.py
+import time
+
+from sqlalchemy import func, text
+from sqlalchemy.exc import IntegrityError
+
+from collection_summary import rebuild_collection_summaries
+from models import db, SchemaMigration
+
+
+def _card_and_wishlist_indexes():
+    # Same names as the indexes in models.py, so fresh databases (built by create_all) are left alone
+    for statement in (
+        "CREATE INDEX IF NOT EXISTS ix_card_collection_id_name ON card (collection_id, name)",
+        "CREATE INDEX IF NOT EXISTS ix_card_card_number_rarity ON card (card_number, rarity)",
+        "CREATE INDEX IF NOT EXISTS ix_wishlist_item_priority_card_name ON wishlist_item (priority DESC, card_name)",
+    ):
+        db.session.execute(text(statement))
+
+
+def _collection_summaries():
+    # Totals for the cards that existed before the summary table was maintained
+    rebuild_collection_summaries()
+
+
+def _collection_summary_version():
+    # SQLite has no ADD COLUMN IF NOT EXISTS; databases created after this change already have it
+    columns = {row[1] for row in db.session.execute(text("PRAGMA table_info(collection_summary)"))}
+    if 'version' not in columns:
+        db.session.execute(text("ALTER TABLE collection_summary ADD COLUMN version INTEGER NOT NULL DEFAULT 0"))
+
+
+def _reprice_attempts():
+    # Failed lookups used to be recorded as price points without a price; they become attempts
+    db.session.execute(text(
+        "INSERT OR IGNORE INTO reprice_attempt (card_number, attempted_at, succeeded_at, consecutive_failures) "
+        "SELECT card_number, MAX(observed_at), MAX(CASE WHEN rarity IS NOT NULL THEN observed_at END), 0 "
+        "FROM price_point GROUP BY card_number"
+    ))
+    db.session.execute(text(
+        "DELETE FROM price_point WHERE rarity IS NULL AND price_jpy IS NULL AND price_sgd IS NULL"
+    ))
+
+
+def _card_conversion_attempts():
+    columns = {row[1] for row in db.session.execute(text("PRAGMA table_info(card)"))}
+    if 'conversion_attempts' not in columns:
+        db.session.execute(text("ALTER TABLE card ADD COLUMN conversion_attempts INTEGER NOT NULL DEFAULT 0"))
+    if 'conversion_attempted_at' not in columns:
+        db.session.execute(text("ALTER TABLE card ADD COLUMN conversion_attempted_at FLOAT"))
+
+
+# (version, name, function); append new migrations at the end and never renumber
+MIGRATIONS = [
+    (1, 'card_and_wishlist_indexes', _card_and_wishlist_indexes),
+    (2, 'collection_summaries', _collection_summaries),
+    (3, 'collection_summary_version', _collection_summary_version),
+    (4, 'reprice_attempts', _reprice_attempts),
+    (5, 'card_conversion_attempts', _card_conversion_attempts),
+]
+
+
+def schema_version():
+    """Highest migration version applied to the database, 0 if none."""
+    return db.session.query(func.max(SchemaMigration.version)).scalar() or 0
+
+
+def run_migrations():
+    """
+    Apply pending migrations in order and return the names of those applied.
+
+    db.create_all() only creates missing tables; migrations change tables
+    that already exist, e.g. adding indexes to an older SQLite file. Each
+    one is recorded in the schema_migration table. SQLite may run DDL
+    outside the surrounding transaction, so migrations must be safe to run
+    twice (CREATE ... IF NOT EXISTS); if another process records the same
+    version first, the duplicate is ignored.
+    """
+    current = schema_version()
+    applied = []
+    for version, name, migrate in MIGRATIONS:
+        if version <= current:
+            continue
+        try:
+            migrate()
+            db.session.add(SchemaMigration(version=version, name=name, applied_at=time.time()))
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            print(f"Migration {version} ({name}) was applied by another process.")
+            continue
+        print(f"Applied migration {version}: {name}")
+        applied.append(name)
+    return applied
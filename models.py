@@ -1,6 +1,6 @@
 # models.py
 from flask_sqlalchemy import SQLAlchemy
-from datetime import date
+from datetime import date, datetime
 
 db = SQLAlchemy()
 
@@ -21,7 +21,11 @@ class Card(db.Model):
     
     purchase_price_original = db.Column(db.Float, default=0.0)
     original_currency = db.Column(db.String(10), default='SGD')
-    purchase_price_sgd = db.Column(db.Float, default=0.0)
+    # NULL while the conversion is pending (no exchange rate stored yet)
+    purchase_price_sgd = db.Column(db.Float)
+    # Background conversions that found no rate yet; the worker backs off and gives up after FX_PENDING_MAX_ATTEMPTS
+    conversion_attempts = db.Column(db.Integer, nullable=False, default=0)
+    conversion_attempted_at = db.Column(db.Float)  # Unix timestamp
     current_value_sgd = db.Column(db.Float, default=0.0)
     image_url = db.Column(db.String(500))
     purchase_date = db.Column(db.Date, default=date.today)
@@ -29,9 +33,112 @@ class Card(db.Model):
     # New foreign key to link to a Collection
     collection_id = db.Column(db.Integer, db.ForeignKey('collection.id'), nullable=True)
 
+    # Existing databases get these from migrations.py; keep the names in sync
+    __table_args__ = (
+        # Collection pages filter on collection_id and sort/group by name
+        db.Index('ix_card_collection_id_name', 'collection_id', 'name'),
+        # Price lookups by card number; the leading column also serves card_number-only lookups
+        db.Index('ix_card_card_number_rarity', 'card_number', 'rarity'),
+    )
+
 class WishlistItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     card_name = db.Column(db.String(150), nullable=False)
     set_name = db.Column(db.String(150))
     target_price_sgd = db.Column(db.Float, default=0.0)
-    priority = db.Column(db.String(50), default='Medium')
\ No newline at end of file
+    priority = db.Column(db.String(50), default='Medium')
+
+    # Matches the wishlist page's ORDER BY priority DESC, card_name
+    __table_args__ = (
+        db.Index('ix_wishlist_item_priority_card_name', priority.desc(), card_name),
+    )
+
+class CollectionSummary(db.Model):
+    # Running totals per collection, kept in step with card writes by collection_summary.py.
+    # collection_id 0 holds the cards that are not in any collection.
+    collection_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    card_count = db.Column(db.Integer, nullable=False, default=0)
+    total_quantity = db.Column(db.Integer, nullable=False, default=0)
+    cost_basis_sgd = db.Column(db.Float, nullable=False, default=0.0)  # pending conversions count as 0
+    pending_conversion_count = db.Column(db.Integer, nullable=False, default=0)
+    original_totals_json = db.Column(db.Text, nullable=False, default='{}')  # {currency: total}
+    current_value_sgd = db.Column(db.Float, nullable=False, default=0.0)
+    updated_at = db.Column(db.Float, nullable=False)  # Unix timestamp
+    # Bumped by every write to the collection or its cards; the JSON API's ETags are built from it
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+class SchemaMigration(db.Model):
+    # One row per migration from migrations.py that has been applied to this database
+    version = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    applied_at = db.Column(db.Float, nullable=False)  # Unix timestamp
+
+class PriceCacheEntry(db.Model):
+    # Last Yuyu-tei scrape for a normalized card number, stored as JSON
+    card_number = db.Column(db.String(20), primary_key=True)
+    prices_json = db.Column(db.Text, nullable=False)
+    fetched_at = db.Column(db.Float, nullable=False)  # Unix timestamp
+
+class CatalogPrice(db.Model):
+    # One Yuyu-tei listing row per card number and rarity variant, from set crawls
+    id = db.Column(db.Integer, primary_key=True)
+    set_code = db.Column(db.String(10), nullable=False, index=True)
+    card_number = db.Column(db.String(20), nullable=False, index=True)
+    rarity = db.Column(db.String(50), nullable=False)
+    name = db.Column(db.String(300))
+    price_yen = db.Column(db.Integer)
+    crawled_at = db.Column(db.Float, nullable=False)  # Unix timestamp
+
+class PricePoint(db.Model):
+    # Append-only history of observed market prices per card number and rarity
+    id = db.Column(db.Integer, primary_key=True)
+    card_number = db.Column(db.String(20), nullable=False, index=True)
+    rarity = db.Column(db.String(50))
+    price_jpy = db.Column(db.Integer)
+    price_sgd = db.Column(db.Float)
+    observed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+class RepriceAttempt(db.Model):
+    # Last repricing lookup per card number, successful or not; orders the refresh queue
+    card_number = db.Column(db.String(20), primary_key=True)
+    attempted_at = db.Column(db.DateTime, nullable=False)
+    succeeded_at = db.Column(db.DateTime)
+    consecutive_failures = db.Column(db.Integer, nullable=False, default=0)
+
+class ExchangeRate(db.Model):
+    # Latest Frankfurter rates, one row per currency pair, refreshed after a TTL
+    base = db.Column(db.String(10), primary_key=True)
+    quote = db.Column(db.String(10), primary_key=True)
+    rate = db.Column(db.Float, nullable=False)
+    fetched_at = db.Column(db.Float, nullable=False)  # Unix timestamp
+
+class DailyRate(db.Model):
+    # Historical daily Frankfurter rates, backfilled in ranges for purchase-date conversion
+    date = db.Column(db.Date, primary_key=True)
+    base = db.Column(db.String(10), primary_key=True)
+    quote = db.Column(db.String(10), primary_key=True)
+    rate = db.Column(db.Float, nullable=False)
+
+class AiExtractionCacheEntry(db.Model):
+    # Cards extracted by the model for one set of images + description, keyed by content hash
+    key = db.Column(db.String(64), primary_key=True)
+    context_key = db.Column(db.String(64), nullable=False, index=True)  # prompt version + description
+    image_dhashes = db.Column(db.Text)  # JSON list, for near-duplicate lookups
+    cards_json = db.Column(db.Text, nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    hits = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.Float, nullable=False)  # Unix timestamp
+    last_used_at = db.Column(db.Float, nullable=False, index=True)
+
+class IngestJob(db.Model):
+    # One "Add Card with AI" submission, processed in the background and resumed after restarts
+    id = db.Column(db.String(32), primary_key=True)
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)  # queued, running, done, failed
+    description = db.Column(db.Text)
+    images_json = db.Column(db.Text)  # Prepared data URLs; cleared once the job finishes
+    collection_id = db.Column(db.Integer, db.ForeignKey('collection.id'), nullable=True)
+    progress_json = db.Column(db.Text, nullable=False, default='{}')
+    card_ids_json = db.Column(db.Text)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.Float, nullable=False)  # Unix timestamp
+    updated_at = db.Column(db.Float, nullable=False)
@@ -0,0 +1,194 @@
+# outbound_guard.py
+import os
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+
+class OutboundCallRejected(Exception):
+    """Raised when a guard refuses an outbound call instead of letting it queue."""
+
+
+class CircuitOpenError(OutboundCallRejected):
+    pass
+
+
+class TokenBucket:
+    """Allows `rate` calls per second on average, with bursts of up to `capacity`."""
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _try_take(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            wait = self._try_take()
+            if wait == 0.0:
+                return True
+            if time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls
+    for `cooldown` seconds. After the cooldown a single probe call is let
+    through: success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, failure_threshold, cooldown):
+        self.failure_threshold = int(failure_threshold)
+        self.cooldown = float(cooldown)
+        self.state = 'closed'
+        self.trips = 0
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self._opened_at >= self.cooldown:
+                self.state = 'half_open'
+            if self.state == 'half_open' and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def release_probe(self):
+        """Give back a half-open probe that was allowed but never made."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self.state == 'half_open' or self._failures >= self.failure_threshold:
+                if self.state != 'open':
+                    self.trips += 1
+                self.state = 'open'
+                self._opened_at = time.monotonic()
+
+
+def counts_as_failure(exc):
+    """
+    Whether an exception says the host is unhealthy.
+
+    HTTP errors below 500 (e.g. a 404 for a card that isn't listed) are
+    answers from a working host, so they don't trip the breaker; 5xx
+    responses, timeouts, connection errors and anything else do.
+    """
+    status = getattr(getattr(exc, 'response', None), 'status_code', None)
+    return status is None or status >= 500
+
+
+class HostGuard:
+    """Rate limit, concurrency limit and circuit breaker for one upstream host."""
+
+    def __init__(self, host, rate, burst, max_concurrency, max_wait, failure_threshold, cooldown):
+        self.host = host
+        self.max_wait = float(max_wait)
+        self.bucket = TokenBucket(rate, burst)
+        self.breaker = CircuitBreaker(failure_threshold, cooldown)
+        self._slots = threading.BoundedSemaphore(int(max_concurrency))
+        self._lock = threading.Lock()
+        self.counters = {'calls': 0, 'failures': 0, 'client_errors': 0,
+                         'rejected_circuit': 0, 'rejected_rate': 0, 'rejected_concurrency': 0}
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    @contextmanager
+    def call(self):
+        if not self.breaker.allow():
+            self._count('rejected_circuit')
+            raise CircuitOpenError(f"Circuit open for {self.host}; skipping call.")
+        if not self.bucket.acquire(self.max_wait):
+            self._count('rejected_rate')
+            self.breaker.release_probe()
+            raise OutboundCallRejected(f"Rate limit reached for {self.host}.")
+        if not self._slots.acquire(timeout=self.max_wait):
+            self._count('rejected_concurrency')
+            self.breaker.release_probe()
+            raise OutboundCallRejected(f"Too many concurrent calls to {self.host}.")
+        self._count('calls')
+        try:
+            yield
+        except Exception as e:
+            if counts_as_failure(e):
+                self._count('failures')
+                self.breaker.record_failure()
+            else:
+                self._count('client_errors')
+                self.breaker.record_success()
+            raise
+        else:
+            self.breaker.record_success()
+        finally:
+            self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+        stats.update({'state': self.breaker.state, 'trips': self.breaker.trips})
+        return stats
+
+
+# --- Registry of guards, one per host, sharing the same default limits ---
+_settings = {
+    'rate': float(os.getenv('OUTBOUND_RATE', 2.0)),
+    'burst': float(os.getenv('OUTBOUND_BURST', 5)),
+    'max_concurrency': int(os.getenv('OUTBOUND_MAX_CONCURRENCY', 4)),
+    'max_wait': float(os.getenv('OUTBOUND_MAX_WAIT', 5.0)),
+    'failure_threshold': int(os.getenv('BREAKER_FAILURE_THRESHOLD', 5)),
+    'cooldown': float(os.getenv('BREAKER_COOLDOWN', 30.0)),
+}
+_guards = {}
+_guards_lock = threading.Lock()
+
+
+def configure_outbound_guards(**settings):
+    """Update the default limits. Guards created before the call keep their limits."""
+    _settings.update({key: value for key, value in settings.items() if value is not None})
+
+
+def guard_for(url_or_host):
+    host = urlparse(url_or_host).hostname or url_or_host
+    with _guards_lock:
+        guard = _guards.get(host)
+        if guard is None:
+            guard = HostGuard(host, **_settings)
+            _guards[host] = guard
+        return guard
+
+
+def outbound_stats():
+    with _guards_lock:
+        guards = list(_guards.values())
+    return {guard.host: guard.stats() for guard in guards}
@@ -0,0 +1,158 @@
+# price_cache.py
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from models import db, PriceCacheEntry
+from chatbot_service import normalize_card_number
+from catalog import lookup_prices
+
+
+class PriceCache:
+    """
+    Two-level cache for Yuyu-tei live prices, keyed by normalized card number.
+
+    A small in-process LRU sits in front of the `price_cache_entry` SQLite
+    table. Entries younger than `fresh_ttl` are served as hits; entries
+    younger than `stale_ttl` are served immediately as stale while a
+    background thread re-scrapes them. Anything older is fetched inline.
+    """
+
+    def __init__(self, fetch_prices, max_entries=512, fresh_ttl=6 * 3600, stale_ttl=7 * 24 * 3600):
+        self.fetch_prices = fetch_prices
+        self.max_entries = max_entries
+        self.fresh_ttl = fresh_ttl
+        self.stale_ttl = stale_ttl
+        self.app = None
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self._refreshing = set()
+
+    def init_app(self, app):
+        self.app = app
+        self.max_entries = app.config.get('PRICE_CACHE_LRU_SIZE', self.max_entries)
+        self.fresh_ttl = app.config.get('PRICE_CACHE_FRESH_TTL', self.fresh_ttl)
+        self.stale_ttl = app.config.get('PRICE_CACHE_STALE_TTL', self.stale_ttl)
+
+    # --- In-process LRU ---
+    def _lru_get(self, key):
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry is not None:
+                self._lru.move_to_end(key)
+            return entry
+
+    def _lru_put(self, key, prices, fetched_at):
+        with self._lock:
+            self._lru[key] = (prices, fetched_at)
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.max_entries:
+                self._lru.popitem(last=False)
+
+    # --- SQLite layer ---
+    def _db_get(self, key):
+        row = db.session.get(PriceCacheEntry, key)
+        if row is None:
+            return None
+        entry = (json.loads(row.prices_json), row.fetched_at)
+        self._lru_put(key, *entry)
+        return entry
+
+    def set(self, card_number, prices, fetched_at=None):
+        key = normalize_card_number(card_number)
+        fetched_at = fetched_at or time.time()
+        db.session.merge(PriceCacheEntry(card_number=key, prices_json=json.dumps(prices), fetched_at=fetched_at))
+        db.session.commit()
+        self._lru_put(key, prices, fetched_at)
+
+    # --- Lookups ---
+    def _fetch_and_store(self, key):
+        prices = self.fetch_prices(key)
+        if prices:
+            try:
+                self.set(key, prices)
+            except Exception as e:
+                # A failed cache write should never cost the caller its prices.
+                db.session.rollback()
+                print(f"Error caching prices for {key}: {e}")
+        return prices
+
+    def _refresh_in_background(self, key):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                with self.app.app_context():
+                    self._fetch_and_store(key)
+            except Exception as e:
+                print(f"Background price refresh failed for {key}: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=refresh, name=f"price-refresh-{key}", daemon=True).start()
+
+    def get(self, card_number):
+        """
+        Return (prices, status, age_seconds) for a card number.
+
+        `status` is 'hit', 'stale' or 'miss'. Prices are None when nothing
+        is cached and the scrape found nothing.
+        """
+        key = normalize_card_number(card_number)
+        entry = self._lru_get(key) or self._db_get(key)
+        if entry is not None:
+            prices, fetched_at = entry
+            age = max(0.0, time.time() - fetched_at)
+            if age <= self.fresh_ttl:
+                return prices, 'hit', age
+            if age <= self.stale_ttl and self.app is not None:
+                self._refresh_in_background(key)
+                return prices, 'stale', age
+
+        return self._fetch_and_store(key), 'miss', 0.0
+
+    def get_many(self, card_numbers, max_workers=4):
+        """
+        Look up several card numbers concurrently.
+
+        Card numbers are normalized and deduplicated first. Yields
+        (card_number, prices, status, age_seconds) as each lookup finishes,
+        so callers can stream results instead of waiting for the slowest.
+        """
+        keys = list(dict.fromkeys(normalize_card_number(n) for n in card_numbers if n))
+        if not keys:
+            return
+
+        def lookup(key):
+            with self.app.app_context():
+                return (key,) + self.get(key)
+
+        executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix='price-batch')
+        try:
+            futures = [executor.submit(lookup, key) for key in keys]
+            for future in as_completed(futures):
+                yield future.result()
+        finally:
+            # If the consumer stops early (e.g. client disconnected), drop queued lookups.
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def price_key(set_name, card_number):
+    """Build the 'SET-NNN' lookup key from a card's set name and number, as the collection table does."""
+    card_number = card_number or ''
+    if set_name and card_number and not card_number.startswith(f"{set_name}-"):
+        card_number = f"{set_name}-{card_number}"
+    return normalize_card_number(card_number)
+
+
+def price_key_for_card(card):
+    return price_key(card.set_name, card.card_number)
+
+
+price_cache = PriceCache(lookup_prices)
@@ -0,0 +1,173 @@
+# repricer.py
+import threading
+import time
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import update
+
+from models import db, Card, PricePoint, RepriceAttempt
+from catalog import lookup_prices
+from collection_summary import rebuild_collection_summaries
+from price_cache import price_cache, price_key
+
+_scheduler_lock = threading.Lock()
+
+
+def pick_price(prices, rarity):
+    """Prefer the listing whose rarity matches the card's, else the first listing."""
+    wanted = (rarity or '').strip().lower()
+    for price in prices:
+        if wanted and (price.get('rarity') or '').strip().lower() == wanted:
+            return price
+    return prices[0]
+
+
+def cards_due_for_repricing():
+    """
+    Distinct lookup keys for every card number in the collection, oldest first.
+
+    Card numbers that have never been looked up come first, followed by the
+    ones whose last attempt (successful or not) is the oldest.
+    """
+    keys = set()
+    for set_name, card_number in db.session.query(Card.set_name, Card.card_number).distinct():
+        key = price_key(set_name, card_number)
+        if key:
+            keys.add(key)
+
+    last_attempted = dict(db.session.query(RepriceAttempt.card_number, RepriceAttempt.attempted_at))
+    return sorted(keys, key=lambda key: (key in last_attempted, last_attempted.get(key) or datetime.min))
+
+
+def record_attempts(priced, failed, attempted_at):
+    """Move the card numbers looked up this run to the back of the refresh queue."""
+    keys = list(priced) + list(failed)
+    if not keys:
+        return
+    attempts = {attempt.card_number: attempt
+                for attempt in RepriceAttempt.query.filter(RepriceAttempt.card_number.in_(keys))}
+    for key in keys:
+        attempt = attempts.get(key)
+        if attempt is None:
+            attempt = RepriceAttempt(card_number=key, consecutive_failures=0)
+            db.session.add(attempt)
+        attempt.attempted_at = attempted_at
+        if key in priced:
+            attempt.succeeded_at = attempted_at
+            attempt.consecutive_failures = 0
+        else:
+            attempt.consecutive_failures += 1
+
+
+def reprice_cards(jpy_to_sgd, max_cards=None, min_interval=None):
+    """
+    Reprice the card numbers that are most out of date, within a rate budget.
+
+    Every observed listing is appended to the PricePoint history and each
+    matching Card's current_value_sgd is updated in one bulk statement.
+
+    Args:
+        jpy_to_sgd (float): Exchange rate used to convert yen prices.
+        max_cards (int): Maximum distinct card numbers to look up this run.
+        min_interval (float): Minimum seconds between two lookups.
+    Returns:
+        Dict: Counts of card numbers priced, failed and cards updated.
+    """
+    config = current_app.config
+    max_cards = max_cards if max_cards is not None else config.get('REPRICE_MAX_CARDS_PER_RUN', 100)
+    min_interval = min_interval if min_interval is not None else config.get('REPRICE_MIN_INTERVAL', 2.0)
+
+    due = cards_due_for_repricing()[:max_cards]
+    priced = {}
+    failed = []
+    last_lookup = 0.0
+    for key in due:
+        wait = min_interval - (time.monotonic() - last_lookup)
+        if wait > 0:
+            time.sleep(wait)
+        last_lookup = time.monotonic()
+
+        prices = lookup_prices(key)
+        if not prices:
+            failed.append(key)
+            continue
+        priced[key] = prices
+        price_cache.set(key, prices)
+
+    observed_at = datetime.utcnow()
+    db.session.add_all([
+        PricePoint(
+            card_number=key,
+            rarity=price['rarity'],
+            price_jpy=price['price_yen'],
+            price_sgd=round(price['price_yen'] * jpy_to_sgd, 2) if price['price_yen'] is not None else None,
+            observed_at=observed_at,
+        )
+        for key, prices in priced.items()
+        for price in prices
+    ])
+    # Failed lookups are attempts too, so they rotate to the back of the queue instead of starving it
+    record_attempts(priced, failed, observed_at)
+
+    # Fetch only the columns needed to match cards to their new price
+    card_values = []
+    if priced:
+        for card_id, set_name, card_number, rarity in db.session.query(Card.id, Card.set_name, Card.card_number, Card.rarity):
+            key = price_key(set_name, card_number)
+            if key not in priced:
+                continue
+            price_yen = pick_price(priced[key], rarity)['price_yen']
+            if price_yen is not None:
+                card_values.append({'id': card_id, 'current_value_sgd': round(price_yen * jpy_to_sgd, 2)})
+
+    if card_values:
+        db.session.execute(update(Card), card_values)
+    db.session.commit()
+    if card_values:
+        # The bulk UPDATE bypasses the session hooks that keep current values in the summaries
+        rebuild_collection_summaries()
+
+    summary = {'priced': len(priced), 'failed': len(failed), 'cards_updated': len(card_values)}
+    print(f"Repriced {summary['priced']} card numbers ({summary['failed']} failed), updated {summary['cards_updated']} cards.")
+    return summary
+
+
+def run_price_refresh_loop(app, get_rate, interval, stop_event=None):
+    """Reprice on a fixed interval until `stop_event` is set."""
+    stop_event = stop_event or threading.Event()
+    while not stop_event.is_set():
+        with app.app_context():
+            try:
+                rate = get_rate('JPY', 'SGD')
+                if rate:
+                    reprice_cards(rate)
+                else:
+                    print("Skipping price refresh: no JPY to SGD exchange rate available.")
+            except Exception as e:
+                db.session.rollback()
+                print(f"Error during scheduled price refresh: {e}")
+        stop_event.wait(interval)
+
+
+def start_price_refresh_scheduler(app, get_rate, interval):
+    """
+    Run the refresh loop on a daemon thread inside the web process.
+
+    Started once per app, from the first web request and never from CLI
+    commands ('flask reprice-worker' runs its own loop). Returns the
+    event that stops it.
+    """
+    with _scheduler_lock:
+        if 'price_refresh_scheduler' in app.extensions:
+            return app.extensions['price_refresh_scheduler']
+        stop_event = threading.Event()
+        thread = threading.Thread(
+            target=run_price_refresh_loop,
+            args=(app, get_rate, interval, stop_event),
+            name='price-refresh-scheduler',
+            daemon=True,
+        )
+        app.extensions['price_refresh_scheduler'] = stop_event
+    thread.start()
+    return stop_event
@@ -1,24 +1,10 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from models import db, Card, Collection
 from datetime import date
-import requests
+from fx_service import convert_to_sgd_offline, request_pending_conversion
 
 cards_bp = Blueprint('cards', __name__, template_folder='../templates')
 
-def get_exchange_rate(from_currency, to_currency='SGD'):
-    if from_currency == to_currency:
-        return 1.0
-    url = f"https://api.frankfurter.app/latest?from={from_currency}&to={to_currency}"
-    try:
-        response = requests.get(url, timeout=5)
-        response.raise_for_status()
-        data = response.json()
-        rate = data['rates'].get(to_currency)
-        return rate or None
-    except Exception as e:
-        print(f"Exchange rate error: {e}")
-        return None
-
 @cards_bp.route('/')
 def list_cards():
     cards = Card.query.order_by(Card.name).all()
@@ -48,12 +34,9 @@ def add_card():
             flash('Invalid purchase date format', 'danger')
             return redirect(url_for('cards.add_card'))
         if original_currency != 'SGD':
-            rate = get_exchange_rate(original_currency, 'SGD')
-            if rate:
-                purchase_price_sgd = purchase_price_original * rate
-            else:
-                purchase_price_sgd = 0.0
-                flash('Failed to get exchange rate, setting price SGD to 0', 'warning')
+            purchase_price_sgd = convert_to_sgd_offline(purchase_price_original, original_currency, purchase_date)
+            if purchase_price_sgd is None:
+                flash('SGD price will be filled in once the exchange rate is available', 'info')
         else:
             purchase_price_sgd = purchase_price_original
 
@@ -75,6 +58,8 @@ def add_card():
         try:
             db.session.add(new_card)
             db.session.commit()
+            if purchase_price_sgd is None:
+                request_pending_conversion()
             flash('Card added successfully!', 'success')
             return redirect(url_for('cards.list_cards'))
         except Exception as e:
@@ -97,27 +82,27 @@ def edit_card(card_id):
         card.original_currency = request.form.get('original_currency', 'SGD')
         collection_id = request.form.get('collection_id')
         card.collection_id = int(collection_id) if collection_id else None
+        try:
+            card.purchase_date = date.fromisoformat(request.form['purchase_date'])
+        except ValueError:
+            flash('Invalid purchase date format', 'danger')
+            return redirect(url_for('cards.edit_card', card_id=card.id))
 
         if card.original_currency != 'SGD':
-            rate = get_exchange_rate(card.original_currency, 'SGD')
-            if rate:
-                card.purchase_price_sgd = card.purchase_price_original * rate
-            else:
-                card.purchase_price_sgd = 0.0
-                flash('Failed to get exchange rate, setting price SGD to 0', 'warning')
+            card.purchase_price_sgd = convert_to_sgd_offline(card.purchase_price_original, card.original_currency, card.purchase_date)
+            if card.purchase_price_sgd is None:
+                flash('SGD price will be filled in once the exchange rate is available', 'info')
         else:
             card.purchase_price_sgd = card.purchase_price_original
 
         card.current_value_sgd = float(request.form.get('current_value_sgd') or 0.0)
         card.image_url = request.form.get('image_url')
-        try:
-            card.purchase_date = date.fromisoformat(request.form['purchase_date'])
-        except ValueError:
-            flash('Invalid purchase date format', 'danger')
-            return redirect(url_for('cards.edit_card', card_id=card.id))
+        card.conversion_attempts = 0
 
         try:
             db.session.commit()
+            if card.purchase_price_sgd is None:
+                request_pending_conversion()
             flash('Card updated!', 'success')
             return redirect(url_for('cards.list_cards'))
         except Exception as e:
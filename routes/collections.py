@@ -1,13 +1,16 @@
 print("Importing collections blueprint")
 from flask import Blueprint, render_template, request, redirect, url_for, flash
-from models import db, Collection, Card
+from models import db, Collection
+from collection_stats import card_page, collection_totals
+from collection_summary import get_summaries
+from bulk_cards import delete_collection as delete_collection_and_cards
 
 collections_bp = Blueprint('collections', __name__, template_folder='../templates')
 
 @collections_bp.route('/')
 def collections_list():
     collections = Collection.query.order_by(Collection.name).all()
-    return render_template('collections_list.html', collections=collections)
+    return render_template('collections_list.html', collections=collections, summaries=get_summaries())
 
 @collections_bp.route('/add', methods=['GET', 'POST'])
 def add_collection():
@@ -44,10 +47,7 @@ def edit_collection(collection_id):
 def delete_collection(collection_id):
     collection = Collection.query.get_or_404(collection_id)
     try:
-        for card in collection.cards:
-            db.session.delete(card)
-        db.session.delete(collection)
-        db.session.commit()
+        delete_collection_and_cards(collection)
         flash('Collection and cards deleted!', 'success')
     except Exception as e:
         db.session.rollback()
@@ -57,6 +57,6 @@ def delete_collection(collection_id):
 @collections_bp.route('/view/<int:collection_id>')
 def view_collection(collection_id):
     collection = Collection.query.get_or_404(collection_id)
-    cards = Card.query.filter_by(collection_id=collection_id).order_by(Card.name).all()
-    total_price_sgd = sum(card.purchase_price_sgd * card.quantity for card in cards)
-    return render_template('collection.html', collection=collection, cards=cards, total_price_sgd=total_price_sgd)
+    cards, next_cursor = card_page(collection_id)
+    return render_template('collection.html', collection=collection, cards=cards, sort='name', direction='asc',
+                           next_cursor=next_cursor, page_size=len(cards), **collection_totals(collection_id))
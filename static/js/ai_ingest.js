@@ -0,0 +1,176 @@
+// ai_ingest.js
+
+document.addEventListener('DOMContentLoaded', function() {
+    const form = document.getElementById('aiIngestForm');
+    const submitBtn = document.getElementById('aiIngestSubmit');
+    const progress = document.getElementById('ingestProgress');
+    const spinner = document.getElementById('ingestSpinner');
+    const cardsTable = document.getElementById('ingestCards');
+    const messages = document.getElementById('ingestMessages');
+    const doneLink = document.getElementById('ingestDoneLink');
+
+    const badgeClasses = {
+        pending: 'bg-secondary',
+        running: 'bg-primary',
+        done: 'bg-success',
+        failed: 'bg-danger',
+    };
+
+    function showMessage(text, category) {
+        const alert = document.createElement('div');
+        alert.className = `alert alert-${category === 'error' ? 'danger' : category}`;
+        alert.textContent = text;
+        messages.appendChild(alert);
+    }
+
+    function renderStages(stages) {
+        Object.entries(stages).forEach(([name, stage]) => {
+            const badge = progress.querySelector(`[data-stage="${name}"] .badge`);
+            if (!badge) {
+                return;
+            }
+            badge.className = 'badge ' + (badgeClasses[stage.status] || 'bg-secondary');
+            badge.textContent = stage.total ? `${stage.done}/${stage.total}` : stage.status;
+            // Bulk imports report how many photo batches the model has finished
+            if (stage.chunks && stage.status === 'running') {
+                badge.textContent = `batch ${stage.chunks_done}/${stage.chunks}`;
+            }
+        });
+    }
+
+    function renderCards(cards) {
+        if (!cards.length) {
+            return;
+        }
+        const tbody = cardsTable.querySelector('tbody');
+        tbody.innerHTML = '';
+        cards.forEach(card => {
+            const row = document.createElement('tr');
+            let price = card.status === 'pending' ? '…' : (card.live_price_jpy ? `¥${card.live_price_jpy}` : 'No live price');
+            if (card.status === 'timeout') {
+                price = 'Timed out';
+            } else if (card.status === 'failed') {
+                price = 'Lookup failed';
+            }
+            // Show lookup times so slow scrapes stand out
+            if (card.elapsed_ms !== undefined) {
+                price += ` (${(card.elapsed_ms / 1000).toFixed(1)}s)`;
+            }
+            [card.name, card.card_number, card.rarity, card.quantity, price].forEach(value => {
+                const cell = document.createElement('td');
+                cell.textContent = value ?? '';
+                row.appendChild(cell);
+            });
+            tbody.appendChild(row);
+        });
+        cardsTable.classList.remove('d-none');
+    }
+
+    function finishJob(job) {
+        spinner.classList.add('d-none');
+        (job.messages || []).forEach(([text, category]) => showMessage(text, category));
+        if (job.status === 'failed') {
+            showMessage(job.error, 'error');
+            submitBtn.disabled = false;
+        } else {
+            doneLink.href = job.redirect_url;
+            doneLink.classList.remove('d-none');
+        }
+    }
+
+    function renderJob(job) {
+        renderStages(job.stages);
+        renderCards(job.cards);
+        if (job.status === 'done' || job.status === 'failed') {
+            finishJob(job);
+            return true;
+        }
+        return false;
+    }
+
+    // Server-Sent Events show each card as soon as the model emits it; polling is the fallback
+    function watchJob(statusUrl, eventsUrl) {
+        progress.classList.remove('d-none');
+        if (!window.EventSource || !eventsUrl) {
+            return pollJob(statusUrl);
+        }
+        const source = new EventSource(eventsUrl);
+        let finished = false;
+        ['progress', 'done', 'failed'].forEach(name => {
+            source.addEventListener(name, (event) => {
+                finished = renderJob(JSON.parse(event.data));
+                if (finished) {
+                    source.close();
+                }
+            });
+        });
+        source.onerror = () => {
+            source.close();
+            if (!finished) {
+                pollJob(statusUrl);
+            }
+        };
+    }
+
+    // Poll the job until it finishes; each response carries per-stage and per-card progress
+    async function pollJob(url) {
+        progress.classList.remove('d-none');
+        while (true) {
+            let job;
+            try {
+                const response = await fetch(url);
+                job = await response.json();
+                if (!response.ok) {
+                    throw new Error(job.error || response.statusText);
+                }
+            } catch (error) {
+                console.error('Error polling job:', error);
+                spinner.classList.add('d-none');
+                showMessage('Lost track of the job: ' + error.message, 'error');
+                return;
+            }
+
+            if (renderJob(job)) {
+                return;
+            }
+            await new Promise(resolve => setTimeout(resolve, 1000));
+        }
+    }
+
+    if (form) {
+        form.addEventListener('submit', async (event) => {
+            event.preventDefault();
+            submitBtn.disabled = true;
+            messages.innerHTML = '';
+            doneLink.classList.add('d-none');
+            cardsTable.classList.add('d-none');
+            spinner.classList.remove('d-none');
+            renderStages({extract: {status: 'pending'}, enrich: {status: 'pending'}, save: {status: 'pending'}});
+
+            try {
+                const response = await fetch(form.action || window.location.href, {
+                    method: 'POST',
+                    body: new FormData(form),
+                    headers: {'Accept': 'application/json'},
+                });
+                const data = await response.json();
+                if (response.status !== 202) {
+                    throw new Error(data.error || response.statusText);
+                }
+                watchJob(data.status_url, data.events_url);
+            } catch (error) {
+                console.error('Error submitting job:', error);
+                progress.classList.remove('d-none');
+                spinner.classList.add('d-none');
+                showMessage(error.message, 'error');
+                submitBtn.disabled = false;
+            }
+        });
+    }
+
+    // A job submitted without JavaScript's help renders the page with its status URL
+    if (progress && progress.dataset.jobUrl) {
+        submitBtn.disabled = true;
+        watchJob(progress.dataset.jobUrl, progress.dataset.eventsUrl);
+    }
+});
@@ -3,16 +3,15 @@
 document.addEventListener('DOMContentLoaded', function() {
     // ---- EXISTING FUNCTIONS (KEPT AS-IS) ----
 
-    // Function to recalculate and update the subtotal
+    // The subtotal comes from the server, so it covers rows that aren't loaded yet;
+    // only the yen divisor overrides entered on this page are applied on top of it
+    const sgdOverrides = new Map();
+
     function updateSubtotal() {
-        let total = 0;
-        document.querySelectorAll('.total-price-sgd-cell').forEach(cell => {
-            const value = parseFloat(cell.dataset.sortValue);
-            if (!isNaN(value)) {
-                total += value;
-            }
+        let total = parseFloat(subtotalElement.dataset.serverPrice);
+        sgdOverrides.forEach(delta => {
+            total += delta;
         });
-        const subtotalElement = document.getElementById('subtotalPriceSgd');
         subtotalElement.textContent = '$' + total.toFixed(2) + ' SGD';
         subtotalElement.dataset.basePrice = total.toFixed(2);
 
@@ -42,68 +41,45 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     });
 
-    // Table Sorting Logic
-    const sortPriceSgdHeader = document.getElementById('sortPriceSgd');
-    const sortIcon = document.getElementById('sortIcon');
+    // Sorting happens on the server: the Name, Total (SGD) and Date headers are links
     const tableBody = document.querySelector('#cardTable tbody');
-    let isAscending = true;
-
-    if (sortPriceSgdHeader) { // Check if the header exists before adding event listener
-        sortPriceSgdHeader.style.cursor = 'pointer';
-        sortIcon.innerHTML = '&#9650;';
-
-        sortPriceSgdHeader.addEventListener('click', () => {
-            const rows = Array.from(tableBody.querySelectorAll('tr'));
-            rows.sort((a, b) => {
-                // Adjust index to 9 to account for the new "Live Price" column
-                const priceA = parseFloat(a.cells[9].dataset.sortValue);
-                const priceB = parseFloat(b.cells[9].dataset.sortValue);
-
-                if (isAscending) {
-                    return priceA - priceB;
-                } else {
-                    return priceB - priceA;
-                }
-            });
-
-            rows.forEach(row => tableBody.appendChild(row));
-            isAscending = !isAscending;
-            sortIcon.innerHTML = isAscending ? '&#9650;' : '&#9660;';
-        });
-    }
 
-    // Price per Unit (Yen) Calculation Logic - FIXED
-    const divisorInputs = document.querySelectorAll('.divisor-input-yen');
-
-    divisorInputs.forEach(input => {
-        input.addEventListener('input', function() {
-            const priceCell = this.closest('td');
-            const row = this.closest('tr');
+    // Price per Unit (Yen) Calculation Logic - delegated so rows loaded later work too
+    if (tableBody) {
+        tableBody.addEventListener('input', function(event) {
+            const input = event.target;
+            if (!input.classList.contains('divisor-input-yen')) {
+                return;
+            }
+            const priceCell = input.closest('td');
+            const row = input.closest('tr');
             const originalPrice = parseFloat(priceCell.dataset.originalPrice);
             const originalCurrency = priceCell.dataset.originalCurrency;
-            
-            // CORRECT: Get the original SGD price from the data attribute on the total price cell
+
+            // The server's SGD total for the row, before any divisor was applied
             const totalSgdCell = row.querySelector('.total-price-sgd-cell');
-            const sgdPrice = parseFloat(totalSgdCell.dataset.sortValue);
+            const sgdPrice = parseFloat(priceCell.dataset.sgdPrice);
 
-            const divisor = parseFloat(this.value);
+            const divisor = parseFloat(input.value);
             const resultSpan = priceCell.querySelector('.result-span-yen');
-            
+
             if (originalCurrency === 'JPY') {
                 if (isNaN(divisor) || divisor === 0) {
                     resultSpan.textContent = '0.00';
                     totalSgdCell.textContent = '$' + sgdPrice.toFixed(2);
                     totalSgdCell.dataset.sortValue = sgdPrice;
+                    sgdOverrides.delete(row.dataset.cardId);
                 } else {
                     const newTotalSgd = originalPrice / divisor;
                     resultSpan.textContent = newTotalSgd.toFixed(2);
                     totalSgdCell.textContent = '$' + newTotalSgd.toFixed(2);
                     totalSgdCell.dataset.sortValue = newTotalSgd;
+                    sgdOverrides.set(row.dataset.cardId, newTotalSgd - sgdPrice);
                 }
                 updateSubtotal();
-            } 
+            }
         });
-    });
+    }
 
     const generateBtn = document.getElementById('generateMessageBtn');
     const mailingFeeCheckbox = document.getElementById('mailingFeeCheckbox');
@@ -134,10 +110,49 @@ document.addEventListener('DOMContentLoaded', function() {
     }
 
     // ---- NEW LIVE PRICING FUNCTIONALITY ----
-    const livePriceButtons = document.querySelectorAll('.live-price-btn');
+    // Render a live price response into a row's live price cell
+    function renderLivePrices(button, livePriceContainer, data, ok) {
+        livePriceContainer.innerHTML = '';
+        livePriceContainer.classList.remove('text-danger');
+
+        if (ok && data.prices) {
+            // Create a list to hold the prices
+            const priceList = document.createElement('ul');
+            priceList.classList.add('list-unstyled', 'mb-0');
 
-    livePriceButtons.forEach(button => {
-        button.addEventListener('click', async () => {
+            data.prices.forEach(priceItem => {
+                const listItem = document.createElement('li');
+                // Use a line break for each price item to display them clearly
+                listItem.innerHTML = `${priceItem.rarity}: **¥${priceItem.price_yen}**`;
+                priceList.appendChild(listItem);
+            });
+
+            // Show how old a cached price is so stale values are obvious
+            if (data.cache && data.cache !== 'miss') {
+                const ageNote = document.createElement('small');
+                ageNote.classList.add('text-muted');
+                ageNote.textContent = `cached ${Math.round(data.age_seconds / 60)} min ago`;
+                priceList.appendChild(ageNote);
+            }
+
+            // Clear the button and append the new list of prices
+            button.style.display = 'none'; // Hide the button
+            livePriceContainer.appendChild(priceList);
+
+        } else {
+            livePriceContainer.innerText = 'No live price found.';
+            livePriceContainer.classList.add('text-danger');
+            button.style.display = 'none';
+        }
+    }
+
+    // Delegated so buttons in rows loaded by infinite scroll work too
+    if (tableBody) {
+        tableBody.addEventListener('click', async (event) => {
+            const button = event.target.closest('.live-price-btn');
+            if (!button) {
+                return;
+            }
             const card_number = button.dataset.cardNumber;
             const livePriceContainer = button.parentElement.querySelector('.live-prices-container');
 
@@ -148,34 +163,194 @@ document.addEventListener('DOMContentLoaded', function() {
             try {
                 const response = await fetch(`/get_live_price/${card_number}`);
                 const data = await response.json();
+                renderLivePrices(button, livePriceContainer, data, response.ok);
+            } catch (error) {
+                console.error('Error fetching live price:', error);
+                livePriceContainer.innerText = 'Error fetching price.';
+                livePriceContainer.classList.add('text-danger');
+                button.style.display = 'none';
+            }
+        });
+    }
 
-                if (response.ok && data.prices) {
-                    // Create a list to hold the prices
-                    const priceList = document.createElement('ul');
-                    priceList.classList.add('list-unstyled', 'mb-0');
+    // Price the whole collection in one request; results stream back as NDJSON lines
+    const priceAllBtn = document.getElementById('priceAllBtn');
+    const livePriceResults = new Map();
 
-                    data.prices.forEach(priceItem => {
-                        const listItem = document.createElement('li');
-                        // Use a line break for each price item to display them clearly
-                        listItem.innerHTML = `${priceItem.rarity}: **¥${priceItem.price_yen}**`;
-                        priceList.appendChild(listItem);
-                    });
+    if (priceAllBtn) {
+        priceAllBtn.addEventListener('click', async () => {
+            priceAllBtn.disabled = true;
+            priceAllBtn.innerText = 'Fetching...';
+            document.querySelectorAll('.live-price-btn').forEach(button => {
+                button.innerText = 'Fetching...';
+                button.disabled = true;
+            });
 
-                    // Clear the button and append the new list of prices
-                    button.style.display = 'none'; // Hide the button
-                    livePriceContainer.appendChild(priceList);
+            const applyLine = (line) => {
+                if (!line.trim()) {
+                    return;
+                }
+                const data = JSON.parse(line);
+                if (data.done) {
+                    priceAllBtn.innerText = `Priced ${data.count} card numbers`;
+                    return;
+                }
+                data.card_ids.forEach(cardId => {
+                    // Kept for rows that are only loaded later
+                    livePriceResults.set(String(cardId), data);
+                    const row = document.querySelector(`tr[data-card-id="${cardId}"]`);
+                    if (row) {
+                        renderLivePrices(row.querySelector('.live-price-btn'), row.querySelector('.live-prices-container'), data, !data.error);
+                    }
+                });
+            };
+
+            try {
+                const response = await fetch(priceAllBtn.dataset.url, { method: 'POST' });
+                const reader = response.body.getReader();
+                const decoder = new TextDecoder();
+                let buffered = '';
+
+                while (true) {
+                    const { value, done } = await reader.read();
+                    if (done) {
+                        break;
+                    }
+                    buffered += decoder.decode(value, { stream: true });
+                    const lines = buffered.split('\n');
+                    buffered = lines.pop();
+                    lines.forEach(applyLine);
+                }
+                applyLine(buffered);
+            } catch (error) {
+                console.error('Error fetching live prices:', error);
+                priceAllBtn.innerText = 'Error fetching prices';
+            }
+        });
+    }
+
+    // ---- MULTI-SELECT AND BULK ACTIONS ----
+    const bulkForm = document.getElementById('bulkForm');
+
+    if (bulkForm && tableBody) {
+        const selectPage = document.getElementById('selectPageCards');
+        const selectAll = document.getElementById('selectAllCards');
+        const selectedCount = document.getElementById('selectedCardCount');
+        const bulkAction = document.getElementById('bulkAction');
+        const bulkTarget = document.getElementById('bulkTargetCollection');
+        const bulkValue = document.getElementById('bulkValue');
 
+        const checkedRows = () => tableBody.querySelectorAll('.card-select:checked');
+        // "All cards in this view" also covers rows that haven't been loaded yet
+        const selectionSize = () => selectAll.checked ? parseInt(selectAll.dataset.count, 10) : checkedRows().length;
+        const updateSelectedCount = () => {
+            selectedCount.textContent = selectionSize();
+        };
+
+        selectPage.addEventListener('change', () => {
+            tableBody.querySelectorAll('.card-select').forEach(box => {
+                box.checked = selectPage.checked;
+            });
+            updateSelectedCount();
+        });
+        tableBody.addEventListener('change', (event) => {
+            if (event.target.classList.contains('card-select')) {
+                updateSelectedCount();
+            }
+        });
+        // With "All cards in this view" the server selects by collection, so the row boxes are cleared and locked
+        selectAll.addEventListener('change', () => {
+            [selectPage, ...tableBody.querySelectorAll('.card-select')].forEach(box => {
+                box.checked = false;
+                box.disabled = selectAll.checked;
+            });
+            updateSelectedCount();
+        });
+
+        const showActionInputs = () => {
+            bulkTarget.style.display = bulkAction.value === 'move' ? '' : 'none';
+            bulkValue.style.display = bulkAction.value === 'set_value' ? '' : 'none';
+        };
+        bulkAction.addEventListener('change', showActionInputs);
+        showActionInputs();
+
+        bulkForm.addEventListener('submit', (event) => {
+            const count = selectionSize();
+            if (count === 0) {
+                event.preventDefault();
+                alert('Select some cards first.');
+                return;
+            }
+            if (bulkAction.value === 'delete' && !confirm(`Permanently delete ${count} card${count === 1 ? '' : 's'}?`)) {
+                event.preventDefault();
+            }
+        });
+    }
+
+    // ---- INFINITE SCROLL ----
+    // The server renders one page of rows; the next pages are fetched as the "Next" link scrolls into view
+    const loadMoreLink = document.getElementById('loadMoreLink');
+    const shownCardCount = document.getElementById('shownCardCount');
+
+    if (loadMoreLink && tableBody && 'IntersectionObserver' in window) {
+        let loading = false;
+
+        const loadNextPage = async () => {
+            if (loading || !loadMoreLink.dataset.rowsUrl) {
+                return;
+            }
+            loading = true;
+            loadMoreLink.textContent = 'Loading...';
+            try {
+                const response = await fetch(loadMoreLink.dataset.rowsUrl);
+                const page = await response.json();
+                if (!response.ok) {
+                    throw new Error(page.error || response.statusText);
+                }
+                const template = document.createElement('template');
+                template.innerHTML = page.html;
+                template.content.querySelectorAll('tr[data-card-id]').forEach(row => {
+                    const data = livePriceResults.get(row.dataset.cardId);
+                    if (data) {
+                        renderLivePrices(row.querySelector('.live-price-btn'), row.querySelector('.live-prices-container'), data, !data.error);
+                    }
+                });
+                const selectAll = document.getElementById('selectAllCards');
+                if (selectAll && selectAll.checked) {
+                    template.content.querySelectorAll('.card-select').forEach(box => {
+                        box.disabled = true;
+                    });
+                }
+                tableBody.appendChild(template.content);
+                shownCardCount.textContent = tableBody.querySelectorAll('tr[data-card-id]').length;
+
+                if (page.next_rows_url) {
+                    loadMoreLink.href = page.next_url;
+                    loadMoreLink.dataset.rowsUrl = page.next_rows_url;
+                    loadMoreLink.textContent = 'Load more';
                 } else {
-                    livePriceContainer.innerText = 'No live price found.';
-                    livePriceContainer.classList.add('text-danger');
-                    button.style.display = 'none';
+                    observer.disconnect();
+                    loadMoreLink.remove();
                 }
             } catch (error) {
-                console.error('Error fetching live price:', error);
-                livePriceContainer.innerText = 'Error fetching price.';
-                livePriceContainer.classList.add('text-danger');
-                button.style.display = 'none';
+                console.error('Error loading more cards:', error);
+                // Fall back to the plain link, which opens the next page
+                observer.disconnect();
+                loadMoreLink.textContent = 'Next cards';
+            } finally {
+                loading = false;
+            }
+        };
+
+        const observer = new IntersectionObserver(entries => {
+            if (entries.some(entry => entry.isIntersecting)) {
+                loadNextPage();
             }
+        }, { rootMargin: '400px' });
+        observer.observe(loadMoreLink);
+        loadMoreLink.addEventListener('click', (event) => {
+            event.preventDefault();
+            loadNextPage();
         });
-    });
-});
\ No newline at end of file
+    }
+});
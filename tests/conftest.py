@@ -0,0 +1,25 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+# The app is a set of top-level modules, not an installed package
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+# chatbot_service builds its OpenAI client at import time
+os.environ.setdefault('OPENAI_API_KEY', 'test')
+
+
+@pytest.fixture
+def app(tmp_path):
+    """The app on a throwaway SQLite database, with the background workers off."""
+    from app import create_app
+
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + str(tmp_path / 'test.sqlite'),
+        'PRICE_REFRESH_INTERVAL': 0,
+        'FX_PENDING_WORKER': False,
+    })
+    with app.app_context():
+        yield app
@@ -0,0 +1,65 @@
+import pytest
+
+from collection_summary import get_summary
+from models import db, Card, Collection
+
+
+@pytest.fixture
+def collections(app):
+    binder, sale = Collection(name='Binder'), Collection(name='Sale')
+    db.session.add_all([binder, sale])
+    db.session.flush()
+    for collection in (binder, binder, binder, sale):
+        db.session.add(Card(name='Zoro', set_name='OP01', card_number='OP01-025', quantity=2,
+                            purchase_price_original=10.0, original_currency='SGD', purchase_price_sgd=10.0,
+                            collection_id=collection.id))
+    db.session.commit()
+    return binder.id, sale.id
+
+
+def card_ids(collection_id):
+    return sorted(card.id for card in Card.query.filter_by(collection_id=collection_id))
+
+
+def test_delete_checked_rows(app, collections):
+    binder, sale = collections
+    first, *rest = card_ids(binder)
+    response = app.test_client().post('/cards/bulk', data={
+        'action': 'delete', 'collection_id': binder, 'card_ids': [first],
+    })
+
+    assert response.status_code == 302
+    assert card_ids(binder) == rest
+    assert len(card_ids(sale)) == 1
+    assert get_summary(binder)['card_count'] == 2
+
+
+def test_select_all_ignores_checked_rows(app, collections):
+    binder, sale = collections
+    response = app.test_client().post('/cards/bulk', data={
+        'action': 'delete', 'collection_id': binder, 'select_all': '1', 'card_ids': [card_ids(binder)[0]],
+    })
+
+    assert response.status_code == 302
+    assert card_ids(binder) == []
+    assert len(card_ids(sale)) == 1
+    assert get_summary(binder)['card_count'] == 0
+    assert get_summary(sale)['card_count'] == 1
+
+
+def test_json_move_by_filter(app, collections):
+    binder, sale = collections
+    response = app.test_client().post('/cards/bulk', json={
+        'action': 'move', 'filter': {'collection_id': binder}, 'target_collection_id': sale,
+    })
+
+    assert response.get_json() == {'action': 'move', 'cards': 3}
+    assert card_ids(binder) == []
+    assert get_summary(sale)['total_quantity'] == 8
+
+
+def test_empty_selection_is_rejected(app, collections):
+    response = app.test_client().post('/cards/bulk', json={'action': 'delete'})
+
+    assert response.status_code == 400
+    assert Card.query.count() == 4
@@ -0,0 +1,104 @@
+import pytest
+
+from collection_stats import collection_totals
+from collection_summary import get_summary
+from models import db, Card, Collection
+
+
+def python_totals(cards):
+    """What the collection page computed over the loaded cards before collection_totals()."""
+    total_purchase_price_original = {}
+    for card in cards:
+        currency = card.original_currency or 'SGD'
+        total_purchase_price_original[currency] = (
+            total_purchase_price_original.get(currency, 0) + card.purchase_price_original * card.quantity
+        )
+    card_names = sorted(set(card.name for card in cards))
+    return {
+        'card_names': card_names,
+        'card_values': {name: sum(c.purchase_price_sgd or 0 for c in cards if c.name == name) for name in card_names},
+        'total_purchase_price_sgd': sum((card.purchase_price_sgd or 0) * card.quantity for card in cards),
+        'total_purchase_price_original': dict(sorted(total_purchase_price_original.items())),
+        'pending_conversion_count': sum(1 for card in cards if card.purchase_price_sgd is None),
+        'card_count': len(cards),
+    }
+
+
+def add_card(collection, name, quantity, original, currency, sgd):
+    db.session.add(Card(
+        name=name, set_name='OP01', card_number='OP01-001', quantity=quantity,
+        purchase_price_original=original, original_currency=currency, purchase_price_sgd=sgd,
+        current_value_sgd=5.0, collection_id=collection.id if collection else None,
+    ))
+
+
+@pytest.fixture
+def seeded(app):
+    binder, sale = Collection(name='Binder'), Collection(name='Sale')
+    db.session.add_all([binder, sale])
+    db.session.flush()
+    for collection in (binder, sale, None):
+        add_card(collection, 'Zoro', 3, 1500.0, 'JPY', 13.5)
+        add_card(collection, 'Zoro', 1, 2000.0, 'JPY', None)  # conversion pending
+        add_card(collection, 'Nami', 2, 12.5, 'USD', 16.25)
+        add_card(collection, 'Luffy', 4, 8.0, '', 8.0)  # blank currency counts as SGD
+        add_card(collection, 'Ace', 1, 30.0, 'SGD', 30.0)
+    add_card(binder, 'Shanks', 5, 900.0, 'JPY', None)
+    db.session.commit()
+    return binder, sale
+
+
+def test_collection_totals_match_python_loop(seeded):
+    binder, sale = seeded
+    for collection_id in (binder.id, sale.id, None):
+        if collection_id:
+            cards = Card.query.filter_by(collection_id=collection_id).all()
+        else:
+            cards = Card.query.filter(Card.collection_id.is_(None)).all()
+        expected = python_totals(cards)
+        totals = collection_totals(collection_id)
+
+        assert totals['card_names'] == expected['card_names']
+        assert totals['card_values'] == pytest.approx(expected['card_values'])
+        assert totals['total_purchase_price_sgd'] == pytest.approx(expected['total_purchase_price_sgd'])
+        assert totals['total_purchase_price_original'] == pytest.approx(expected['total_purchase_price_original'])
+        assert list(totals['total_purchase_price_original']) == list(expected['total_purchase_price_original'])
+        assert totals['pending_conversion_count'] == expected['pending_conversion_count']
+        assert totals['card_count'] == expected['card_count']
+
+        summary = get_summary(collection_id)
+        assert summary['card_count'] == expected['card_count']
+        assert summary['total_quantity'] == sum(card.quantity for card in cards)
+        assert summary['cost_basis_sgd'] == pytest.approx(expected['total_purchase_price_sgd'])
+        assert summary['pending_conversion_count'] == expected['pending_conversion_count']
+        assert summary['original_totals'] == pytest.approx(expected['total_purchase_price_original'])
+        assert summary['current_value_sgd'] == pytest.approx(sum(5.0 * card.quantity for card in cards))
+
+
+def test_collection_totals_follow_edits(seeded):
+    binder, sale = seeded
+    # A move, a conversion and a delete go through the summary hooks
+    zoro = Card.query.filter_by(collection_id=binder.id, name='Zoro', purchase_price_sgd=None).one()
+    zoro.collection_id = sale.id
+    shanks = Card.query.filter_by(name='Shanks').one()
+    shanks.purchase_price_sgd = 8.1
+    db.session.delete(Card.query.filter_by(collection_id=sale.id, name='Ace').one())
+    db.session.commit()
+
+    for collection_id in (binder.id, sale.id):
+        cards = Card.query.filter_by(collection_id=collection_id).all()
+        expected = python_totals(cards)
+        totals = collection_totals(collection_id)
+        assert totals['total_purchase_price_sgd'] == pytest.approx(expected['total_purchase_price_sgd'])
+        assert totals['total_purchase_price_original'] == pytest.approx(expected['total_purchase_price_original'])
+        assert totals['pending_conversion_count'] == expected['pending_conversion_count']
+        assert totals['card_count'] == expected['card_count']
+        assert totals['card_values'] == pytest.approx(expected['card_values'])
+
+
+def test_empty_collection(app):
+    collection = Collection(name='Empty')
+    db.session.add(collection)
+    db.session.commit()
+
+    assert collection_totals(collection.id) == python_totals([])
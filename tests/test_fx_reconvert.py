@@ -0,0 +1,71 @@
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import update
+
+import fx_service
+from fx_service import reconvert_purchase_prices
+from models import db, Card, DailyRate
+
+TODAY = date.today()
+
+
+@pytest.fixture
+def backfills(app, monkeypatch):
+    """Record backfill ranges instead of calling Frankfurter; the tests store the rates themselves."""
+    calls = []
+    monkeypatch.setattr(fx_service.fx_service, 'backfill',
+                        lambda base, start, end, quote='SGD': calls.append((base, start, end)) or 0)
+    db.session.add_all([
+        DailyRate(date=TODAY - timedelta(days=1), base='JPY', quote='SGD', rate=0.009),
+        DailyRate(date=TODAY - timedelta(days=90), base='JPY', quote='SGD', rate=0.5),
+    ])
+    db.session.commit()
+    return calls
+
+
+def add_card(name, purchase_date, sgd, original=1000.0, currency='JPY'):
+    card = Card(name=name, set_name='OP01', card_number='OP01-001', quantity=1, purchase_date=purchase_date,
+                purchase_price_original=original, original_currency=currency, purchase_price_sgd=sgd)
+    db.session.add(card)
+    db.session.commit()
+    if purchase_date is None:
+        # The column default fills in today on insert; older databases have NULL dates
+        db.session.execute(update(Card).where(Card.id == card.id).values(purchase_date=None))
+        db.session.commit()
+    return card.id
+
+
+def sgd_price(card_id):
+    db.session.expire_all()
+    return db.session.get(Card, card_id).purchase_price_sgd
+
+
+def test_cards_without_purchase_date_get_latest_rate(backfills):
+    undated = add_card('Undated', None, 0.0)
+
+    assert reconvert_purchase_prices(zeroed_only=True) == 1
+    assert sgd_price(undated) == pytest.approx(9.0)
+    assert backfills == [('JPY', TODAY - timedelta(days=7), TODAY)]
+
+
+def test_rates_older_than_a_week_are_not_used(backfills):
+    in_week = add_card('In week', TODAY - timedelta(days=88), 0.0)
+    after_gap = add_card('After gap', TODAY - timedelta(days=60), 0.0)
+
+    assert reconvert_purchase_prices(zeroed_only=True) == 1
+    assert sgd_price(in_week) == pytest.approx(500.0)
+    assert sgd_price(after_gap) == 0.0
+
+
+def test_zeroed_and_pending_together(backfills):
+    zeroed = add_card('Zeroed', None, 0.0)
+    pending = add_card('Pending', None, None)
+    converted = add_card('Converted', None, 12.0)
+    sgd = add_card('SGD', None, 5.0, original=7.0, currency='SGD')
+
+    assert reconvert_purchase_prices(zeroed_only=True, pending_only=True) == 2
+    assert sgd_price(zeroed) == pytest.approx(9.0)
+    assert sgd_price(pending) == pytest.approx(9.0)
+    assert sgd_price(converted) == 12.0
+    assert sgd_price(sgd) == 5.0
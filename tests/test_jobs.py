@@ -0,0 +1,46 @@
+import json
+import time
+
+import jobs
+from jobs import _new_progress, ingest_jobs
+from models import db, IngestJob
+
+
+class RecordingEnricher:
+    instances = []
+
+    def __init__(self, on_card=None):
+        self.cards, self.cancelled, self.finished = [], False, False
+        RecordingEnricher.instances.append(self)
+
+    def add(self, card):
+        self.cards.append(card)
+
+    def poll(self):
+        pass
+
+    def cancel(self):
+        self.cancelled = True
+
+    def finish(self):
+        self.finished = True
+        return {'cards': [], 'fx': []}
+
+
+def test_unexpected_extraction_error_cancels_lookups(app, monkeypatch):
+    def extracted(description, images, stream=True):
+        yield {'name': 'Zoro', 'card_number': 'OP01-025'}, True
+        raise KeyError('quantity')
+
+    monkeypatch.setattr(jobs, 'CardEnricher', RecordingEnricher)
+    monkeypatch.setattr(jobs, 'iter_extracted_cards', extracted)
+    job = IngestJob(id='job-1', status='queued', description='Zoro', images_json='[]',
+                    progress_json=json.dumps(_new_progress()), created_at=time.time(), updated_at=time.time())
+    db.session.add(job)
+    db.session.commit()
+
+    ingest_jobs._run('job-1')
+
+    enricher, = RecordingEnricher.instances
+    assert enricher.cancelled
+    assert db.session.get(IngestJob, 'job-1').status == 'failed'
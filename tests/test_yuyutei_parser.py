@@ -0,0 +1,65 @@
+from pathlib import Path
+from string import Template
+
+from yuyutei_parser import parse_yuyutei_search_html
+
+FIXTURE = Path(__file__).resolve().parents[1] / 'bench' / 'fixtures' / 'yuyutei_search.html'
+
+# Products the fixture doesn't have: one sold out, one without a price
+SOLD_OUT = """
+    <div class="col-md card-product position-relative mt-4 sold-out">
+      <span class="d-block border border-dark p-1 w-100 text-center my-2">OP01-025 <b>ロロノア・ゾロ(SP)</b></span>
+      <span class="tag SP">SP</span>
+      <div class="d-flex justify-content-between align-items-center">
+        <strong class="d-block text-end">39,800 円</strong>
+        <label class="form-check-label">在庫 : ×</label>
+      </div>
+    </div>
+"""
+NO_PRICE = """
+    <div class="col-md card-product position-relative mt-4 sold-out">
+      <span class="d-block border border-dark p-1 w-100 text-center my-2">OP01-025 <b>ロロノア・ゾロ(プロモ)</b></span>
+      <span class="tag P">P</span>
+      <div class="d-flex"><strong class="d-block text-end">売り切れ</strong></div>
+    </div>
+"""
+
+
+def search_page(extra_products=''):
+    html = Template(FIXTURE.read_text(encoding='utf-8')).substitute(
+        card_number='OP01-025',
+        set_code='op01',
+        name='ロロノア・ゾロ',
+        price='1,980',
+        parallel_price='12,800',
+    )
+    # Append inside #card-list3, after the fixture's own products
+    return html.replace('  </div>\n</main>', extra_products + '  </div>\n</main>')
+
+
+def test_parses_fixture_products():
+    results = parse_yuyutei_search_html(search_page(), 'OP01-025')
+
+    assert [(r['card_number'], r['rarity'], r['price_yen']) for r in results] == [
+        ('OP01-025', 'SR', 1980),
+        ('OP01-025', 'SR-P', 12800),
+    ]
+    assert results[0]['name'] == 'OP01-025 ロロノア・ゾロ'
+    assert results[1]['name'] == 'OP01-025 ロロノア・ゾロ(パラレル)'
+
+
+def test_skips_products_for_other_cards():
+    assert parse_yuyutei_search_html(search_page(), 'OP01-026') == []
+
+
+def test_sold_out_and_unpriced_products():
+    results = parse_yuyutei_search_html(search_page(SOLD_OUT + NO_PRICE), 'OP01-025')
+
+    assert [(r['rarity'], r['price_yen']) for r in results] == [
+        ('SR', 1980),
+        ('SR-P', 12800),
+        # Sold-out listings still show their last price
+        ('SP', 39800),
+        # No amount in the price text
+        ('P', None),
+    ]
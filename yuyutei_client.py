@@ -0,0 +1,93 @@
+# yuyutei_client.py
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from browser_pool import get_browser_pool
+from outbound_guard import OutboundCallRejected, guard_for
+
+YUYUTEI_BASE_URL = os.getenv('YUYUTEI_BASE_URL', 'https://yuyu-tei.jp')
+
+# 'auto' tries plain HTTP first and falls back to a pooled browser,
+# 'http' never launches Chromium, 'browser' always renders the page.
+FETCH_MODES = ('auto', 'http', 'browser')
+
+_settings = {
+    'fetch_mode': os.getenv('YUYUTEI_FETCH_MODE', 'auto'),
+    'http_timeout': float(os.getenv('YUYUTEI_HTTP_TIMEOUT', 10)),
+    'browser_timeout': float(os.getenv('YUYUTEI_LOOKUP_TIMEOUT', 60)),
+}
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def configure_yuyutei_client(fetch_mode=None, http_timeout=None, browser_timeout=None):
+    if fetch_mode is not None:
+        if fetch_mode not in FETCH_MODES:
+            raise ValueError(f"YUYUTEI_FETCH_MODE must be one of {FETCH_MODES}, got '{fetch_mode}'")
+        _settings['fetch_mode'] = fetch_mode
+    if http_timeout is not None:
+        _settings['http_timeout'] = float(http_timeout)
+    if browser_timeout is not None:
+        _settings['browser_timeout'] = float(browser_timeout)
+
+
+def get_http_session():
+    """Shared keep-alive session; requests negotiates gzip/deflate by default."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=1)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            session.headers.update({
+                'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36',
+                'Accept-Language': 'ja,en;q=0.8',
+            })
+            _session = session
+        return _session
+
+
+def fetch_html_http(url):
+    with guard_for(url).call():
+        response = get_http_session().get(url, timeout=_settings['http_timeout'])
+        response.raise_for_status()
+        return response.text
+
+
+def fetch_html_browser(url):
+    def load_page(page):
+        page.goto(url, wait_until='networkidle')
+        # One round-trip for the whole document; parsing happens off the browser thread
+        return page.content()
+
+    with guard_for(url).call():
+        return get_browser_pool().run(load_page, timeout=_settings['browser_timeout'])
+
+
+def fetch_and_parse(url, parse):
+    """
+    Fetch `url` and return `parse(html)` using the configured fetch mode.
+
+    In 'auto' mode the browser is only used when the plain HTTP response
+    fails or parses to nothing, e.g. because the listing is rendered by JS.
+    Calls rejected by the outbound guard fail fast and are not retried.
+    """
+    mode = _settings['fetch_mode']
+    if mode in ('auto', 'http'):
+        try:
+            results = parse(fetch_html_http(url))
+            if results or mode == 'http':
+                return results
+        except OutboundCallRejected:
+            raise
+        except requests.exceptions.RequestException as e:
+            if mode == 'http':
+                raise
+            print(f"HTTP fetch failed for {url}, falling back to browser: {e}")
+
+    return parse(fetch_html_browser(url))
@@ -0,0 +1,164 @@
+# yuyutei_parser.py
+import re
+from html.parser import HTMLParser
+from typing import Dict, Any, List, Optional
+
+# Elements that never have a closing tag, so they must not be pushed on the stack
+VOID_ELEMENTS = {
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input',
+    'link', 'meta', 'param', 'source', 'track', 'wbr',
+}
+
+PRICE_PATTERN = re.compile(r'(\d{1,3}(?:,\d{3})*)')
+# Card numbers as printed on Yuyu-tei, e.g. OP01-025, ST10-004, EB01-061, P-001
+CARD_NUMBER_PATTERN = re.compile(r'\b([A-Z]{1,4}\d{0,2}-\d{3})\b')
+
+
+class _SearchResultParser(HTMLParser):
+    """
+    Collects the text of the fields we need from every `.card-product` element.
+
+    Mirrors the selectors the Playwright scraper used: the first
+    `span.d-block.border` (name and card number), the first `strong` (price)
+    and the first `span.tag` (rarity) inside each product.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.products = []
+        self._stack = []
+        self._product = None
+        self._capturing = {}
+
+    def _field_for(self, tag, classes):
+        if tag == 'span' and {'d-block', 'border'} <= classes:
+            return 'name'
+        if tag == 'strong':
+            return 'price'
+        if tag == 'span' and 'tag' in classes:
+            return 'rarity'
+        return None
+
+    def handle_starttag(self, tag, attrs):
+        classes = set((dict(attrs).get('class') or '').split())
+        opened = []
+        if self._product is None:
+            if 'card-product' in classes and tag not in VOID_ELEMENTS:
+                self._product = {'name': None, 'price': None, 'rarity': None}
+                opened.append('product')
+        else:
+            field = self._field_for(tag, classes)
+            if field and self._product[field] is None and field not in self._capturing:
+                self._capturing[field] = []
+                opened.append(field)
+
+        if tag in VOID_ELEMENTS:
+            return
+        self._stack.append((tag, opened))
+
+    def handle_endtag(self, tag):
+        # Be tolerant of unclosed tags: unwind to the nearest matching start tag.
+        if not any(open_tag == tag for open_tag, _ in self._stack):
+            return
+        while self._stack:
+            open_tag, opened = self._stack.pop()
+            self._close(opened)
+            if open_tag == tag:
+                break
+
+    def handle_data(self, data):
+        for parts in self._capturing.values():
+            parts.append(data)
+
+    def _close(self, opened):
+        for field in opened:
+            if field == 'product':
+                for open_field, parts in self._capturing.items():
+                    self._product[open_field] = ''.join(parts)
+                self._capturing.clear()
+                self.products.append(self._product)
+                self._product = None
+            else:
+                self._product[field] = ''.join(self._capturing.pop(field))
+
+    def close(self):
+        super().close()
+        while self._stack:
+            _, opened = self._stack.pop()
+            self._close(opened)
+
+
+def parse_price_yen(price_text: str) -> Optional[int]:
+    """Extract a yen amount such as '1,980 円' -> 1980."""
+    price_match = PRICE_PATTERN.search(price_text or '')
+    return int(price_match.group(1).replace(',', '')) if price_match else None
+
+
+def _product_to_price(product, card_number):
+    return {
+        'name': product['name'].strip() or "Unknown Name",
+        'card_number': card_number,
+        'rarity': (product['rarity'] or '').strip() or "Normal",
+        'price_yen': parse_price_yen((product['price'] or '0').strip()),
+    }
+
+
+def _parse_products(html):
+    parser = _SearchResultParser()
+    parser.feed(html)
+    parser.close()
+    return parser.products
+
+
+def parse_yuyutei_search_html(html: str, card_number: str) -> List[Dict[str, Any]]:
+    """
+    Extract prices for `card_number` from a Yuyu-tei search results page.
+
+    Pure function over the page HTML, so it can run without a browser.
+
+    Args:
+        html (str): The full page markup.
+        card_number (str): Normalized card number, e.g. 'OP01-025'.
+    Returns:
+        List[Dict]: One dict per matching product, in page order.
+    """
+    results = []
+    for product in _parse_products(html):
+        name_text = product['name']
+        # Check the name contains the correct card number to prevent false positives
+        if name_text is None or card_number not in name_text:
+            continue
+        results.append(_product_to_price(product, card_number))
+    return results
+
+
+def parse_yuyutei_listing_html(html: str) -> List[Dict[str, Any]]:
+    """
+    Extract every priced product from a Yuyu-tei set listing page.
+
+    The card number of each product is read from its name text; products
+    without a recognisable card number (sleeves, boxes, ...) are skipped.
+    """
+    results = []
+    for product in _parse_products(html):
+        number_match = CARD_NUMBER_PATTERN.search(product['name'] or '')
+        if not number_match:
+            continue
+        results.append(_product_to_price(product, number_match.group(1)))
+    return results
+
+
+if __name__ == "__main__":
+    # Parse a saved search page: python yuyutei_parser.py page.html OP01-025
+    import sys
+    import time
+
+    with open(sys.argv[1], encoding='utf-8') as page_file:
+        page_html = page_file.read()
+
+    started = time.perf_counter()
+    parsed = parse_yuyutei_search_html(page_html, sys.argv[2])
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    for item in parsed:
+        print(item)
+    print(f"Parsed {len(parsed)} prices in {elapsed_ms:.2f} ms")